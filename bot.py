@@ -1,13 +1,20 @@
-import sqlite3
 import logging
 import datetime
 import asyncio
+import math
 import os
-import requests
-import io # Added for BytesIO
+import re
+import collections
+import multiprocessing
+import signal
+import io
 import base64 # Added for base64 decoding
+import tempfile
+import functools
+import time
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from aiohttp import web
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, InputMediaPhoto, ReplyKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -18,14 +25,47 @@ from telegram.ext import (
     ContextTypes,
 )
 from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+from broadcast import BroadcastEngine
+from callbacks import CallbackRouter
+from db import DB_PATH, DBExecutor, count_queries
+from event_server import EventServer
+from login_scheduler import LOGIN_EXPIRY_INTERVAL, LoginScheduler
+from maintenance import (ARCHIVE_INTERVAL, BACKUP_INTERVAL, VACUUM_INTERVAL, archive_old_rows, backup_database,
+                         incremental_vacuum)
+from metrics import MAINTENANCE_SECONDS, Gauge, instrument_handler, metrics_handler
+from migrations import apply_migrations
+from persistence import SQLitePersistence
+from repository import Repository
+from notifier import Notifier
+from session_sweeper import SessionSweeper, sweep_interval
+from sharding import UpdateRouter, worker_update_app
+from whatsapp_api import WhatsAppClient
 
 # --- Configuration Section ---
 TELEGRAM_BOT_TOKEN = "YOUR_TELEGRAM_BOT_TOKEN" # আপনার টেলিগ্রাম বট টোকেন দিন
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL")  # লোকাল Bot API সার্ভার (যেমন http://127.0.0.1:8088/bot)
 SUPER_ADMIN_ID = 123456789 # আপনার সুপার অ্যাডমিন ID দিন
 SUB_ADMIN_IDS = [] # অন্যান্য সাব অ্যাডমিন ID গুলো লিস্টে যোগ করুন
 ALL_ADMIN_IDS = [SUPER_ADMIN_ID] + SUB_ADMIN_IDS
 ITEMS_PER_PAGE = 5
-WHATSAPP_API_URL = "http://localhost:3000"  # WhatsApp API সার্ভারের ঠিকানা
+DB_QUERY_DEBUG = os.environ.get("DB_QUERY_DEBUG") == "1"  # প্রতি আপডেটে কুয়েরি গুনে N+1 হলে সতর্ক করে
+WHATSAPP_API_URL = os.environ.get("WHATSAPP_API_URL", "http://localhost:3000")  # WhatsApp API সার্ভারের ঠিকানা
+# WhatsApp API সার্ভার এই ঠিকানায় সেশন ইভেন্ট (qr/open/close/loggedOut) পাঠায়
+BOT_EVENTS_HOST = "127.0.0.1"
+BOT_EVENTS_PORT = int(os.environ.get("BOT_EVENTS_PORT", "8081"))
+BOT_EVENTS_SECRET = os.environ.get("BOT_EVENTS_SECRET")
+# BOT_WEBHOOK_URL (পাবলিক https ঠিকানা) দিলে polling এর বদলে webhook মোডে চলে
+BOT_WEBHOOK_URL = os.environ.get("BOT_WEBHOOK_URL")
+BOT_WEBHOOK_LISTEN = os.environ.get("BOT_WEBHOOK_LISTEN", "0.0.0.0")
+BOT_WEBHOOK_PORT = int(os.environ.get("BOT_WEBHOOK_PORT", "8443"))
+BOT_WEBHOOK_PATH = "/webhook"
+BOT_WEBHOOK_SECRET = os.environ.get("BOT_WEBHOOK_SECRET")
+# webhook মোডে একাধিক ওয়ার্কার প্রসেস; আপডেট user_id অনুযায়ী ভাগ হয়
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", "1"))
+BOT_WORKER_BASE_PORT = int(os.environ.get("BOT_WORKER_BASE_PORT", "8100"))  # ওয়ার্কার i শোনে 127.0.0.1:(BOT_WORKER_BASE_PORT + i)
+WORKER_PROFILE_CACHE_TTL = 5.0  # একাধিক ওয়ার্কারে অন্য প্রসেসের রাইট (যেমন অ্যাডমিনের রিফান্ড) এতক্ষণ পর দেখা যায়
 
 # পয়েন্ট সিস্টেম
 POINTS_PER_LOGIN = 10
@@ -34,6 +74,23 @@ POINTS_PER_DAILY_LOGIN = 5
 POINTS_STREAK_BONUS = 50 # Not used in current code, but can be implemented
 POINTS_TO_BDT_RATE = 10
 MIN_WITHDRAWAL_BDT = 100
+LEDGER_COMPACT_INTERVAL = 6 * 60 * 60  # সেকেন্ড; পুরনো লেজার এন্ট্রি স্ন্যাপশটে কম্প্যাক্ট করার জব
+STATS_AUDIT_INTERVAL = 6 * 60 * 60  # সেকেন্ড; পুরনো ঘণ্টাভিত্তিক রোলআপ মোছা ও stats_totals পুরো গণনার সাথে মেলানো
+REFERRAL_AUDIT_INTERVAL = 24 * 60 * 60  # সেকেন্ড; referral_count কে referred_by গুনে যাচাই (পুরো users টেবিল পড়ে)
+CSV_SPOOL_SIZE = 1024 * 1024  # এর চেয়ে বড় CSV এক্সপোর্ট মেমরিতে না রেখে ডিস্কের টেম্প ফাইলে যায়
+
+# মেইন মেনুর বাটন; কনভারসেশনের entry point এগুলো দিয়ে মেলানো হয়
+USER_MENU = [
+    ["▶️ WhatsApp লগইন", "📊 আমার একাউন্ট"],
+    ["💰 উইথড্র", "🎁 রেফার কোড"],
+    ["✅ Active Sessions"],
+]
+ADMIN_MENU = [
+    ["👁️ ইউজার লিস্ট", "🧾 উইথড্র রিকুয়েস্ট"],
+    ["🔁 সেশন ম্যানেজমেন্ট", "🔔 ব্রডকাস্ট"],
+    ["📈 পরিসংখ্যান"],
+]
+MAIN_MENU_PATTERN = "^(" + "|".join(re.escape(label) for row in USER_MENU + ADMIN_MENU for label in row) + ")$"
 
 # Conversation states
 PHONE_NUMBER, WAIT_FOR_QR_CONFIRMATION, WITHDRAW_AMOUNT, WITHDRAW_NUMBER, BROADCAST_MESSAGE, ADMIN_SESSION_ACTION = range(6)
@@ -45,92 +102,99 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # --- Database Setup ---
-def setup_database():
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY, 
-        username TEXT, 
-        points INTEGER DEFAULT 0, 
-        referral_code TEXT,
-        referred_by INTEGER, 
-        last_login DATE, 
-        login_streak INTEGER DEFAULT 0,
-        successful_sessions INTEGER DEFAULT 0, 
-        failed_sessions INTEGER DEFAULT 0
-    )""")
-    # Note: 'session_data' will now store a placeholder, as baileys manages files.
-    # 'two_fa_pass' is removed as it's not applicable with baileys in this context.
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS sessions (
-        session_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        user_id INTEGER, 
-        phone_number TEXT NOT NULL UNIQUE, -- Phone number should be unique per session
-        session_data TEXT DEFAULT 'Baileys Managed', -- Placeholder
-        status TEXT DEFAULT 'active', 
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users (user_id)
-    )""")
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS withdrawals (
-        request_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-        user_id INTEGER, 
-        amount_bdt REAL,
-        points_used INTEGER, 
-        payment_number TEXT, 
-        status TEXT DEFAULT 'pending',
-        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
-        FOREIGN KEY (user_id) REFERENCES users (user_id)
-    )""")
-    conn.commit()
-    conn.close()
+repo = Repository(DBExecutor(DB_PATH))
+broadcaster = BroadcastEngine(repo)
+notifier = Notifier(bucket=broadcaster.bucket)  # দুজনের মোট রেট টেলিগ্রামের গ্লোবাল লিমিটের নিচে
+sweeper = SessionSweeper(repo, notifier)
+login_scheduler = LoginScheduler(repo)
+router = CallbackRouter(ALL_ADMIN_IDS)  # ইনলাইন বাটন; রুট টেবিল নিচে Button Handlers অংশে
 
 # --- WhatsApp API Functions ---
-async def initiate_whatsapp_login(phone_number: str) -> (str, str):
-    """WhatsApp লগইন শুরু করে এবং QR কোড ইমেজের URL বা Data URL রিটার্ন করে"""
+wa_client = WhatsAppClient(WHATSAPP_API_URL)
+
+async def initiate_whatsapp_login(phone_number: str) -> (dict, str):
+    """WhatsApp লগইন শুরু করে; (API রেসপন্স, স্ট্যাটাস) রিটার্ন করে। QR থাকে qr_path (PNG এন্ডপয়েন্ট) এ"""
     try:
-        response = requests.post(
-            f"{WHATSAPP_API_URL}/sessions", 
-            json={"phone": phone_number}
-        )
+        response = await wa_client.create_session(phone_number)
         if response.status_code == 200:
             data = response.json()
-            qr_url = data.get("qr_url")
             status = data.get("status") # 'authenticated' if already logged in
-            return qr_url, status
+            return data, status
         elif response.status_code == 409: # Session already exists
             logger.info(f"Session for {phone_number} already exists.")
-            return None, "exists"
+            return {}, "exists"
         logger.error(f"API error: {response.status_code} - {response.text}")
-        return None, "error"
+        return {}, "error"
     except Exception as e:
         logger.error(f"Error initiating WhatsApp login: {e}")
-        return None, "error"
+        return {}, "error"
+
+QR_CAPTION = "নিচের QR কোডটি স্ক্যান করে WhatsApp এ লগইন করুন। স্ক্যান হলে লগইন স্বয়ংক্রিয়ভাবে নিশ্চিত হবে (না হলে /confirm কমান্ড দিন)।"
+QR_FILE_ID_CACHE_SIZE = 256
+LOGIN_ALREADY_SETTLED_TEXT = "ℹ️ এই লগইনটি ইতিমধ্যেই সম্পন্ন বা বাতিল হয়েছে; ফলাফল আলাদা মেসেজে জানানো হয়েছে।"
+# নম্বর -> (QR এর ETag, টেলিগ্রাম file_id); একই QR আবার পাঠাতে হলে আপলোড লাগে না।
+# ETag সার্ভারে QR এর কনটেন্ট থেকে আসে; লগইন শেষ হলে (claim_pending_login) বা মেয়াদ ফুরালে এন্ট্রিটি মুছে যায়
+qr_file_ids = collections.OrderedDict()
+
+async def load_login_qr(phone_number: str, data: dict):
+    """POST /sessions এর রেসপন্স থেকে QR এর (PNG বাইট, ETag); পুরনো API সার্ভারের base64 data URL ও বোঝে"""
+    if data.get("qr_path"):
+        return await wa_client.fetch_qr(phone_number)
+    qr_url = data.get("qr_url")
+    if qr_url and qr_url.startswith('data:image/png;base64,'):
+        return base64.b64decode(qr_url.split(',')[1]), None
+    return None, None
 
-async def check_whatsapp_login_status(phone_number: str) -> str:
-    """WhatsApp লগইন স্ট্যাটাস চেক করে ('authenticated', 'pending_qr', 'not_found')"""
+def qr_photo(phone_number: str, png: bytes, etag: str):
+    """এই নম্বরে আগে পাঠানো একই QR (একই ETag) হলে তার file_id, নাহলে PNG বাইট"""
+    cached = qr_file_ids.get(phone_number)
+    return cached[1] if etag and cached and cached[0] == etag else png
+
+def remember_qr_file_id(phone_number: str, etag: str, message) -> None:
+    if etag and message and message.photo:
+        qr_file_ids[phone_number] = (etag, message.photo[-1].file_id)
+        qr_file_ids.move_to_end(phone_number)
+        while len(qr_file_ids) > QR_FILE_ID_CACHE_SIZE:
+            qr_file_ids.popitem(last=False)
+
+async def claim_pending_login(phone_number: str):
+    """repo.pop_pending_login; লগইনটি যেভাবেই শেষ হোক, তার QR এর file_id আর পাঠানো হবে না"""
+    qr_file_ids.pop(phone_number, None)
+    return await repo.pop_pending_login(phone_number)
+
+async def refresh_login_qr(bot, phone_number: str, event: dict) -> None:
+    """Baileys নতুন QR দিলে ইউজারের আগের QR মেসেজের ছবিটিই বদলে দেয়"""
+    pending = await repo.get_pending_login(phone_number)
+    if pending is None:
+        return
+    user_id, message_id, current_etag = pending
+    if message_id is None:
+        return # প্রথম QR এখনও পাঠানো হয়নি; সেটি ask_phone_number পাঠাবে
+    if event.get("etag") and event["etag"] == current_etag:
+        return
+    png, etag = await wa_client.fetch_qr(phone_number, current_etag)
+    if png is None:
+        return # 304 (বদলায়নি) অথবা QR আর নেই
     try:
-        response = requests.get(
-            f"{WHATSAPP_API_URL}/sessions/{phone_number}/status"
+        message = await bot.edit_message_media(
+            chat_id=user_id, message_id=message_id,
+            media=InputMediaPhoto(qr_photo(phone_number, png, etag), caption=QR_CAPTION)
         )
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("status")
-        elif response.status_code == 404:
-            return "not_found"
-        logger.error(f"API status check error: {response.status_code} - {response.text}")
-        return "error"
-    except Exception as e:
-        logger.error(f"Error checking login status: {e}")
-        return "error"
+    except TelegramError as e:
+        logger.warning(f"Could not refresh QR message for {phone_number}: {e}")
+        return
+    remember_qr_file_id(phone_number, etag, message)
+    await repo.set_pending_login_qr(phone_number, message_id, etag)
+
+async def check_whatsapp_login_status(phone_number: str, use_cache: bool = False) -> str:
+    """WhatsApp লগইন স্ট্যাটাস চেক করে ('authenticated', 'pending_qr', 'not_found'); হাইবারনেট করা সেশন জাগিয়ে তোলে"""
+    statuses = await wa_client.get_statuses([phone_number], use_cache=use_cache, wake=True)
+    return statuses[phone_number]
 
 async def terminate_whatsapp_session(phone_number: str) -> bool:
     """WhatsApp সেশন terminate করে"""
     try:
-        response = requests.delete(
-            f"{WHATSAPP_API_URL}/sessions/{phone_number}"
-        )
+        response = await wa_client.delete_session(phone_number)
         if response.status_code == 200:
             return True
         logger.error(f"API session termination error: {response.status_code} - {response.text}")
@@ -141,17 +205,7 @@ async def terminate_whatsapp_session(phone_number: str) -> bool:
 
 # --- UI Helper Functions ---
 def get_main_keyboard(user_id: int) -> ReplyKeyboardMarkup:
-    if user_id in ALL_ADMIN_IDS:
-        keyboard = [
-            ["👁️ ইউজার লিস্ট", "🧾 উইথড্র রিকুয়েস্ট"],
-            ["🔁 সেশন ম্যানেজমেন্ট", "🔔 ব্রডকাস্ট"],
-        ]
-    else:
-        keyboard = [
-            ["▶️ WhatsApp লগইন", "📊 আমার একাউন্ট"],
-            ["💰 উইথড্র", "🎁 রেফার কোড"],
-            ["✅ Active Sessions"],
-        ]
+    keyboard = ADMIN_MENU if user_id in ALL_ADMIN_IDS else USER_MENU
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
 
 # --- Start Command & Main Handlers ---
@@ -159,35 +213,32 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_id = user.id
     
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    db_user = cursor.fetchone()
+    db_user = await repo.get_profile(user_id)
     
     if not db_user:
         referral_code = f"ref_{user_id}"
-        cursor.execute(
-            "INSERT INTO users (user_id, username, referral_code, last_login, login_streak, points) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, user.username or user.first_name, referral_code, datetime.date.today(), 1, POINTS_PER_DAILY_LOGIN)
+        # t.me/<bot>?start=ref_<id> ডিপ লিংক থেকে এলে পেলোডটি context.args এ থাকে
+        payload = context.args[0] if context.args else ""
+        created, referrer = await repo.create_user(
+            user_id, user.username or user.first_name, referral_code, datetime.date.today(), POINTS_PER_DAILY_LOGIN,
+            referred_by_code=payload if payload.startswith("ref_") else None, referral_points=POINTS_PER_REFERRAL
         )
-        await update.message.reply_text(f"স্বাগতম! আপনি প্রথমবার লগইন করার জন্য {POINTS_PER_DAILY_LOGIN} পয়েন্ট পেয়েছেন।")
+        if created:
+            await update.message.reply_text(f"স্বাগতম! আপনি প্রথমবার লগইন করার জন্য {POINTS_PER_DAILY_LOGIN} পয়েন্ট পেয়েছেন।")
+        if referrer is not None:
+            notifier.send(referrer, f"🎉 আপনার রেফারেলে একজন নতুন ইউজার যোগ দিয়েছেন! আপনি {POINTS_PER_REFERRAL} পয়েন্ট পেয়েছেন।")
     else:
         today = datetime.date.today()
         # Ensure last_login is handled correctly, even if it's None or invalid
-        last_login_str = db_user[5] if db_user and len(db_user) > 5 and db_user[5] else '1970-01-01'
+        last_login_str = db_user.last_login or '1970-01-01'
         try:
             last_login = datetime.datetime.strptime(last_login_str, '%Y-%m-%d').date()
         except ValueError:
             last_login = datetime.date(1970, 1, 1) # Fallback to a very old date
 
-        if last_login < today:
-            cursor.execute("UPDATE users SET points = points + ?, last_login = ? WHERE user_id = ?", 
-                          (POINTS_PER_DAILY_LOGIN, today, user_id))
+        if last_login < today and await repo.claim_daily_bonus(user_id, today, POINTS_PER_DAILY_LOGIN):
             await context.bot.send_message(chat_id=user_id, text=f"পুনরায় স্বাগতম! আজকের ডেইলি লগইন বোনাস: {POINTS_PER_DAILY_LOGIN} পয়েন্ট।")
 
-    conn.commit()
-    conn.close()
-
     reply_markup = get_main_keyboard(user_id)
     await update.message.reply_text("👋 আপনাকে স্বাগতম! অনুগ্রহ করে একটি অপশন বেছে নিন:", reply_markup=reply_markup)
     return ConversationHandler.END
@@ -216,6 +267,8 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await check_withdrawal_requests(update, context, page=0)
         elif text == "🔁 সেশন ম্যানেজমেন্ট":
             await admin_session_management(update, context, page=0)
+        elif text == "📈 পরিসংখ্যান":
+            await show_stats(update, context)
         elif text == "🔔 ব্রডকাস্ট":
             if user_id == SUPER_ADMIN_ID:
                 await update.message.reply_text("আপনি সকল ইউজারকে যে বার্তা পাঠাতে চান, সেটি লিখুন:")
@@ -232,125 +285,172 @@ async def ask_phone_number(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await update.message.reply_text("❌ অনুগ্রহ করে সঠিক কান্ট্রি কোডসহ নম্বর দিন (যেমন: +8801712345678):")
         return PHONE_NUMBER
 
-    context.user_data['phone_number'] = phone_number
-    
-    # WhatsApp লগইন শুরু করুন
-    qr_url, status = await initiate_whatsapp_login(phone_number)
-    
-    if status == "authenticated":
-        await update.message.reply_text(f"✅ এই নম্বর `{phone_number}` ইতিমধ্যেই লগইন করা আছে।")
-        return ConversationHandler.END
-    elif qr_url and qr_url.startswith('data:image/png;base64,'):
-        # Decode base64 QR data and send as photo
-        qr_data = base64.b64decode(qr_url.split(',')[1])
-        photo_bytes = io.BytesIO(qr_data)
-        
-        await update.message.reply_photo(
-            photo=photo_bytes,
-            caption="নিচের QR কোডটি স্ক্যান করে WhatsApp এ লগইন করুন। স্ক্যান হয়ে গেলে /confirm কমান্ড দিন।"
+    user_id = update.effective_user.id
+    retry_after = login_scheduler.retry_after(user_id)
+    if retry_after:
+        await update.message.reply_text(
+            f"⚠️ আপনি অল্প সময়ে অনেকবার লগইনের চেষ্টা করেছেন। {math.ceil(retry_after / 60)} মিনিট পর আবার চেষ্টা করুন।"
         )
-        return WAIT_FOR_QR_CONFIRMATION
-    else:
-        await update.message.reply_text("❌ WhatsApp লগইন শুরু করতে সমস্যা হয়েছে অথবা নম্বরটি ভুল। আবার চেষ্টা করুন।")
         return ConversationHandler.END
 
+    # চলমান লগইনের নম্বর user_data তে নয়, pending_logins/login_queue তে থাকে: 'open' ইভেন্ট ও মেয়াদ শেষের জব
+    # প্রথম ওয়ার্কারে চলে, আর ইউজারের আপডেট অন্য ওয়ার্কারে যেতে পারে
+    position = await login_scheduler.request(user_id, phone_number)
+    if position:
+        await reply_login_queue_position(update, position)
+        return WAIT_FOR_QR_CONFIRMATION
+    if await begin_whatsapp_login(context.bot, user_id, phone_number):
+        return WAIT_FOR_QR_CONFIRMATION
+    await admit_queued_logins(context.application)
+    return ConversationHandler.END
+
+async def reply_login_queue_position(update: Update, position: int) -> None:
+    wait = await login_scheduler.estimated_wait(position)
+    await update.message.reply_text(
+        f"⏳ এই মুহূর্তে অনেক লগইন চলছে। কিউতে আপনার অবস্থান: {position}, আনুমানিক অপেক্ষা ~{max(1, math.ceil(wait / 60))} মিনিট।\n"
+        "আপনার পালা এলে QR কোড স্বয়ংক্রিয়ভাবে পাঠানো হবে। বাতিল করতে /cancel দিন।"
+    )
+
+async def begin_whatsapp_login(bot, user_id: int, phone_number: str) -> bool:
+    """pending_logins এ জায়গা পাওয়া লগইনের API সেশন খুলে QR পাঠায়; QR এর অপেক্ষায় থাকলে True।
+
+    False হলে পেন্ডিং লগইনটি মুছে ইউজারকে জানানো হয়েছে; কলার admit_queued_logins() ডাকবে।
+    """
+    data, status = await initiate_whatsapp_login(phone_number)
+    
+    if status == "authenticated":
+        await claim_pending_login(phone_number)
+        await bot.send_message(chat_id=user_id, text=f"✅ এই নম্বর `{phone_number}` ইতিমধ্যেই লগইন করা আছে।")
+        return False
+    png, etag = await load_login_qr(phone_number, data)
+    if png:
+        message = await bot.send_photo(chat_id=user_id, photo=qr_photo(phone_number, png, etag), caption=QR_CAPTION)
+        remember_qr_file_id(phone_number, etag, message)
+        # পরে QR বদলালে ('qr' ইভেন্ট) এই মেসেজটিই এডিট হয়
+        await repo.set_pending_login_qr(phone_number, message.message_id, etag)
+        return True
+    await claim_pending_login(phone_number)
+    await bot.send_message(chat_id=user_id, text="❌ WhatsApp লগইন শুরু করতে সমস্যা হয়েছে অথবা নম্বরটি ভুল। আবার চেষ্টা করুন।")
+    return False
+
+async def admit_queued_logins(application: Application) -> None:
+    """পেন্ডিং লগইনের জায়গা খালি হলে কিউর পরের ইউজারদের লগইন শুরু করে"""
+    while admitted := await login_scheduler.admit():
+        await asyncio.gather(*(
+            begin_whatsapp_login(application.bot, user_id, phone_number) for user_id, phone_number in admitted
+        ))
+
+async def expire_logins_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """QR_TIMEOUT এর মধ্যে স্ক্যান না হওয়া লগইনের সার্ভার সেশন বন্ধ করে জায়গা কিউকে দেয়"""
+    expired = await login_scheduler.expire()
+    await asyncio.gather(*(terminate_whatsapp_session(phone_number) for phone_number, _ in expired))
+    for phone_number, user_id in expired:
+        qr_file_ids.pop(phone_number, None)
+        notifier.send(user_id, f"⌛ `{phone_number}` এর QR কোডের মেয়াদ শেষ হয়ে গেছে। আবার লগইন করতে মেনু থেকে শুরু করুন।",
+                      parse_mode=ParseMode.MARKDOWN)
+    await admit_queued_logins(context.application)
+
 async def confirm_login(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    phone_number = context.user_data.get('phone_number')
-    if not phone_number:
-        await update.message.reply_text("⚠️ কোনো ফোন নম্বর পাওয়া যায়নি। দয়া করে আবার শুরু করুন।")
+    position = await login_scheduler.position(update.effective_user.id)
+    if position:
+        await reply_login_queue_position(update, position)
+        return WAIT_FOR_QR_CONFIRMATION
+    phone_number = await repo.get_user_login(update.effective_user.id)
+    if phone_number is None:
+        # 'open'/'loggedOut' ইভেন্ট বা মেয়াদ শেষের জব (হয়তো অন্য ওয়ার্কারে) আগেই লগইনটি শেষ করে ইউজারকে জানিয়েছে
+        await update.message.reply_text(LOGIN_ALREADY_SETTLED_TEXT)
         return ConversationHandler.END
     
     # লগইন স্ট্যাটাস চেক করুন
     status = await check_whatsapp_login_status(phone_number)
     
-    if status == "authenticated":
-        # সেশন ডেটাবেজে সেভ করুন (যদি না থাকে)
-        conn = sqlite3.connect("bot_database.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM sessions WHERE user_id = ? AND phone_number = ?", 
-                       (update.effective_user.id, phone_number))
-        session_exists = cursor.fetchone()
-        
-        if not session_exists:
-            cursor.execute(
-                "INSERT INTO sessions (user_id, phone_number, session_data) VALUES (?, ?, ?)",
-                (update.effective_user.id, phone_number, 'Baileys Managed')
-            )
-            # পয়েন্ট যোগ করুন
-            cursor.execute(
-                "UPDATE users SET points = points + ?, successful_sessions = successful_sessions + 1 WHERE user_id = ?",
-                (POINTS_PER_LOGIN, update.effective_user.id)
-            )
-            conn.commit()
-            await update.message.reply_text("✅ WhatsApp সফলভাবে লগইন হয়েছে! আপনার সেশন সংরক্ষণ করা হয়েছে এবং আপনি পয়েন্ট পেয়েছেন।")
-        else:
-            await update.message.reply_text("✅ WhatsApp সফলভাবে লগইন হয়েছে এবং সেশনটি ইতিমধ্যেই রেকর্ড করা আছে।")
-        
-        conn.close()
-        
-    elif status == "pending_qr":
+    if status in ("pending_qr", "restoring", "reconnecting"): # স্ক্যানের পরপরই Baileys একবার রিকানেক্ট করে
         await update.message.reply_text("⌛ WhatsApp লগইন এখনও পেন্ডিং আছে। QR কোড স্ক্যান নিশ্চিত করুন এবং কিছুক্ষণ পর আবার /confirm দিন।")
         return WAIT_FOR_QR_CONFIRMATION # Stay in this state
+    # স্ট্যাটাস চেকের মাঝে push ইভেন্টও পেন্ডিং সারিটি দাবি করতে পারে; যে মুছতে পারে শুধু সে-ই ফলাফল লেখে ও জানায়
+    if await claim_pending_login(phone_number) is None:
+        await update.message.reply_text(LOGIN_ALREADY_SETTLED_TEXT)
+    elif status == "authenticated":
+        await finish_whatsapp_login(context.bot, update.effective_user.id, phone_number)
     else:
         # ব্যর্থ লগইন
-        conn = sqlite3.connect("bot_database.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE users SET failed_sessions = failed_sessions + 1 WHERE user_id = ?",
-            (update.effective_user.id,)
-        )
-        conn.commit()
-        conn.close()
-        await update.message.reply_text("❌ WhatsApp লগইন ব্যর্থ হয়েছে বা সেশন পাওয়া যায়নি। আবার চেষ্টা করুন।")
+        await repo.record_failed_login(update.effective_user.id)
+        await update.message.reply_text("❌ WhatsApp লগইন ব্যর্থ হয়েছে বা সেশন পাওয়া যায়নি। আবার চেষ্টা করুন।")
     
-    context.user_data.pop('phone_number', None) # Clear user data
+    await admit_queued_logins(context.application)
     return ConversationHandler.END
 
+async def finish_whatsapp_login(bot, user_id: int, phone_number: str) -> None:
+    """সেশন ডেটাবেজে সেভ করে (যদি না থাকে), নম্বরটিতে প্রথমবার হলে পয়েন্ট যোগ করে এবং ইউজারকে জানায়"""
+    is_new = await repo.record_login(user_id, phone_number, POINTS_PER_LOGIN)
+    
+    if is_new:
+        await bot.send_message(chat_id=user_id, text="✅ WhatsApp সফলভাবে লগইন হয়েছে! আপনার সেশন সংরক্ষণ করা হয়েছে এবং আপনি পয়েন্ট পেয়েছেন।")
+    else:
+        await bot.send_message(chat_id=user_id, text="✅ WhatsApp সফলভাবে লগইন হয়েছে। এই নম্বরের পয়েন্ট আগেই দেওয়া হয়েছে, তাই নতুন পয়েন্ট যোগ হয়নি।")
+
+async def handle_session_event(application: Application, event: dict) -> None:
+    """WhatsApp API সার্ভারের push ইভেন্ট; /confirm ছাড়াই লগইন সম্পন্ন বা সেশন নিষ্ক্রিয় করে"""
+    kind, phone_number = event["event"], event["phone"]
+    wa_client.forget_status(phone_number)
+    logger.info(f"Session event '{kind}' for {phone_number}")
+
+    if kind == "qr":
+        await refresh_login_qr(application.bot, phone_number, event)
+    elif kind == "open":
+        user_id = await claim_pending_login(phone_number)
+        if user_id is None:
+            # /confirm আগেই সম্পন্ন করেছে, অথবা পুরনো সেশন রিকানেক্ট/রিস্টোর হয়েছে
+            await repo.set_session_statuses({phone_number: "active"})
+            return
+        await finish_whatsapp_login(application.bot, user_id, phone_number)
+        await admit_queued_logins(application)
+    elif kind == "loggedOut":
+        await repo.deactivate_session(phone_number)
+        user_id = await claim_pending_login(phone_number)
+        if user_id is not None:
+            await repo.record_failed_login(user_id)
+            await application.bot.send_message(chat_id=user_id, text="❌ WhatsApp লগইন ব্যর্থ হয়েছে বা সেশন পাওয়া যায়নি। আবার চেষ্টা করুন।")
+            await admit_queued_logins(application)
+    elif kind == "close" and event.get("state") == "failed":
+        # সার্ভার রিকানেক্টের চেষ্টা ছেড়ে দিয়েছে
+        drops = await repo.set_session_statuses({phone_number: "disconnected"})
+        sweeper.notify_drops(drops)
+
 # --- Account Management ---
 async def my_account(update, context):
     user_id = update.effective_user.id
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT points, successful_sessions, failed_sessions, referral_code FROM users WHERE user_id = ?", (user_id,))
-    user_data = cursor.fetchone()
-    cursor.execute("SELECT COUNT(*) FROM sessions WHERE user_id = ? AND status = 'active'", (user_id,))
-    session_count = cursor.fetchone()[0]
-    conn.close()
+    profile = await repo.get_profile(user_id)
     
-    if user_data:
+    if profile:
         text = (
             f"📊 **আপনার একাউন্টের বিস্তারিত** 📊\n\n"
-            f"💰 **পয়েন্ট ব্যালেন্স:** `{user_data[0]}`\n"
-            f"🔗 **সক্রিয় সেশন:** `{session_count}` টি\n"
-            f"✅ **সফল সেশন:** `{user_data[1]}` বার\n" # Renamed from successful_otp
-            f"❌ **ব্যর্থ সেশন:** `{user_data[2]}` বার\n\n" # Renamed from failed_otp
-            f"🎁 **আপনার রেফার কোড:**\n`{user_data[3]}`"
+            f"💰 **পয়েন্ট ব্যালেন্স:** `{profile.points}`\n"
+            f"🔗 **সক্রিয় সেশন:** `{profile.active_sessions}` টি\n"
+            f"✅ **সফল সেশন:** `{profile.successful_sessions}` বার\n" # Renamed from successful_otp
+            f"❌ **ব্যর্থ সেশন:** `{profile.failed_sessions}` বার\n\n" # Renamed from failed_otp
+            f"🎁 **আপনার রেফার কোড:**\n`{profile.referral_code}`\n"
+            f"👥 **সফল রেফারেল:** `{profile.referral_count}` জন"
         )
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
 async def get_referral_code(update, context):
     user_id = update.effective_user.id
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT referral_code FROM users WHERE user_id = ?", (user_id,))
-    referral_code = cursor.fetchone()[0]
-    conn.close()
+    profile = await repo.get_profile(user_id)
+    link = f"https://t.me/{context.bot.username}?start={profile.referral_code}"
     
     await update.message.reply_text(
-        f"🎁 আপনার রেফারেল কোড:\n\n"
-        f"`{referral_code}`\n\n"
-        f"এই কোডটি শেয়ার করুন এবং নতুন ইউজার রেজিস্ট্রেশনের সময় ব্যবহার করুন। প্রতিটি সফল রেফারেলের জন্য আপনি {POINTS_PER_REFERRAL} পয়েন্ট পাবেন।",
+        f"🎁 আপনার রেফারেল লিংক:\n\n"
+        f"`{link}`\n\n"
+        f"এই লিংকটি শেয়ার করুন; নতুন ইউজার লিংক থেকে বট চালু করলেই রেফারেল গণনা হবে। প্রতিটি সফল রেফারেলের জন্য আপনি {POINTS_PER_REFERRAL} পয়েন্ট পাবেন।\n\n"
+        f"👥 এ পর্যন্ত সফল রেফারেল: `{profile.referral_count}` জন",
         parse_mode=ParseMode.MARKDOWN
     )
 
 # --- Withdrawal System ---
 async def start_withdraw_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT points FROM users WHERE user_id = ?", (user_id,))
-    user_points = cursor.fetchone()[0]
-    conn.close()
+    user_points = await repo.get_points(user_id)
     
     available_bdt = user_points / POINTS_TO_BDT_RATE
     await update.message.reply_text(
@@ -374,10 +474,7 @@ async def ask_withdraw_number(update: Update, context: ContextTypes.DEFAULT_TYPE
         user_id = update.effective_user.id
         required_points = amount_bdt * POINTS_TO_BDT_RATE
         
-        conn = sqlite3.connect("bot_database.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT points FROM users WHERE user_id = ?", (user_id,))
-        user_points = cursor.fetchone()[0]
+        user_points = await repo.get_points(user_id)
         
         if user_points < required_points:
             await update.message.reply_text(
@@ -402,24 +499,12 @@ async def process_withdraw_request(update: Update, context: ContextTypes.DEFAULT
     required_points = context.user_data['required_points']
     user_id = update.effective_user.id
     
-    # ডাটাবেজে রিকোয়েস্ট সেভ করুন
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    
-    # উইথড্র রিকোয়েস্ট যোগ করুন
-    cursor.execute(
-        "INSERT INTO withdrawals (user_id, amount_bdt, points_used, payment_number) VALUES (?, ?, ?, ?)",
-        (user_id, amount_bdt, required_points, payment_number)
-    )
-    
-    # পয়েন্ট কেটে নিন
-    cursor.execute(
-        "UPDATE users SET points = points - ? WHERE user_id = ?",
-        (required_points, user_id)
-    )
-    
-    conn.commit()
-    conn.close()
+    # ডাটাবেজে রিকোয়েস্ট সেভ করুন
+    # উইথড্র রিকোয়েস্ট যোগ করুন এবং পয়েন্ট কেটে নিন (ব্যালেন্স একই ট্রানজ্যাকশনে আবার যাচাই হয়)
+    request_id = await repo.create_withdrawal(user_id, amount_bdt, required_points, payment_number)
+    if request_id is None:
+        await update.message.reply_text("❌ আপনার কাছে পর্যাপ্ত পয়েন্ট নেই! উইথড্র রিকোয়েস্ট বাতিল করা হয়েছে।")
+        return ConversationHandler.END
     
     await update.message.reply_text(
         "✅ আপনার উইথড্র রিকোয়েস্ট গৃহীত হয়েছে!\n"
@@ -444,153 +529,234 @@ async def process_withdraw_request(update: Update, context: ContextTypes.DEFAULT
 # --- Active Sessions ---
 async def list_active_sessions(update, context):
     user_id = update.effective_user.id
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT phone_number, created_at FROM sessions WHERE user_id = ? AND status = 'active'", (user_id,))
-    sessions = cursor.fetchall()
-    conn.close()
+    sessions = await repo.list_active_sessions(user_id)
     
     if not sessions:
         await update.message.reply_text("আপনার কোনো সক্রিয় সেশন নেই।")
         return
     
-    text = "📱 **আপনার সক্রিয় সেশনসমূহ:**\n\n"
-    for i, session in enumerate(sessions, 1):
-        status = await check_whatsapp_login_status(session[0])
-        text += f"{i}. `{session[0]}` - {session[1]} (স্ট্যাটাস: {status})\n"
+    # স্ট্যাটাস SessionSweeper এর শেষ চেক থেকে; API কল হয় না
+    text = "📱 **আপনার সক্রিয় সেশনসমূহ:**\n\n"
+    for i, (phone_number, created_at, server_status, last_checked_at) in enumerate(sessions, 1):
+        # pending_qr, not_found এর '_' Markdown এ ইটালিক শুরু করে; ব্যাকটিকের ভেতরে আক্ষরিক থাকে
+        status = f"`{server_status}`, {last_checked_at} এ চেক করা" if last_checked_at else "এখনও চেক হয়নি"
+        text += f"{i}. `{phone_number}` - {created_at} (স্ট্যাটাস: {status})\n"
     
     await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
 # --- Admin Features ---
-async def list_all_users(update, context, page=0):
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id, username, points FROM users")
-    users = cursor.fetchall()
-    conn.close()
-
-    if not users:
-        await update.message.reply_text("কোনো ইউজার পাওয়া যায়নি।")
+async def list_all_users(update, context, page=0, cursor="n0"):
+    backward, after = parse_page_cursor(cursor)
+    result = await repo.page_users(after, backward, ITEMS_PER_PAGE)
+    message = update.message if hasattr(update, 'message') else update.callback_query.message
+
+    if not result.rows:
+        await message.reply_text("কোনো ইউজার পাওয়া যায়নি।")
         return
 
-    user_list = [(f"{user[1]} (ID: {user[0]}, Points: {user[2]})", user[0]) for user in users]
+    user_list = [(f"{user[1]} (ID: {user[0]}, Points: {user[2]})", user[0]) for user in result.rows]
+    total_pages = page_count(await repo.cached_count("users"))
     
-    reply_markup = build_paginated_menu(user_list, "admin_users_page", page)
-    message = update.message if hasattr(update, 'message') else update.callback_query.message
-    await message.reply_text(f"👥 **ইউজার লিস্ট (পেজ {page+1})**", reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-
-async def check_withdrawal_requests(update, context, page=0):
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT request_id, user_id, amount_bdt, payment_number FROM withdrawals WHERE status = 'pending'")
-    requests = cursor.fetchall()
-    conn.close()
-
-    if not requests:
-        message = update.message if hasattr(update, 'message') else update.callback_query.message
-        await message.reply_text("✅ কোনো পেন্ডিং উইথড্র রিকুয়েস্ট নেই।")
+    reply_markup = build_paginated_menu(user_list, "users", page, result)
+    await message.reply_text(f"👥 **ইউজার লিস্ট (পেজ {page+1}/{total_pages})**", reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+
+async def show_user_details(message, user_id: int) -> None:
+    """ইউজার লিস্টের একটি ইউজারের প্রোফাইল ও সক্রিয় সেশন (স্ট্যাটাস সুইপারের শেষ চেক থেকে)"""
+    profile = await repo.get_profile(user_id)
+    if profile is None:
+        # বাটন পাঠানোর পর ইউজারটি আর নেই
+        await message.reply_text("ইউজারটি পাওয়া যায়নি।")
         return
 
-    for req in requests:
-        text = (f"🆔 রিকুয়েস্ট ID: `{req[0]}`\n"
-                f"👤 ইউজার ID: `{req[1]}`\n"
-                f"💰 পরিমাণ: `{req[2]}` BDT\n"
-                f"📱 নম্বর: `{req[3]}`")
-        keyboard = [[
-            InlineKeyboardButton("✅ Approve", callback_data=f"approve_{req[0]}"),
-            InlineKeyboardButton("❌ Decline", callback_data=f"decline_{req[0]}")
-        ]]
+    text = (
+        f"👤 **ইউজার** `{user_id}`\n\n"
+        f"💰 **পয়েন্ট ব্যালেন্স:** `{profile.points}`\n"
+        f"✅ **সফল সেশন:** `{profile.successful_sessions}` বার\n"
+        f"❌ **ব্যর্থ সেশন:** `{profile.failed_sessions}` বার\n"
+        f"🎁 **রেফার কোড:** `{profile.referral_code}`\n"
+        f"👥 **সফল রেফারেল:** `{profile.referral_count}` জন\n"
+        f"📅 **শেষ লগইন:** `{profile.last_login or '-'}`\n\n"
+        f"🔗 **সক্রিয় সেশন:** `{profile.active_sessions}` টি\n"
+    )
+    for i, (phone_number, created_at, server_status, _) in enumerate(await repo.list_active_sessions(user_id), 1):
+        text += f"{i}. `{phone_number}` - {created_at} (`{server_status or 'এখনও চেক হয়নি'}`)\n"
+    await message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+WITHDRAW_SELECTION_KEY = 'withdraw_selected'  # user_data: অ্যাডমিনের সিলেক্ট করা request_id (সব পেজ মিলিয়ে)
+WITHDRAW_VIEW_KEY = 'withdraw_view'  # user_data: [page, cursor], সিলেকশন বদলালে একই পেজ আবার দেখানো হয়
+
+async def check_withdrawal_requests(update, context, page=0, cursor="n0", edit=False):
+    """পেন্ডিং উইথড্রর পেজ; প্রতিটি রিকুয়েস্ট সিলেক্ট করা যায়, নিচে বাল্ক অ্যাকশন। edit=True হলে একই মেসেজ বদলায়"""
+    backward, after = parse_page_cursor(cursor)
+    result = await repo.page_pending_withdrawals(after, backward, ITEMS_PER_PAGE)
+    message = update.message if hasattr(update, 'message') else update.callback_query.message
+    context.user_data[WITHDRAW_VIEW_KEY] = [page, cursor]
+    selected = set(context.user_data.get(WITHDRAW_SELECTION_KEY, []))
+
+    if not result.rows:
+        text, reply_markup = "✅ কোনো পেন্ডিং উইথড্র রিকুয়েস্ট নেই।", None
+    else:
+        total_pages = page_count(await repo.cached_count("pending_withdrawals"))
+        text = f"🧾 **পেন্ডিং উইথড্র রিকুয়েস্ট (পেজ {page+1}/{total_pages})**\n\n"
+        keyboard = []
+        for req in result.rows:
+            mark = "☑️" if req[0] in selected else "⬜"
+            text += (f"{mark} 🆔 `{req[0]}` | 👤 `{req[1]}` | 💰 `{req[2]}` BDT | 📱 `{req[3]}`\n")
+            keyboard.append([InlineKeyboardButton(f"{mark} #{req[0]} ({req[2]} BDT)", callback_data=router.data("withdraw_toggle", req[0]))])
+        if selected:
+            keyboard.append([
+                InlineKeyboardButton(f"✅ সিলেক্টেড অনুমোদন ({len(selected)})", callback_data=router.data("withdraw_bulk", "approved")),
+                InlineKeyboardButton(f"❌ সিলেক্টেড বাতিল ({len(selected)})", callback_data=router.data("withdraw_bulk", "declined")),
+            ])
+        keyboard.append([
+            InlineKeyboardButton("✅ এই পেজের সব অনুমোদন", callback_data=router.data("withdraw_range", result.rows[0][0], result.rows[-1][0])),
+            InlineKeyboardButton("📤 CSV", callback_data=router.data("withdraw_export")),
+        ])
+        nav_buttons = build_page_nav("withdraw_page", page, result)
+        if nav_buttons:
+            keyboard.append(nav_buttons)
         reply_markup = InlineKeyboardMarkup(keyboard)
-        message = update.message if hasattr(update, 'message') else update.callback_query.message
+
+    if edit and hasattr(update, 'edit_message_text'):
+        await update.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    else:
         await message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
 
-async def handle_withdrawal(query, context, request_id, status):
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    
-    # স্ট্যাটাস আপডেট করুন
-    cursor.execute(
-        "UPDATE withdrawals SET status = ? WHERE request_id = ?",
-        (status, request_id)
+def notify_settled_withdrawals(settled, status: str) -> None:
+    """নিষ্পত্তি হওয়া রিকুয়েস্টের মালিকদের রেট-লিমিটেড কিউতে নোটিফিকেশন"""
+    for _, user_id, amount, points_used in settled:
+        if status == 'approved':
+            text = (f"✅ আপনার `{amount}` BDT এর উইথড্র রিকুয়েস্ট অনুমোদিত হয়েছে!\n"
+                    "২৪ ঘণ্টার মধ্যে টাকা পেয়ে যাবেন।")
+        else:
+            text = (f"❌ আপনার `{amount}` BDT এর উইথড্র রিকুয়েস্ট বাতিল করা হয়েছে। "
+                    f"ব্যবহৃত পয়েন্ট (`{points_used}`) আপনার অ্যাকাউন্টে ফেরত দেওয়া হয়েছে।")
+        notifier.send(user_id, text, parse_mode=ParseMode.MARKDOWN)
+
+async def settle_withdrawals_and_report(query, context, settled, requested: int, status: str) -> None:
+    notify_settled_withdrawals(settled, status)
+    total = sum(row[2] for row in settled)
+    text = f"✅ {len(settled)} টি রিকুয়েস্ট `{status}` করা হয়েছে (মোট `{total:.2f}` BDT)।"
+    if requested > len(settled):
+        text += f"\n⚠️ {requested - len(settled)} টি রিকুয়েস্ট আগেই নিষ্পত্তি করা হয়েছিল।"
+    await query.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
+async def withdraw_queue_action(update, context, action: str, *args) -> None:
+    """উইথড্র কিউয়ের বাটন: toggle/bulk/range/filtered/export/dismiss"""
+    query = update.callback_query
+    page, cursor = context.user_data.get(WITHDRAW_VIEW_KEY, [0, "n0"])
+    selected = context.user_data.setdefault(WITHDRAW_SELECTION_KEY, [])
+    if action == "toggle":
+        request_id = args[0]
+        if request_id in selected:
+            selected.remove(request_id)
+        else:
+            selected.append(request_id)
+    elif action == "bulk":
+        status, request_ids = args[0], list(selected)
+        settled = await repo.settle_withdrawals(request_ids, status)
+        context.user_data[WITHDRAW_SELECTION_KEY] = []
+        await settle_withdrawals_and_report(query, context, settled, len(request_ids), status)
+    elif action == "range":
+        first_id, last_id = args
+        settled = await repo.settle_pending_range('approved', first_id, last_id)
+        context.user_data[WITHDRAW_SELECTION_KEY] = [i for i in selected if not first_id <= i <= last_id]
+        await settle_withdrawals_and_report(query, context, settled, len(settled), 'approved')
+        page, cursor = 0, "n0"
+    elif action == "filtered":
+        max_amount, last_id = args
+        settled = await repo.settle_pending_range('approved', 0, last_id, max_amount)
+        await query.edit_message_reply_markup(None)
+        await settle_withdrawals_and_report(query, context, settled, len(settled), 'approved')
+        return
+    elif action == "dismiss":
+        await query.edit_message_text("বাতিল করা হয়েছে।")
+        return
+    elif action == "export":
+        await send_withdrawals_csv(context, query.message.chat_id, "pending")
+        return
+    await check_withdrawal_requests(query, context, page, cursor, edit=True)
+
+async def approve_withdrawals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/approve_withdrawals [সর্বোচ্চ BDT]: ফিল্টার করা সব পেন্ডিং রিকুয়েস্ট, নিশ্চিত করার পর এক ট্রানজ্যাকশনে"""
+    if update.effective_user.id not in ALL_ADMIN_IDS:
+        return
+    try:
+        max_amount = float(context.args[0]) if context.args else float("inf")
+    except ValueError:
+        await update.message.reply_text("ব্যবহার: /approve_withdrawals [সর্বোচ্চ BDT]")
+        return
+    count, total, last_id = await repo.summarize_pending_withdrawals(max_amount)
+    if not count:
+        await update.message.reply_text("✅ এই ফিল্টারে কোনো পেন্ডিং উইথড্র রিকুয়েস্ট নেই।")
+        return
+    limit = "সব" if max_amount == float("inf") else f"`{max_amount:g}` BDT বা তার কম"
+    # last_id পর্যন্ত: নিশ্চিত করার আগে নতুন আসা রিকুয়েস্ট এই অনুমোদনে ঢোকে না
+    keyboard = InlineKeyboardMarkup([[
+        InlineKeyboardButton(f"✅ {count} টি অনুমোদন", callback_data=router.data("withdraw_filtered", max_amount, last_id)),
+        InlineKeyboardButton("❌ বাতিল", callback_data=router.data("withdraw_dismiss")),
+    ]])
+    await update.message.reply_text(
+        f"🧾 {limit} পেন্ডিং রিকুয়েস্ট: `{count}` টি, মোট `{total:.2f}` BDT। অনুমোদন করবেন?",
+        reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN
     )
-    
-    if status == 'approved':
-        # ইউজারকে নোটিফাই করুন
-        cursor.execute("SELECT user_id, amount_bdt FROM withdrawals WHERE request_id = ?", (request_id,))
-        result = cursor.fetchone()
-        user_id, amount = result[0], result[1]
-        
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"✅ আপনার `{amount}` BDT এর উইথড্র রিকুয়েস্ট অনুমোদিত হয়েছে!\n"
-                     "২৪ ঘণ্টার মধ্যে টাকা পেয়ে যাবেন।"
-            )
-        except Exception as e:
-            logger.error(f"User {user_id} কে নোটিফাই করতে ব্যর্থ: {e}")
-    else: # declined
-         # Optionally refund points if declined
-        cursor.execute("SELECT user_id, points_used FROM withdrawals WHERE request_id = ?", (request_id,))
-        result = cursor.fetchone()
-        user_id, points_used = result[0], result[1]
-        cursor.execute("UPDATE users SET points = points + ? WHERE user_id = ?", (points_used, user_id))
-        
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"❌ আপনার `{amount}` BDT এর উইথড্র রিকুয়েস্ট বাতিল করা হয়েছে। ব্যবহৃত পয়েন্ট (`{points_used}`) আপনার অ্যাকাউন্টে ফেরত দেওয়া হয়েছে।"
-            )
-        except Exception as e:
-            logger.error(f"User {user_id} কে নোটিফাই করতে ব্যর্থ: {e}")
 
-    conn.commit()
-    conn.close()
-    
-    await query.message.edit_text(f"✅ রিকুয়েস্ট `{request_id}` সফলভাবে `{status}` করা হয়েছে!", parse_mode=ParseMode.MARKDOWN)
+async def send_withdrawals_csv(context, chat_id: int, status: str = "pending", since: str = None) -> None:
+    """পেমেন্ট প্রসেসিংয়ের CSV; ডাটাবেজ কার্সর থেকে সরাসরি টেম্প ফাইলে লেখা হয়"""
+    with tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_SIZE) as raw:
+        out = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")  # utf-8-sig: Excel এ বাংলা/ইউনিকোড ঠিক দেখায়
+        count = await repo.export_withdrawals(out, status, since)
+        out.flush()
+        out.detach()
+        raw.seek(0)
+        filename = f"withdrawals_{status}_{datetime.date.today().isoformat()}.csv"
+        await context.bot.send_document(chat_id, document=InputFile(raw.read(), filename=filename),
+                                        caption=f"📤 {count} টি `{status}` উইথড্র রিকুয়েস্ট", parse_mode=ParseMode.MARKDOWN)
+
+async def export_withdrawals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export_withdrawals [pending|approved|declined] [YYYY-MM-DD থেকে]"""
+    if update.effective_user.id not in ALL_ADMIN_IDS:
+        return
+    status = context.args[0] if context.args else "pending"
+    since = context.args[1] if len(context.args) > 1 else None
+    if status not in ("pending", "approved", "declined"):
+        await update.message.reply_text("ব্যবহার: /export_withdrawals [pending|approved|declined] [YYYY-MM-DD]")
+        return
+    await send_withdrawals_csv(context, update.effective_chat.id, status, since)
 
 
-async def admin_session_management(update, context, page=0):
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    # Fetch all distinct phone numbers associated with user sessions
-    cursor.execute("SELECT DISTINCT phone_number, user_id FROM sessions")
-    sessions_db = cursor.fetchall()
-    conn.close()
+async def admin_session_management(update, context, page=0, cursor="n0"):
+    backward, after = parse_page_cursor(cursor)
+    result = await repo.page_sessions(after, backward, ITEMS_PER_PAGE)
+    message = update.message if hasattr(update, 'message') else update.callback_query.message
 
-    if not sessions_db:
-        message = update.message if hasattr(update, 'message') else update.callback_query.message
+    if not result.rows:
         await message.reply_text("কোনো সেভ করা সেশন নেই।")
         return
 
-    # For display, get associated username
     session_list = []
-    for phone, user_id in sessions_db:
-        conn = sqlite3.connect("bot_database.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT username FROM users WHERE user_id = ?", (user_id,))
-        username = cursor.fetchone()
-        conn.close()
-        username_display = username[0] if username else f"User {user_id}"
+    for _, phone, user_id, username in result.rows:
+        username_display = username if username else f"User {user_id}"
         session_list.append((f"{phone} ({username_display})", phone))
     
-    reply_markup = build_paginated_menu(session_list, "admin_session_page", page)
-    message = update.message if hasattr(update, 'message') else update.callback_query.message
-    await message.reply_text(f"🔁 **সেশন ম্যানেজমেন্ট (পেজ {page+1})**\n\nসেশন অ্যাকশনের জন্য একটি নম্বর বেছে নিন:", reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
+    total_pages = page_count(await repo.cached_count("sessions"))
+    
+    reply_markup = build_paginated_menu(session_list, "sessions", page, result)
+    await message.reply_text(f"🔁 **সেশন ম্যানেজমেন্ট (পেজ {page+1}/{total_pages})**\n\nসেশন অ্যাকশনের জন্য একটি নম্বর বেছে নিন:", reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
     return ADMIN_SESSION_ACTION
 
 async def admin_select_session_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
     
-    phone_number = context.user_data.get('admin_selected_phone') # This will be set by the button_handler
+    phone_number = context.user_data.get('admin_selected_phone') # session_select_button এ সেট হয়
     if not phone_number:
         await query.message.reply_text("⚠️ কোনো ফোন নম্বর নির্বাচন করা হয়নি। আবার চেষ্টা করুন।")
         return ConversationHandler.END
 
     keyboard = [
-        [InlineKeyboardButton("📊 স্ট্যাটাস চেক", callback_data=f"admin_session_status_{phone_number}")],
-        [InlineKeyboardButton("❌ লগআউট", callback_data=f"admin_session_logout_{phone_number}")],
-        [InlineKeyboardButton("↩️ মেনুতে ফিরে যান", callback_data="admin_session_cancel")]
+        [InlineKeyboardButton("📊 স্ট্যাটাস চেক", callback_data=router.data("session_status", phone_number))],
+        [InlineKeyboardButton("❌ লগআউট", callback_data=router.data("session_logout", phone_number))],
+        [InlineKeyboardButton("↩️ মেনুতে ফিরে যান", callback_data=router.data("session_cancel"))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -601,24 +767,26 @@ async def admin_select_session_action(update: Update, context: ContextTypes.DEFA
     )
     return ADMIN_SESSION_ACTION # Stay in this state to handle further actions
 
-async def admin_perform_session_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def admin_perform_session_action(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str,
+                                       phone_number: str) -> int:
     query = update.callback_query
-    await query.answer()
-    data = query.data.split('_')
-    action = data[2] # e.g., 'status' or 'logout'
-    phone_number = data[3]
 
     if action == "status":
-        status = await check_whatsapp_login_status(phone_number)
-        await query.edit_message_text(f"`{phone_number}` নম্বরের স্ট্যাটাস: `{status}`", parse_mode=ParseMode.MARKDOWN)
+        row = await repo.get_session_status(phone_number)
+        if row is None:
+            text = f"`{phone_number}` নম্বরের কোনো সেশন পাওয়া যায়নি।"
+        else:
+            status, server_status, last_checked_at, status_changed_at = row
+            text = (
+                f"`{phone_number}` নম্বরের স্ট্যাটাস: `{status}`\n"
+                f"সার্ভার: `{server_status or 'অজানা'}` (শেষ চেক: {last_checked_at or 'হয়নি'})\n"
+                f"স্ট্যাটাস বদলেছে: {status_changed_at or 'কখনো না'}"
+            )
+        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN)
     elif action == "logout":
         success = await terminate_whatsapp_session(phone_number)
         if success:
-            conn = sqlite3.connect("bot_database.db")
-            cursor = conn.cursor()
-            cursor.execute("UPDATE sessions SET status = 'inactive' WHERE phone_number = ?", (phone_number,))
-            conn.commit()
-            conn.close()
+            await repo.deactivate_session(phone_number)
             await query.edit_message_text(f"✅ `{phone_number}` সেশনটি সফলভাবে লগআউট করা হয়েছে।", parse_mode=ParseMode.MARKDOWN)
         else:
             await query.edit_message_text(f"❌ `{phone_number}` সেশনটি লগআউট করতে ব্যর্থ।", parse_mode=ParseMode.MARKDOWN)
@@ -629,114 +797,402 @@ async def admin_perform_session_action(update: Update, context: ContextTypes.DEF
     context.user_data.pop('admin_selected_phone', None)
     return ConversationHandler.END
 
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """অ্যাডমিন ড্যাশবোর্ড; সব সংখ্যা ট্রিগারে রাখা যোগফল থেকে, কোনো টেবিল গোনা হয় না"""
+    if update.effective_user.id not in ALL_ADMIN_IDS:
+        return
+    totals = await repo.get_stats()
+    pending_logins, queued_logins, _ = await repo.login_load()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    hourly = await repo.get_rollups("hour", (now - datetime.timedelta(hours=23)).strftime("%Y-%m-%d %H:00"))
+    daily = await repo.get_rollups("day", (now - datetime.timedelta(days=6)).strftime("%Y-%m-%d"))
+
+    logins_ok, logins_failed = totals.get("logins_successful", 0), totals.get("logins_failed", 0)
+    attempts = logins_ok + logins_failed
+    success_rate = f"{100 * logins_ok / attempts:.1f}%" if attempts else "-"
+    last_24h = collections.Counter()
+    for values in hourly.values():
+        last_24h.update(values)
+
+    text = (
+        f"📈 **পরিসংখ্যান**\n\n"
+        f"👥 মোট ইউজার: `{totals.get('users', 0)}` (রেফারেল: `{totals.get('referrals', 0)}`)\n"
+        f"📱 সক্রিয় সেশন: `{totals.get('sessions_active', 0)}` / মোট `{totals.get('sessions', 0)}` "
+        f"(আর্কাইভে `{totals.get('sessions_archived', 0)}`)\n"
+        f"🔐 পেন্ডিং লগইন: `{pending_logins}` / `{login_scheduler.capacity}`, কিউতে `{queued_logins}` জন\n"
+        f"✅ লগইন সফলতার হার: `{success_rate}` ({logins_ok} সফল, {logins_failed} ব্যর্থ)\n"
+        f"🧾 পেন্ডিং উইথড্র: `{totals.get('withdrawals_pending', 0)}` টি, "
+        f"`{totals.get('withdrawals_pending_bdt', 0):.2f}` BDT\n\n"
+        f"🕐 **গত ২৪ ঘণ্টা:** নতুন ইউজার {last_24h['new_users']}, সফল লগইন {last_24h['logins_successful']}, "
+        f"ব্যর্থ লগইন {last_24h['logins_failed']}, উইথড্র রিকুয়েস্ট {last_24h['withdrawals_requested']} "
+        f"({last_24h['withdrawals_requested_bdt']:.2f} BDT)\n\n"
+        f"📅 **গত ৭ দিন** (তারিখ: নতুন ইউজার / সফল লগইন / উইথড্র BDT):\n"
+    )
+    for day, values in sorted(daily.items()):
+        text += (
+            f"`{day}`: {values.get('new_users', 0)} / {values.get('logins_successful', 0)} / "
+            f"{values.get('withdrawals_requested_bdt', 0):.2f}\n"
+        )
+    await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+
 async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message.text
-    conn = sqlite3.connect("bot_database.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id FROM users")
-    user_ids = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    
-    success = 0
-    failed = 0
-    
-    for user_id in user_ids:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=message)
-            success += 1
-        except Exception:
-            failed += 1
-    
-    await update.message.reply_text(
-        f"✅ ব্রডকাস্ট সম্পন্ন!\n\n"
-        f"সফল: {success} ইউজার\n"
-        f"ব্যর্থ: {failed} ইউজার"
-    )
+    # ব্যাকগ্রাউন্ডে পাঠানো হয়; প্রগ্রেস মেসেজটি লাইভ আপডেট হবে
+    job_id = await broadcaster.start(context.application, message, update.effective_chat.id)
+    logger.info(f"Broadcast job {job_id} started by {update.effective_user.id}")
     return ConversationHandler.END
 
 # --- Utility Functions ---
-def build_paginated_menu(items, prefix, page):
-    start_idx = page * ITEMS_PER_PAGE
-    end_idx = start_idx + ITEMS_PER_PAGE
+def parse_page_cursor(cursor: str):
+    """'n<key>' (key এর পরের পেজ) বা 'p<key>' (key এর আগের পেজ) থেকে (backward, key) রিটার্ন করে"""
+    return cursor[0] == "p", int(cursor[1:])
+
+def page_count(total: int) -> int:
+    return max(1, -(-total // ITEMS_PER_PAGE))
+
+def build_page_nav(route, page, result):
+    # কার্সর callback_data তেই থাকে, তাই প্রতিটি পেজ একটি ইনডেক্সড রেঞ্জ কুয়েরি
+    nav_buttons = []
+    if result.has_prev:
+        nav_buttons.append(InlineKeyboardButton("◀️ আগের পেজ", callback_data=router.data(route, page - 1, f"p{result.first_key}")))
+    if result.has_next:
+        nav_buttons.append(InlineKeyboardButton("পরের পেজ ▶️", callback_data=router.data(route, page + 1, f"n{result.last_key}")))
+    return nav_buttons
+
+def build_paginated_menu(items, name, page, result):
+    """name: 'users' অথবা 'sessions'; বাটনগুলো {name}_select ও {name}_page রুটে যায়"""
     buttons = []
     
-    for item_display, item_value in items[start_idx:end_idx]:
-        buttons.append([InlineKeyboardButton(item_display, callback_data=f"{prefix}_select_{item_value}")])
-    
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("◀️ আগের পেজ", callback_data=f"{prefix}_page_{page-1}"))
-    if end_idx < len(items):
-        nav_buttons.append(InlineKeyboardButton("পরের পেজ ▶️", callback_data=f"{prefix}_page_{page+1}"))
+    for item_display, item_value in items:
+        buttons.append([InlineKeyboardButton(item_display, callback_data=router.data(f"{name}_select", item_value))])
     
+    nav_buttons = build_page_nav(f"{name}_page", page, result)
     if nav_buttons:
         buttons.append(nav_buttons)
         
     return InlineKeyboardMarkup(buttons)
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    # লগইনের কিউ বা QR এর অপেক্ষায় থাকলে সেটিও ছেড়ে দেয়, যাতে সার্ভারের সেশন ঝুলে না থাকে
+    user_id = update.effective_user.id
+    await login_scheduler.leave(user_id)
+    context.user_data.pop('phone_number', None)  # আগের ভার্সনে persist হওয়া মান
+    phone_number = await repo.get_user_login(user_id)
+    pending = await repo.get_pending_login(phone_number) if phone_number else None
+    if pending and pending[0] == user_id and await claim_pending_login(phone_number) is not None:
+        await terminate_whatsapp_session(phone_number)
+        await admit_queued_logins(context.application)
     await update.message.reply_text("অপারেশন বাতিল করা হয়েছে।", reply_markup=get_main_keyboard(update.effective_user.id))
     return ConversationHandler.END
 
 # --- Button Handlers ---
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# রুটের হ্যান্ডলার (update, context, *args); args callback_data থেকে টাইপসহ ডিকোড হয়ে আসে।
+# query.answer() CallbackRouter.dispatch এ একবারই হয়, এখানে নয়।
+async def users_page_button(update, context, page, cursor):
+    await list_all_users(update.callback_query, context, page, cursor)
+
+async def users_select_button(update, context, user_id):
+    await show_user_details(update.callback_query.message, user_id)
+
+async def sessions_page_button(update, context, page, cursor):
+    return await admin_session_management(update.callback_query, context, page, cursor)
+
+async def session_select_button(update, context, phone_number):
+    context.user_data['admin_selected_phone'] = phone_number
+    return await admin_select_session_action(update, context)
+
+async def session_cancel_button(update, context):
     query = update.callback_query
-    await query.answer()
-    data = query.data.split('_')
-    
-    prefix = data[0] + "_" + data[1] if len(data) > 1 and data[1] in ["users", "session"] else data[0]
-
-    if prefix == "admin_users_page": # Pagination for user list
-        page = int(data[3])
-        await list_all_users(query, context, page)
-    elif prefix == "admin_session_page": # Pagination for session list
-        if data[2] == "page":
-            page = int(data[3])
-            await admin_session_management(query, context, page)
-        elif data[2] == "select":
-            phone_number = data[3]
-            context.user_data['admin_selected_phone'] = phone_number
-            await admin_select_session_action(update, context) # Pass update to new handler
-            return ADMIN_SESSION_ACTION
-    elif prefix == "approve":
-        request_id = int(data[1])
-        await handle_withdrawal(query, context, request_id, 'approved')
-    elif prefix == "decline":
-        request_id = int(data[1])
-        await handle_withdrawal(query, context, request_id, 'declined')
-    elif prefix == "admin_session_status" or prefix == "admin_session_logout":
-        await admin_perform_session_action(update, context) # Handle status/logout actions
-        return ConversationHandler.END # End the conversation after action
-    elif query.data == "admin_session_cancel":
-        await query.message.edit_text("সেশন ম্যানেজমেন্ট বাতিল করা হয়েছে।")
-        await context.bot.send_message(query.message.chat_id, "প্রধান মেনু:", reply_markup=get_main_keyboard(update.effective_user.id))
-        return ConversationHandler.END
+    await query.message.edit_text("সেশন ম্যানেজমেন্ট বাতিল করা হয়েছে।")
+    await context.bot.send_message(query.message.chat_id, "প্রধান মেনু:", reply_markup=get_main_keyboard(update.effective_user.id))
+    return ConversationHandler.END
 
-def main() -> None:
-    setup_database()
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def withdraw_page_button(update, context, page, cursor):
+    await check_withdrawal_requests(update.callback_query, context, page, cursor, edit=True)
+
+def with_action(handler, action: str):
+    """একই হ্যান্ডলারের কয়েকটি রুট: বাটনের আর্গুমেন্টের আগে action বসিয়ে দেয়"""
+    async def callback(update, context, *args):
+        return await handler(update, context, action, *args)
+    return callback
+
+# (অপকোড, নাম, হ্যান্ডলার, আর্গুমেন্ট ফরম্যাট, শুধু অ্যাডমিন)। অপকোড একবার দেওয়ার পর আর বদলাবেন না,
+# নাহলে চ্যাটে আগে পাঠানো বাটনগুলো অন্য রুটে চলে যাবে; রুট বাদ দিলে তার অপকোড আর ব্যবহার করবেন না।
+CALLBACK_ROUTES = [
+    (0x01, "users_page", users_page_button, "is", True),
+    (0x02, "users_select", users_select_button, "i", True),
+    (0x10, "sessions_page", sessions_page_button, "is", True),
+    (0x11, "sessions_select", session_select_button, "s", True),
+    (0x12, "session_status", with_action(admin_perform_session_action, "status"), "s", True),
+    (0x13, "session_logout", with_action(admin_perform_session_action, "logout"), "s", True),
+    (0x14, "session_cancel", session_cancel_button, "", True),
+    (0x20, "withdraw_page", withdraw_page_button, "is", True),
+    (0x21, "withdraw_toggle", with_action(withdraw_queue_action, "toggle"), "i", True),
+    (0x22, "withdraw_bulk", with_action(withdraw_queue_action, "bulk"), "s", True),
+    (0x23, "withdraw_range", with_action(withdraw_queue_action, "range"), "ii", True),
+    (0x24, "withdraw_filtered", with_action(withdraw_queue_action, "filtered"), "fi", True),
+    (0x25, "withdraw_dismiss", with_action(withdraw_queue_action, "dismiss"), "", True),
+    (0x26, "withdraw_export", with_action(withdraw_queue_action, "export"), "", True),
+]
+for opcode, name, handler, fmt, admin_only in CALLBACK_ROUTES:
+    router.add(opcode, name, handler, fmt, admin=admin_only)
+
+def wrap_handler_callbacks(application: Application, wrapper) -> None:
+    """রেজিস্টার করা সব হ্যান্ডলারের callback (ConversationHandler এর ভেতরেরগুলোসহ) wrapper দিয়ে মুড়ে দেয়"""
+    def _wrap(handler):
+        if isinstance(handler, ConversationHandler):
+            for state_handlers in handler.states.values():
+                for inner in state_handlers:
+                    _wrap(inner)
+            for inner in handler.entry_points + handler.fallbacks:
+                _wrap(inner)
+        else:
+            handler.callback = wrapper(handler.callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _wrap(handler)
+
+def maintenance_job(job: str):
+    """JobQueue কলব্যাকের সময়কাল MAINTENANCE_SECONDS এ `job` লেবেলে যায় (ব্যর্থ হলেও)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(context):
+            started = time.perf_counter()
+            try:
+                await fn(context)
+            finally:
+                MAINTENANCE_SECONDS.labels(job).observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+@maintenance_job("ledger_compact")
+async def compact_points_ledger_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    compacted = await repo.compact_points_ledger()
+    mismatched = await repo.audit_points()
+    logger.info(f"Compacted {compacted} points ledger entries")
+    if mismatched:
+        logger.error(f"Points balance does not match the ledger for users: {mismatched[:20]}")
+
+@maintenance_job("stats_audit")
+async def audit_stats_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """পুরনো ঘণ্টাভিত্তিক রোলআপ মোছে এবং stats_totals পুরো গণনার সাথে মেলায়"""
+    pruned = await repo.prune_stats_rollups()
+    drift = await repo.audit_stats()
+    logger.info(f"Pruned {pruned} hourly stats rollups")
+    if drift:
+        logger.error(f"Stats aggregates do not match a full recount: {drift}")
+
+@maintenance_job("referral_audit")
+async def audit_referrals_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    referral_mismatches = await repo.audit_referrals()
+    logger.info(f"Audited referral counts, {len(referral_mismatches)} mismatched")
+    if referral_mismatches:
+        logger.error(f"referral_count does not match referred_by for users: {referral_mismatches[:20]}")
+
+async def backup_database_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """চলমান ডাটাবেজের অনলাইন ব্যাকআপ; কপি আলাদা থ্রেডে চলে, লেখা থামে না"""
+    await asyncio.to_thread(backup_database, DB_PATH)
+
+async def archive_rows_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """পুরনো inactive সেশন ও নিষ্পত্তি হওয়া উইথড্র ছোট ব্যাচে আর্কাইভ ফাইলে সরায়"""
+    await archive_old_rows(repo.db)
+
+async def incremental_vacuum_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """আর্কাইভের পর খালি হওয়া পেজ অল্প অল্প করে ফাইল থেকে ছেড়ে দেয়"""
+    await incremental_vacuum(repo.db)
+
+async def sweep_sessions_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """সেশন হেলথ সুইপ; পরের সুইপ নিজেই শিডিউল করে, বিরতি সেশনের সংখ্যা অনুযায়ী বাড়ে"""
+    checked = 0
+    try:
+        checked = await sweeper.sweep(wa_client)
+    finally:
+        context.job_queue.run_once(sweep_sessions_job, sweep_interval(checked), name="session_sweep")
+
+def register_state_gauges(application: Application, conv_handler: ConversationHandler) -> None:
+    """মেমরিতে থাকা স্টেটের আকার; /metrics স্ক্র্যাপের সময় হিসাব হয়"""
+    # PTB কনভারসেশনের স্টেট পাবলিকভাবে দেখায় না, তাই _conversations পড়া হয়
+    Gauge("bot_conversations", "Open conversations by state", ("state",),
+          collect=lambda: {(str(state),): n for state, n in collections.Counter(conv_handler._conversations.values()).items()})
+    Gauge("bot_user_data_entries", "Users with in-memory user_data", collect=lambda: len(application.user_data))
+    Gauge("bot_profile_cache_entries", "Cached user profiles", collect=lambda: len(repo.profiles))
+    Gauge("bot_profile_cache_hit_ratio", "Profile cache hit ratio since start", collect=lambda: repo.profiles.hit_rate)
+    Gauge("bot_write_behind_pending", "Writes waiting for the next group commit",
+          collect=lambda: repo.write_behind.stats()["pending"])
+
+async def on_startup(application: Application) -> None:
+    await wa_client.start()
+    notifier.start(application.bot)
+    if not application.bot_data['primary']:
+        return
+    # ইভেন্ট সার্ভার, ব্রডকাস্ট ও জবগুলো শুধু প্রথম ওয়ার্কারে চলে
+    event_server = EventServer(
+        BOT_EVENTS_HOST, BOT_EVENTS_PORT,
+        lambda event: handle_session_event(application, event),
+        secret=BOT_EVENTS_SECRET,
+    )
+    event_server.app.router.add_get("/metrics", metrics_handler)  # শুধু লোকাল ইন্টারফেসে
+    await event_server.start()
+    application.bot_data['event_server'] = event_server
+    await broadcaster.resume(application)
+
+async def on_stop(application: Application) -> None:
+    # shutdown() বটের HTTP ক্লায়েন্ট বন্ধ করে, তাই বাকি নোটিফিকেশন তার আগেই পাঠাতে হয়
+    await notifier.stop()
+
+async def on_shutdown(application: Application) -> None:
+    await broadcaster.stop()
+    if 'event_server' in application.bot_data:
+        await application.bot_data['event_server'].stop()
+    await wa_client.close()
+    await repo.flush()
+    logger.info(f"Profile cache stats: {repo.profiles.stats()}")
+    repo.close()
+
+def build_application(token: str = TELEGRAM_BOT_TOKEN, base_url: str = None, shard=(0, 1)) -> Application:
+    """সব হ্যান্ডলার ও জবসহ Application তৈরি করে; base_url দিয়ে অন্য Bot API সার্ভার (যেমন লোড টেস্টের ফেক) ব্যবহার করা যায়।
+
+    shard=(index, count): একাধিক ওয়ার্কারের একটি; আপডেট রাউটার থেকে আসে তাই নিজস্ব updater থাকে না।
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .persistence(SQLitePersistence(repo.db, repo.write_behind, shard))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if shard[1] > 1:
+        builder = builder.updater(None)
+    application = builder.build()
+    application.bot_data['primary'] = shard[0] == 0
 
     # Conversation Handlers
+    # মেনু বাটনগুলোও entry point, যাতে লগইন/উইথড্র/ব্রডকাস্ট স্টেটে ঢোকা যায়;
+    # allow_reentry দিয়ে যেকোনো স্টেট থেকে মেনুতে ফিরে আসা যায়
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[
+            CommandHandler("start", start),
+            MessageHandler(filters.Regex(MAIN_MENU_PATTERN), main_menu_handler),
+        ],
         states={
             PHONE_NUMBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_phone_number)],
             WAIT_FOR_QR_CONFIRMATION: [CommandHandler("confirm", confirm_login)],
             WITHDRAW_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, ask_withdraw_number)],
             WITHDRAW_NUMBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_withdraw_request)],
             BROADCAST_MESSAGE: [MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast_message)],
-            ADMIN_SESSION_ACTION: [CallbackQueryHandler(button_handler)], # Handle actions within this state
+            ADMIN_SESSION_ACTION: [CallbackQueryHandler(router.dispatch)], # Handle actions within this state
         },
         fallbacks=[CommandHandler('cancel', cancel)],
+        allow_reentry=True,
+        name="main_conversation",
+        persistent=True,
     )
     
     # Add handlers
     application.add_handler(conv_handler)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, main_menu_handler))
-    application.add_handler(CallbackQueryHandler(button_handler)) # General button handler for non-conversation states
+    application.add_handler(CallbackQueryHandler(router.dispatch)) # General button handler for non-conversation states
+    application.add_handler(CommandHandler("stats", show_stats))
+    application.add_handler(CommandHandler("approve_withdrawals", approve_withdrawals_command))
+    application.add_handler(CommandHandler("export_withdrawals", export_withdrawals_command))
+
+    if DB_QUERY_DEBUG:
+        wrap_handler_callbacks(application, count_queries)
+    wrap_handler_callbacks(application, functools.partial(instrument_handler, decode=router.decode))
+    register_state_gauges(application, conv_handler)
+
+    if application.bot_data['primary']:
+        application.job_queue.run_repeating(compact_points_ledger_job, interval=LEDGER_COMPACT_INTERVAL, first=60,
+                                            name="ledger_compact")
+        application.job_queue.run_repeating(audit_stats_job, interval=STATS_AUDIT_INTERVAL, first=120,
+                                            name="stats_audit")
+        application.job_queue.run_repeating(audit_referrals_job, interval=REFERRAL_AUDIT_INTERVAL, first=180,
+                                            name="referral_audit")
+        application.job_queue.run_once(sweep_sessions_job, 30, name="session_sweep")
+        application.job_queue.run_repeating(expire_logins_job, interval=LOGIN_EXPIRY_INTERVAL, first=LOGIN_EXPIRY_INTERVAL)
+        # রক্ষণাবেক্ষণের জবগুলো আলাদা সময়ে শুরু হয়, যাতে একসাথে ডিস্ক দখল না করে
+        application.job_queue.run_repeating(backup_database_job, interval=BACKUP_INTERVAL, first=300)
+        application.job_queue.run_repeating(archive_rows_job, interval=ARCHIVE_INTERVAL, first=600)
+        application.job_queue.run_repeating(incremental_vacuum_job, interval=VACUUM_INTERVAL, first=900)
+    return application
+
+async def serve_worker(index: int, count: int, token: str = TELEGRAM_BOT_TOKEN, base_url: str = None) -> None:
+    """একটি ওয়ার্কার প্রসেস: রাউটার থেকে 127.0.0.1:(BOT_WORKER_BASE_PORT + index)/update এ আপডেট নেয়"""
+    repo.profiles.ttl = WORKER_PROFILE_CACHE_TTL
+    application = build_application(token, base_url, shard=(index, count))
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    updates_app = worker_update_app(application)
+    updates_app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(updates_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", BOT_WORKER_BASE_PORT + index).start()
+    logger.info(f"Worker {index}/{count} ready on port {BOT_WORKER_BASE_PORT + index}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await runner.cleanup()
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
 
-    logger.info("বট সফলভাবে চালু হয়েছে...")
-    application.run_polling()
+def run_worker(index: int, count: int) -> None:
+    asyncio.run(serve_worker(index, count, base_url=TELEGRAM_API_BASE_URL))
+
+def run_sharded() -> None:
+    """BOT_WORKERS টি ওয়ার্কার প্রসেস চালু করে এবং এই প্রসেসে webhook রাউটার চালায়"""
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(i, BOT_WORKERS), name=f"bot-worker-{i}")
+               for i in range(BOT_WORKERS)]
+    for worker in workers:
+        worker.start()
+
+    router = UpdateRouter(
+        [f"http://127.0.0.1:{BOT_WORKER_BASE_PORT + i}/update" for i in range(BOT_WORKERS)],
+        path=BOT_WEBHOOK_PATH, secret=BOT_WEBHOOK_SECRET,
+    )
+
+    async def set_webhook(app) -> None:
+        async with Bot(TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_BASE_URL or "https://api.telegram.org/bot") as telegram_bot:
+            await telegram_bot.set_webhook(BOT_WEBHOOK_URL + BOT_WEBHOOK_PATH, secret_token=BOT_WEBHOOK_SECRET)
+
+    router.app.on_startup.append(set_webhook)
+    try:
+        web.run_app(router.app, host=BOT_WEBHOOK_LISTEN, port=BOT_WEBHOOK_PORT, access_log=None)
+    finally:
+        for worker in workers:
+            worker.terminate()  # SIGTERM: ওয়ার্কার নিজের স্টেট ও write-behind ফ্লাশ করে বন্ধ হয়
+        for worker in workers:
+            worker.join()
+
+def main() -> None:
+    apply_migrations(DB_PATH)
+    if BOT_WEBHOOK_URL and BOT_WORKERS > 1:
+        logger.info(f"বট {BOT_WORKERS} টি ওয়ার্কারে webhook মোডে চালু হচ্ছে...")
+        run_sharded()
+        return
+    application = build_application(base_url=TELEGRAM_API_BASE_URL)
+    logger.info("বট সফলভাবে চালু হয়েছে...")
+    if BOT_WEBHOOK_URL:
+        application.run_webhook(
+            listen=BOT_WEBHOOK_LISTEN,
+            port=BOT_WEBHOOK_PORT,
+            url_path=BOT_WEBHOOK_PATH,
+            webhook_url=BOT_WEBHOOK_URL + BOT_WEBHOOK_PATH,
+            secret_token=BOT_WEBHOOK_SECRET,
+        )
+    else:
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,235 @@
+"""রেট-লিমিটেড, রিস্টার্টে resume হওয়া ব্রডকাস্ট।
+
+    python broadcast.py --bench [users]   # ফেক Bot API এর বিপরীতে বিভিন্ন concurrency তে মেসেজ/সেকেন্ড
+"""
+import os
+import sys
+import asyncio
+import datetime
+import logging
+import random
+import tempfile
+import time
+
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+from metrics import BROADCAST_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_RATE = 25  # প্রতি সেকেন্ডে সর্বোচ্চ মেসেজ, বটে Notifier এর সাথে মিলিয়ে (টেলিগ্রামের গ্লোবাল লিমিট ~30/s)
+BROADCAST_CONCURRENCY = 10
+BROADCAST_BATCH_SIZE = 100  # ব্যাচ শেষে প্রগ্রেস সেভ হয়; ক্র্যাশে সর্বোচ্চ এক ব্যাচ পুনরায় যেতে পারে
+BROADCAST_MAX_RETRIES = 3
+BROADCAST_PROGRESS_INTERVAL = 5.0  # সেকেন্ড পরপর সুপার অ্যাডমিনকে প্রগ্রেস দেখানো হয়
+PROGRESS_HEADERS = {
+    "running": "📤 ব্রডকাস্ট চলছে...",
+    "done": "✅ ব্রডকাস্ট সম্পন্ন!",
+    "failed": "❌ ত্রুটির কারণে ব্রডকাস্ট থেমে গেছে; বাকি ইউজারদের পাঠানো হয়নি। লগ দেখে আবার ব্রডকাস্ট করুন।",
+}
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    if isinstance(delay, datetime.timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+
+class TokenBucket:
+    """সাধারণ async টোকেন বাকেট; RetryAfter পেলে pause() দিয়ে সবাইকে থামানো যায়"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastEngine:
+    """ডাটাবেজে সেভ করা ব্রডকাস্ট জব চালায়; রিস্টার্টের পর যেখানে থেমেছিল সেখান থেকে চালু হয়"""
+
+    def __init__(self, repo, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY,
+                 batch_size: int = BROADCAST_BATCH_SIZE):
+        self.repo = repo
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._tasks = {}
+
+    async def start(self, application, text: str, admin_chat_id: int) -> int:
+        job_id = await self.repo.create_broadcast_job(text, admin_chat_id)
+        job = await self.repo.get_broadcast_job(job_id)
+        message = await application.bot.send_message(chat_id=admin_chat_id, text=self._progress_text(job))
+        await self.repo.set_broadcast_progress_message(job_id, message.message_id)
+        self._spawn(application, job_id)
+        return job_id
+
+    async def resume(self, application) -> None:
+        for job_id in await self.repo.list_running_broadcasts():
+            logger.info(f"Resuming broadcast job {job_id}")
+            self._spawn(application, job_id)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, application, job_id: int) -> None:
+        if job_id in self._tasks:
+            return
+        task = application.create_task(self._run(application.bot, job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, bot, job_id: int) -> None:
+        try:
+            await self._deliver(bot, job_id)
+        except Exception:
+            # CancelledError (বন্ধের সময়) এখানে ধরা পড়ে না, তাই সেই জব 'running' থেকে পরের চালুতে resume হয়
+            logger.exception(f"Broadcast job {job_id} failed")
+            try:
+                await self.repo.finish_broadcast(job_id, "failed")
+                await self._report(bot, await self.repo.get_broadcast_job(job_id))
+            except Exception as e:
+                logger.error(f"Could not mark broadcast job {job_id} as failed: {e}")
+
+    async def _deliver(self, bot, job_id: int) -> None:
+        job = await self.repo.get_broadcast_job(job_id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_report = 0.0
+
+        async def deliver(user_id):
+            async with semaphore:
+                return user_id, await self._send(bot, user_id, job["text"])
+
+        while True:
+            recipients = await self.repo.fetch_broadcast_recipients(job_id, job["last_user_id"], self.batch_size)
+            if not recipients:
+                break
+            results = await asyncio.gather(*(deliver(user_id) for user_id in recipients))
+            for _, (status, _) in results:
+                BROADCAST_MESSAGES.labels(status).inc()
+            await self.repo.record_broadcast_batch(job_id, results, recipients[-1])
+            job = await self.repo.get_broadcast_job(job_id)
+            if time.monotonic() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+                await self._report(bot, job)
+                last_report = time.monotonic()
+
+        await self.repo.finish_broadcast(job_id)
+        job = await self.repo.get_broadcast_job(job_id)
+        await self._report(bot, job)
+        logger.info(f"Broadcast job {job_id} finished: {job['sent']} sent, {job['failed']} failed")
+
+    async def _send(self, bot, user_id: int, text: str):
+        """(status, error) রিটার্ন করে; status হয় 'sent' অথবা 'failed'"""
+        error = "retries exhausted"
+        for _ in range(BROADCAST_MAX_RETRIES):
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id=user_id, text=text)
+                return "sent", None
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                logger.warning(f"Flood limit hit during broadcast, pausing {delay}s")
+                self.bucket.pause(delay)
+            except (Forbidden, BadRequest) as e:
+                return "failed", str(e)  # ইউজার বট ব্লক করেছে বা চ্যাট নেই; রিট্রাই অর্থহীন
+            except TelegramError as e:
+                error = str(e)
+                await asyncio.sleep(1)
+        return "failed", error
+
+    def _progress_text(self, job) -> str:
+        return (
+            f"{PROGRESS_HEADERS[job['status']]}\n\n"
+            f"সফল: {job['sent']} ইউজার\n"
+            f"ব্যর্থ: {job['failed']} ইউজার\n"
+            f"মোট: {job['total']} ইউজার"
+        )
+
+    async def _report(self, bot, job) -> None:
+        if not job["progress_message_id"]:
+            return
+        try:
+            await bot.edit_message_text(
+                chat_id=job["admin_chat_id"],
+                message_id=job["progress_message_id"],
+                text=self._progress_text(job),
+            )
+        except TelegramError as e:
+            logger.warning(f"Broadcast progress update failed: {e}")
+
+
+BENCH_CONCURRENCY = (1, 10, 50)
+BENCH_LATENCY = 0.05  # সেকেন্ড; ফেক API এর প্রতি কলের দেরি, Telegram এর রাউন্ড-ট্রিপের কাছাকাছি
+
+
+async def _bench(users: int) -> None:
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    from db import DBExecutor
+    from loadtest import FAKE_TOKEN, FakeTelegram, seed_users, serve
+    from migrations import apply_migrations
+    from repository import Repository
+
+    # রেট লিমিট খোলা রেখে ইঞ্জিনের নিজের খরচ (কিপসেট পড়া, ব্যাচ লেখা, HTTP) মাপা হয়; শেষ সারিটি বটের আসল রেটে
+    # concurrency 1 এ প্রতি মেসেজে একটি পুরো রাউন্ড-ট্রিপ, তাই সেখানে কম প্রাপক
+    modes = [(f"concurrency {n}", n, 10 ** 6, users if n > 1 else min(users, 200)) for n in BENCH_CONCURRENCY]
+    modes.append((f"rate {BROADCAST_RATE}/s", BROADCAST_CONCURRENCY, BROADCAST_RATE, min(users, 10 * BROADCAST_RATE)))
+    telegram = FakeTelegram(latency=BENCH_LATENCY)
+    runner, url = await serve(telegram.app)
+    print(f"broadcast against the fake Bot API ({BENCH_LATENCY * 1000:.0f} ms per call), batch {BROADCAST_BATCH_SIZE}")
+    print(f"{'mode':<18}{'recipients':>11}{'seconds':>9}{'msgs/s':>9}")
+    try:
+        # Application এর ডিফল্টের মতো বড় কানেকশন পুল, নাহলে concurrency এর কোনো মানে থাকে না
+        async with Bot(FAKE_TOKEN, base_url=f"{url}/bot", request=HTTPXRequest(connection_pool_size=256)) as bot:
+            with tempfile.TemporaryDirectory(prefix="broadcast-bench-") as workdir:
+                for name, concurrency, rate, count in modes:
+                    path = os.path.join(workdir, f"{len(os.listdir(workdir))}.db")
+                    apply_migrations(path)
+                    repo = Repository(DBExecutor(path))
+                    await repo.db.write(seed_users, count, random.Random(1))
+                    job_id = await repo.create_broadcast_job("bench", 1)
+                    engine = BroadcastEngine(repo, rate=rate, concurrency=concurrency)
+                    start = time.perf_counter()
+                    await engine._run(bot, job_id)
+                    elapsed = time.perf_counter() - start
+                    job = await repo.get_broadcast_job(job_id)
+                    assert job["status"] == "done" and job["sent"] == count, dict(job)
+                    await repo.flush()
+                    repo.close()
+                    print(f"{name:<18}{count:>11}{elapsed:>9.2f}{count / elapsed:>9.0f}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    logging.basicConfig(level=logging.WARNING)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(_bench(int(args[0]) if args else 5000))
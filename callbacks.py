@@ -0,0 +1,274 @@
+"""Inline বাটনের callback_data এনকোডিং ও রাউটিং।
+
+callback_data = CALLBACK_VERSION + base64url(অপকোড বাইট + ফরম্যাট অনুযায়ী আর্গুমেন্ট)। ফরম্যাটের অক্ষর:
+'i' পূর্ণসংখ্যা (zigzag varint), 'f' float (৮ বাইট), 's' স্ট্রিং (varint দৈর্ঘ্য + UTF-8)।
+এনকোড করা ডাটা Telegram এর ৬৪ বাইট সীমা ছাড়ালে আর্গুমেন্টগুলো সার্ভারে TokenStore এ থাকে
+এবং বাটনে শুধু একটি ছোট টোকেন যায়।
+
+    python callbacks.py --bench   # এলোমেলো আর্গুমেন্টে এনকোড/ডিকোড রাউন্ড-ট্রিপ যাচাই ও ডিসপ্যাচ বেঞ্চমার্ক
+
+এনকোডিং, TokenStore ও ভুল ডাটার টেস্ট tests/test_callbacks.py তে।
+"""
+import os
+import sys
+import math
+import time
+import base64
+import random
+import struct
+import logging
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_VERSION = "1"  # পুরনো ফরম্যাটের ('admin_users_page_0_n5' ইত্যাদি) ডাটা কখনো এই অক্ষর দিয়ে শুরু হয় না
+CALLBACK_DATA_LIMIT = 64  # Telegram এর সীমা (বাইট)
+TOKEN_OPCODE = 0  # এর পরের বাইটগুলো TokenStore এর কী
+TOKEN_SIZE = 6
+CALLBACK_TOKEN_TTL = 24 * 60 * 60.0  # সেকেন্ড; এরপর টোকেনওয়ালা বাটন "মেয়াদোত্তীর্ণ"
+CALLBACK_TOKEN_LIMIT = 50000  # মেমরিতে সর্বোচ্চ টোকেন; পুরনোগুলো আগে বাদ পড়ে
+EXPIRED_NOTICE = "⚠️ এই বাটনটির মেয়াদ শেষ হয়ে গেছে। মেনু থেকে আবার খুলুন।"
+
+_DOUBLE = struct.Struct(">d")
+
+# handler(update, context, *args) -> ConversationHandler এর পরের স্টেট অথবা None
+Route = namedtuple("Route", "opcode name handler fmt admin")
+
+
+class InvalidCallbackData(ValueError):
+    pass
+
+
+def _put_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(raw: bytes, pos: int):
+    value, shift = 0, 0
+    while True:
+        if pos >= len(raw) or shift > 63:
+            raise InvalidCallbackData("truncated varint")
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def pack_args(fmt: str, args) -> bytes:
+    """ফরম্যাট অনুযায়ী আর্গুমেন্টগুলোর বাইট; টাইপ না মিললে TypeError/ValueError"""
+    if len(args) != len(fmt):
+        raise ValueError(f"format {fmt!r} needs {len(fmt)} arguments, got {len(args)}")
+    out = bytearray()
+    for kind, value in zip(fmt, args):
+        if kind == "i":
+            if isinstance(value, bool) or not isinstance(value, int) or not -2 ** 63 <= value < 2 ** 63:
+                raise TypeError(f"expected a 64-bit int, got {value!r}")
+            _put_varint(out, (value << 1) ^ (value >> 63))
+        elif kind == "f":
+            out += _DOUBLE.pack(float(value))
+        elif kind == "s":
+            encoded = value.encode()
+            _put_varint(out, len(encoded))
+            out += encoded
+        else:
+            raise ValueError(f"unknown format character {kind!r}")
+    return bytes(out)
+
+
+def unpack_args(fmt: str, raw: bytes, pos: int = 0) -> tuple:
+    args = []
+    try:
+        for kind in fmt:
+            if kind == "i":
+                value, pos = _get_varint(raw, pos)
+                args.append((value >> 1) ^ -(value & 1))
+            elif kind == "f":
+                args.append(_DOUBLE.unpack_from(raw, pos)[0])
+                pos += _DOUBLE.size
+            else:
+                length, pos = _get_varint(raw, pos)
+                if pos + length > len(raw):
+                    raise InvalidCallbackData("truncated string")
+                args.append(raw[pos:pos + length].decode())
+                pos += length
+    except (struct.error, UnicodeDecodeError) as e:
+        raise InvalidCallbackData(str(e)) from e
+    if pos != len(raw):
+        raise InvalidCallbackData("trailing bytes")
+    return tuple(args)
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    try:
+        return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+    except ValueError as e:
+        raise InvalidCallbackData(str(e)) from e
+
+
+class TokenStore:
+    """৬৪ বাইটে না আঁটা callback পেলোড; টোকেন -> পেলোড এর LRU/TTL ম্যাপ (শুধু এই প্রসেসের মেমরিতে)।
+
+    আপডেট user_id অনুযায়ী ওয়ার্কারে ভাগ হয়, তাই বাটন যে ইউজার পেয়েছে তার ক্লিক একই প্রসেসে আসে;
+    রিস্টার্টের পর টোকেনওয়ালা বাটন মেয়াদোত্তীর্ণ দেখায়।
+    """
+
+    def __init__(self, ttl: float = CALLBACK_TOKEN_TTL, max_entries: int = CALLBACK_TOKEN_LIMIT):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, payload: bytes) -> bytes:
+        token = os.urandom(TOKEN_SIZE)
+        self._entries[token] = (time.monotonic() + self.ttl, payload)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return token
+
+    def get(self, token: bytes):
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(token, None)
+            return None
+        return entry[1]
+
+
+class CallbackRouter:
+    """অপকোড -> Route টেবিল; একটি CallbackQueryHandler এর callback হিসেবে dispatch() ব্যবহার হয়।
+
+    ConversationHandler এর ভেতরে ও বাইরে একই dispatch(), তাই বাটনের আচরণ স্টেটের উপর নির্ভর করে না;
+    হ্যান্ডলারের রিটার্ন মান কনভারসেশনের পরের স্টেট।
+    """
+
+    def __init__(self, admin_ids=(), tokens: TokenStore = None):
+        self.admin_ids = admin_ids
+        self.tokens = tokens if tokens is not None else TokenStore()  # খালি TokenStore ও falsy (__len__)
+        self._by_opcode = {}
+        self._by_name = {}
+
+    def add(self, opcode: int, name: str, handler, fmt: str = "", admin: bool = False) -> None:
+        """অপকোড বদলালে আগে পাঠানো বাটনগুলো ভুল রুটে যাবে; তাই একবার দেওয়া অপকোড আর বদলাবেন না"""
+        if not 0 < opcode < 256 or opcode in self._by_opcode or name in self._by_name:
+            raise ValueError(f"callback route {name!r} has an invalid or duplicate opcode {opcode}")
+        pack_args(fmt, [0 if kind == "i" else 0.0 if kind == "f" else "" for kind in fmt])  # ফরম্যাট যাচাই
+        route = Route(opcode, name, handler, fmt, admin)
+        self._by_opcode[opcode] = route
+        self._by_name[name] = route
+
+    def data(self, name: str, *args) -> str:
+        """বাটনের callback_data; খুব বড় হলে আর্গুমেন্ট সার্ভারে রেখে টোকেন"""
+        route = self._by_name[name]
+        raw = bytes((route.opcode,)) + pack_args(route.fmt, args)
+        data = CALLBACK_VERSION + _b64encode(raw)
+        if len(data) > CALLBACK_DATA_LIMIT:
+            data = CALLBACK_VERSION + _b64encode(bytes((TOKEN_OPCODE,)) + self.tokens.put(raw))
+        return data
+
+    def decode(self, data: str):
+        """(Route, args); পুরনো ফরম্যাট, অজানা অপকোড বা মেয়াদোত্তীর্ণ টোকেনে InvalidCallbackData"""
+        if not data or data[0] != CALLBACK_VERSION:
+            raise InvalidCallbackData("unknown callback data format")
+        raw = _b64decode(data[1:])
+        if raw[:1] == bytes((TOKEN_OPCODE,)):
+            raw = self.tokens.get(raw[1:])
+            if raw is None:
+                raise InvalidCallbackData("expired token")
+        route = self._by_opcode.get(raw[0]) if raw else None
+        if route is None:
+            raise InvalidCallbackData("unknown opcode")
+        return route, unpack_args(route.fmt, raw, 1)
+
+    async def dispatch(self, update, context):
+        query = update.callback_query
+        try:
+            route, args = self.decode(query.data)
+        except InvalidCallbackData as e:
+            logger.info(f"Stale callback data {query.data!r} from {query.from_user.id}: {e}")
+            await query.answer(EXPIRED_NOTICE, show_alert=True)
+            return None
+        await query.answer()  # প্রতিটি কুয়েরির উত্তর শুধু এখানে, হ্যান্ডলারে নয়
+        if route.admin and query.from_user.id not in self.admin_ids:
+            logger.warning(f"User {query.from_user.id} pressed admin button {route.name}")
+            return None
+        return await route.handler(update, context, *args)
+
+
+def _random_value(kind: str, rng: random.Random):
+    if kind == "i":
+        return rng.choice([0, -1, 1, 2 ** 63 - 1, -2 ** 63, rng.randrange(-2 ** 40, 2 ** 40)])
+    if kind == "f":
+        return rng.choice([0.0, -0.5, math.inf, rng.uniform(-1e9, 1e9)])
+    return "".join(rng.choice("+0123456789abc_বাংলা😀") for _ in range(rng.randrange(40)))
+
+
+def _bench(iterations: int = 200_000) -> None:
+    rng = random.Random(1)
+    router = CallbackRouter()
+    formats = ["", "i", "ii", "is", "s", "fi", "isf", "sss"]
+
+    async def handler(update, context, *args):
+        return args
+
+    for opcode, fmt in enumerate(formats, start=1):
+        router.add(opcode, f"route{opcode}", handler, fmt)
+
+    # রাউন্ড-ট্রিপ: এলোমেলো আর্গুমেন্ট এনকোড করে ডিকোড করলে একই মান, এবং ডাটা সবসময় ৬৪ বাইটের মধ্যে
+    for _ in range(20_000):
+        fmt = rng.choice(formats)
+        args = tuple(_random_value(kind, rng) for kind in fmt)
+        data = router.data(f"route{formats.index(fmt) + 1}", *args)
+        assert len(data.encode()) <= CALLBACK_DATA_LIMIT, data
+        route, decoded = router.decode(data)
+        assert route.fmt == fmt and decoded == args, (fmt, args, decoded)
+    for junk in ["", "admin_users_page_0_n5", "approve_12", "1", "1AAAA", "1_w", CALLBACK_VERSION + "/+"]:
+        try:
+            router.decode(junk)
+        except InvalidCallbackData:
+            continue
+        raise AssertionError(f"{junk!r} decoded")
+    print(f"round-trip: 20000 random payloads OK ({len(router.tokens)} via tokens)")
+
+    class _Query:
+        data = router.data("route4", 12345, "n678")
+        from_user = type("User", (), {"id": 1})
+
+        async def answer(self, *args, **kwargs):
+            pass
+
+    update = type("Update", (), {"callback_query": _Query()})()
+
+    def timed(label, fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        print(f"{label:<10}{(time.perf_counter() - start) / iterations * 1e9:>10.0f} ns/op")
+
+    def dispatch():
+        # কোনো কিছুতে অপেক্ষা করে না, তাই ইভেন্ট লুপ ছাড়াই প্রথম send() এ শেষ হয়
+        try:
+            router.dispatch(update, None).send(None)
+        except StopIteration:
+            pass
+
+    timed("encode", lambda: router.data("route4", 12345, "n678"))
+    timed("decode", lambda: router.decode(_Query.data))
+    timed("dispatch", dispatch)
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    logging.basicConfig(level=logging.WARNING)
+    _bench()
@@ -0,0 +1,262 @@
+"""SQLite কানেকশন সেটিংস, ট্রানজ্যাকশন, কিপসেট পেজিনেশন ও DBExecutor।
+
+    python db.py --bench [updates]   # প্রতি আপডেটে নতুন কানেকশন বনাম DBExecutor: ল্যাটেন্সি ও ইভেন্ট লুপ আটকে থাকা
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import asyncio
+import logging
+import threading
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from metrics import DB_QUERY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "bot_database.db"
+DB_CACHE_SIZE_KB = 16384  # পেজ ক্যাশ (KiB), নেগেটিভ cache_size হিসেবে সেট হয়
+DB_BUSY_TIMEOUT = 5.0
+DB_STATEMENT_CACHE = 256  # প্রতি কানেকশনে prepared statement ক্যাশ
+DB_READER_THREADS = 4
+DB_QUERY_WARN_THRESHOLD = 8  # এক আপডেটে এর বেশি DB রাউন্ড-ট্রিপ হলে সম্ভাব্য N+1 হিসেবে সতর্ক করা হয়
+
+_query_stats = contextvars.ContextVar("query_stats", default=None)
+_READ_LATENCY = DB_QUERY_LATENCY.labels("reader")
+_WRITE_LATENCY = DB_QUERY_LATENCY.labels("writer")
+
+
+def connect(path: str = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
+    """টিউন করা সেটিংসসহ একটি SQLite কানেকশন খোলে (WAL, synchronous=NORMAL)"""
+    fresh = not os.path.exists(path)
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT,
+        isolation_level=None,  # autocommit; মাল্টি-স্টেটমেন্ট কাজের জন্য transaction() ব্যবহার করুন
+        cached_statements=DB_STATEMENT_CACHE,
+        check_same_thread=check_same_thread,
+    )
+    conn.row_factory = sqlite3.Row
+    if fresh:
+        # প্রথম টেবিল ও WAL হেডারের আগেই সেট করতে হয়। পুরনো ফাইলে এই PRAGMA প্রতিবার রাইট লক নেয় (মান একই হলেও),
+        # তাই সেখানে চালানো হয় না; পুরনো ডাটাবেজের জন্য `maintenance.py --convert`
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, mode: str = "DEFERRED"):
+    """BEGIN ... COMMIT ব্লক; এক্সেপশন হলে (COMMIT ব্যর্থ হলেও) ROLLBACK হয়"""
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        # COMMIT এ SQLITE_BUSY বা deferred constraint এর ভুলে ট্রানজ্যাকশন খোলাই থেকে যায়;
+        # কিছু ভুলে SQLite নিজেই রোলব্যাক করে, তখন আবার ROLLBACK দিলে নতুন এক্সেপশন হতো
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+def keyset_sql(select: str, key: str, backward: bool = False, where: str = "") -> str:
+    """keyset_page যে SQL চালায়; প্যারামিটার: (after, *params, limit)"""
+    op, order = ("<", "DESC") if backward else (">", "ASC")
+    condition = f"{key} {op} ?" + (f" AND {where}" if where else "")
+    return f"{select} WHERE {condition} ORDER BY {key} {order} LIMIT ?"
+
+
+def keyset_page(conn: sqlite3.Connection, select: str, key: str, after, backward: bool, limit: int,
+                where: str = "", params=()):
+    """key কলামের উপর keyset পেজিনেশন; LIMIT limit + 1 দিয়ে পরের পেজ আছে কিনা দেখে।
+
+    backward হলে `after` এর আগের সারিগুলো আসে। (rows, has_more) রিটার্ন করে।
+    """
+    rows = conn.execute(keyset_sql(select, key, backward, where), (after, *params, limit + 1)).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+    return rows, has_more
+
+
+class QueryStats:
+    __slots__ = ("label", "count")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.count = 0
+
+
+@contextmanager
+def track_queries(label: str, threshold: int = DB_QUERY_WARN_THRESHOLD):
+    """এই ব্লকে (একই async কনটেক্সটে) কতবার DBExecutor এ কুয়েরি পাঠানো হলো তা গোনে"""
+    stats = QueryStats(label)
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+        if stats.count > threshold:
+            logger.warning(f"{label} ran {stats.count} queries (threshold {threshold}); possible N+1 pattern")
+
+
+def count_queries(fn):
+    """async ফাংশনকে track_queries দিয়ে মুড়ে দেয় (ডিবাগ মোডে হ্যান্ডলারের জন্য)"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with track_queries(fn.__qualname__):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+class DBExecutor:
+    """একটি writer থ্রেড (সিরিয়াল রাইট) ও reader থ্রেড পুলে কুয়েরি চালায়, ইভেন্ট লুপ ব্লক না করে"""
+
+    def __init__(self, path: str = DB_PATH, readers: int = DB_READER_THREADS):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._conn_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer", initializer=self._open_thread_connection
+        )
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="db-reader", initializer=self._open_thread_connection
+        )
+
+    def _open_thread_connection(self) -> None:
+        # প্রতিটি থ্রেড নিজের কানেকশন রাখে; বন্ধ করা হয় close() থেকে
+        conn = connect(self.path, check_same_thread=False)
+        self._local.conn = conn
+        with self._conn_lock:
+            self._connections.append(conn)
+
+    def _call(self, fn, args, latency):
+        start = time.perf_counter()
+        try:
+            return fn(self._local.conn, *args)
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+    def _submit(self, pool, fn, args, latency):
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.count += 1
+        return asyncio.get_running_loop().run_in_executor(pool, self._call, fn, args, latency)
+
+    async def read(self, fn, *args):
+        """fn(conn, *args) কে reader পুলে চালায়"""
+        return await self._submit(self._readers, fn, args, _READ_LATENCY)
+
+    async def write(self, fn, *args):
+        """fn(conn, *args) কে একমাত্র writer থ্রেডে চালায়"""
+        return await self._submit(self._writer, fn, args, _WRITE_LATENCY)
+
+    async def fetchone(self, sql: str, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params=()) -> int:
+        """একটি রাইট স্টেটমেন্ট চালায় এবং প্রভাবিত সারির সংখ্যা রিটার্ন করে"""
+        return await self.write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def close(self) -> None:
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._conn_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        logger.info(f"Closed database executor for {self.path}")
+
+
+BENCH_USERS = 10000
+BENCH_CONCURRENCY = (1, 50)
+BENCH_TOUCH_SQL = "UPDATE users SET last_login = ? WHERE user_id = ?"
+
+
+async def _bench(updates: int) -> None:
+    from loadtest import SEED_USER_ID, percentile, seed_users
+    from migrations import apply_migrations
+    from repository import PROFILE_SQL
+
+    # একটি সাধারণ আপডেট (/start): প্রোফাইল পড়া ও last_login লেখা
+    def connect_per_update(user_id):
+        # আগের হ্যান্ডলারগুলোর মতো: ইভেন্ট লুপেই নতুন কানেকশন, ডিফল্ট সেটিংস, কুয়েরি, কমিট, বন্ধ
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(PROFILE_SQL, (user_id,)).fetchone()
+            conn.execute(BENCH_TOUCH_SQL, ("2024-01-01", user_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    async def old(user_id):
+        connect_per_update(user_id)
+
+    async def executor(user_id):
+        await db.fetchone(PROFILE_SQL, (user_id,))
+        await db.execute(BENCH_TOUCH_SQL, ("2024-01-01", user_id))
+
+    print(f"{updates} /start-like updates (profile read + one write) over {BENCH_USERS} users")
+    print(f"{'mode':<20}{'conc':>5}{'updates/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'max loop stall ms':>19}")
+    with tempfile.TemporaryDirectory(prefix="db-bench-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        apply_migrations(path)
+        conn = connect(path)
+        seed_users(conn, BENCH_USERS, random.Random(1))
+        conn.close()
+        db = DBExecutor(path)
+        rng = random.Random(2)
+        try:
+            for name, update in (("connect per update", old), ("DBExecutor", executor)):
+                for concurrency in BENCH_CONCURRENCY:
+                    user_ids = [SEED_USER_ID + rng.randrange(BENCH_USERS) for _ in range(updates)]
+                    latencies, stall, done = [], [0.0], asyncio.Event()
+
+                    async def worker(ids):
+                        for user_id in ids:
+                            start = time.perf_counter()
+                            await update(user_id)
+                            latencies.append(time.perf_counter() - start)
+
+                    async def ticker():
+                        # ১ ms ঘুমিয়ে কতটা দেরিতে জাগে: অন্য চ্যাটের আপডেট এতক্ষণ অপেক্ষা করত
+                        while not done.is_set():
+                            start = time.perf_counter()
+                            await asyncio.sleep(0.001)
+                            stall[0] = max(stall[0], time.perf_counter() - start - 0.001)
+
+                    watch = asyncio.create_task(ticker())
+                    start = time.perf_counter()
+                    await asyncio.gather(*(worker(user_ids[i::concurrency]) for i in range(concurrency)))
+                    elapsed = time.perf_counter() - start
+                    done.set()
+                    await watch
+                    print(f"{name:<20}{concurrency:>5}{updates / elapsed:>11.0f}"
+                          f"{percentile(latencies, 0.50) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}"
+                          f"{stall[0] * 1000:>19.1f}")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    logging.basicConfig(level=logging.WARNING)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(_bench(int(args[0]) if args else 5000))
@@ -0,0 +1,48 @@
+import hmac
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+EVENT_SECRET_HEADER = "X-Bot-Secret"
+
+
+class EventServer:
+    """বট প্রসেসের ভেতরে ছোট aiohttp সার্ভার; WhatsApp API সার্ভার এখানে সেশন ইভেন্ট POST করে"""
+
+    def __init__(self, host: str, port: int, on_event, secret: str = None):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self._on_event = on_event
+        self.app = web.Application()
+        self.app.router.add_post("/events", self._handle_event)
+        self._runner = None
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Event server listening on http://{self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_event(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(EVENT_SECRET_HEADER, ""), self.secret):
+            return web.json_response({"error": "forbidden"}, status=403)
+        try:
+            event = await request.json()
+        except ValueError:
+            return web.json_response({"error": "invalid json"}, status=400)
+        if not event.get("event") or not event.get("phone"):
+            return web.json_response({"error": "event and phone are required"}, status=400)
+        try:
+            await self._on_event(event)
+        except Exception:
+            logger.exception(f"Failed to handle session event {event.get('event')} for {event.get('phone')}")
+            return web.json_response({"error": "handler failed"}, status=500)
+        return web.json_response({"ok": True})
@@ -1,28 +1,276 @@
 // whatsapp_api_server/index.js
 const express = require('express');
-const { WAProto, get)</const { WAProto, getWAConnection, DisconnectReason, useMultiFileAuthState } = require('@adiwajshing/baileys');
+const { WAProto, getWAConnection, DisconnectReason, useMultiFileAuthState } = require('@adiwajshing/baileys');
 const { Boom } = require('@hapi/boom');
 const qrcode = require('qrcode');
 const pino = require('pino'); // For better logging
 const fs = require('fs');
 const path = require('path');
+const crypto = require('crypto');
 
 const app = express();
 app.use(express.json());
 
 const sessions = new Map(); // Store active WA sockets
+// Latest QR per phone as raw PNG: { png, etag, generation }. Baileys rotates the QR every ~20s.
+const qrCodes = new Map();
 
 // Ensure 'sessions_data' directory exists for baileys
-const SESSIONS_DIR = path.join(__dirname, 'sessions_data');
+const SESSIONS_DIR = process.env.SESSIONS_DIR || path.join(__dirname, 'sessions_data');
 if (!fs.existsSync(SESSIONS_DIR)) {
     fs.mkdirSync(SESSIONS_DIR);
 }
 
-const logger = pino({ level: 'info' }).child({ level: 'info', stream: 'store' });
+const logger = pino({ level: process.env.LOG_LEVEL || 'info' }).child({ level: 'info', stream: 'store' });
 
-async function connectToWhatsApp(phoneNumber, res) {
+// The bot receives session lifecycle events (qr, open, close, loggedOut) here
+const BOT_EVENTS_URL = process.env.BOT_EVENTS_URL || 'http://127.0.0.1:8081/events';
+const BOT_EVENTS_SECRET = process.env.BOT_EVENTS_SECRET || '';
+
+async function notifyBot(event, phone, extra = {}) {
+    try {
+        const res = await fetch(BOT_EVENTS_URL, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-Bot-Secret': BOT_EVENTS_SECRET },
+            body: JSON.stringify({ event, phone, at: Date.now(), ...extra }),
+        });
+        if (!res.ok) logger.warn(`Bot rejected '${event}' event for ${phone}: HTTP ${res.status}`);
+    } catch (e) {
+        logger.warn(`Failed to push '${event}' event for ${phone}: ${e.message}`);
+    }
+}
+
+// Session supervisor: restores paired sessions from SESSIONS_DIR on startup and reconnects dropped
+// sockets with exponential backoff + jitter. RESTORE_MODE=eager restores everything at boot
+// (RESTORE_CONCURRENCY handshakes at a time); lazy restores a session on its first status lookup.
+const RESTORE_MODE = process.env.RESTORE_MODE === 'lazy' ? 'lazy' : 'eager';
+const RESTORE_CONCURRENCY = parseInt(process.env.RESTORE_CONCURRENCY || '4', 10);
+const RESTORE_TIMEOUT_MS = parseInt(process.env.RESTORE_TIMEOUT_MS || '30000', 10);
+const RECONNECT_BASE_MS = parseInt(process.env.RECONNECT_BASE_MS || '1000', 10);
+const RECONNECT_MAX_MS = parseInt(process.env.RECONNECT_MAX_MS || '60000', 10);
+const RECONNECT_MAX_ATTEMPTS = parseInt(process.env.RECONNECT_MAX_ATTEMPTS || '10', 10);
+
+// phone -> { state, attempts, lastError, nextRetryAt, connectedAt, timer }
+// state: restoring | connecting | connected | reconnecting | failed
+const supervisor = new Map();
+const storedSessions = new Set(); // paired sessions on disk that have not been restored yet (lazy mode)
+const restoreProgress = { mode: RESTORE_MODE, total: 0, restored: 0, failed: 0, startedAt: null, finishedAt: null };
+let shuttingDown = false;
+
+// Session manager: every live socket costs memory, so an authenticated session nobody has asked about for
+// SESSION_IDLE_MS is hibernated. Its socket is closed, the creds stay in SESSIONS_DIR and its status reads
+// 'hibernated' until a status lookup (GET status, or a batch with wake: true) or a logout wakes it.
+// At most SESSION_MAX_ACTIVE authenticated sockets stay live and, when SESSION_MEMORY_BUDGET_MB is set,
+// heap + external memory is kept under it; both caps hibernate the least recently used session first.
+const SESSION_MAX_ACTIVE = parseInt(process.env.SESSION_MAX_ACTIVE || '500', 10);
+const SESSION_IDLE_MS = parseInt(process.env.SESSION_IDLE_MS || String(30 * 60 * 1000), 10);
+const SESSION_MEMORY_BUDGET_MB = parseInt(process.env.SESSION_MEMORY_BUDGET_MB || '0', 10);
+const HIBERNATE_CHECK_MS = parseInt(process.env.HIBERNATE_CHECK_MS || '30000', 10);
+const WAKE_TIMEOUT_MS = parseInt(process.env.WAKE_TIMEOUT_MS || '8000', 10); // below the bot's 10s request timeout
+
+const lastUsed = new Map(); // phone -> last API use (ms); Map order is least recently used first
+const hibernated = new Set(); // paired sessions on disk whose socket was closed to save memory
+const waking = new Map(); // phone -> handshake promise, so concurrent lookups share one wake
+const hibernation = { hibernatedTotal: 0, wokenTotal: 0, lastCheckAt: null };
+
+function supervise(phone) {
+    let entry = supervisor.get(phone);
+    if (!entry) {
+        entry = { state: 'connecting', attempts: 0, lastError: null, nextRetryAt: null, connectedAt: null, timer: null };
+        supervisor.set(phone, entry);
+    }
+    return entry;
+}
+
+function forgetSession(phone) {
+    const entry = supervisor.get(phone);
+    if (entry && entry.timer) clearTimeout(entry.timer);
+    supervisor.delete(phone);
+    storedSessions.delete(phone);
+    sessions.delete(phone);
+    qrCodes.delete(phone);
+    lastUsed.delete(phone);
+    hibernated.delete(phone);
+}
+
+function supervisorInfo(entry) {
+    const { state, attempts, lastError, nextRetryAt, connectedAt } = entry;
+    return { state, attempts, lastError, nextRetryAt, connectedAt };
+}
+
+// A session directory is worth restoring only once its creds are paired (creds.me is set)
+function isPaired(phone) {
+    try {
+        const creds = JSON.parse(fs.readFileSync(path.join(SESSIONS_DIR, phone, 'creds.json'), 'utf8'));
+        return Boolean(creds.me);
+    } catch (e) {
+        return false;
+    }
+}
+
+function reconnectDelay(attempt) {
+    const ceiling = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** (attempt - 1));
+    return Math.round(ceiling / 2 + Math.random() * ceiling / 2); // equal jitter: spreads a mass reconnect
+}
+
+function scheduleReconnect(phone, reason, immediate = false, statusCode = undefined) {
+    if (shuttingDown) return;
+    const entry = supervise(phone);
+    entry.lastError = reason;
+    if (!immediate) entry.attempts += 1;
+    if (entry.attempts > RECONNECT_MAX_ATTEMPTS) {
+        entry.state = 'failed';
+        entry.nextRetryAt = null;
+        sessions.delete(phone);
+        logger.error(`Giving up on ${phone} after ${RECONNECT_MAX_ATTEMPTS} reconnect attempts: ${reason}`);
+        notifyBot('close', phone, { statusCode, state: 'failed', reason });
+        return;
+    }
+    const delay = immediate ? 0 : reconnectDelay(entry.attempts);
+    entry.state = 'reconnecting';
+    entry.nextRetryAt = Date.now() + delay;
+    if (entry.timer) clearTimeout(entry.timer);
+    entry.timer = setTimeout(() => {
+        entry.timer = null;
+        entry.nextRetryAt = null;
+        connectToWhatsApp(phone, null, { state: 'reconnecting' })
+            .catch((e) => scheduleReconnect(phone, e.message));
+    }, delay);
+    logger.info(`Reconnecting ${phone} in ${delay}ms (attempt ${entry.attempts}/${RECONNECT_MAX_ATTEMPTS})`);
+    notifyBot('close', phone, { statusCode, state: 'reconnecting', retryAt: entry.nextRetryAt });
+}
+
+// Connects a stored session; resolves once the handshake opens, fails or times out
+async function openStoredSession(phone, timeoutMs) {
+    if (sessions.has(phone)) return 'open';
+    supervise(phone).state = 'restoring'; // visible to status lookups before the socket exists
+    try {
+        const { settled } = await connectToWhatsApp(phone, null, { state: 'restoring' });
+        let timer;
+        const timeout = new Promise((resolve) => { timer = setTimeout(() => resolve('timeout'), timeoutMs); });
+        const outcome = await Promise.race([settled, timeout]);
+        clearTimeout(timer);
+        return outcome;
+    } catch (e) {
+        logger.error(`Restoring session for ${phone} failed: ${e.message}`);
+        supervise(phone).lastError = e.message;
+        return 'error';
+    }
+}
+
+async function restoreSession(phone) {
+    storedSessions.delete(phone);
+    if (sessions.has(phone)) return 'open';
+    const outcome = await openStoredSession(phone, RESTORE_TIMEOUT_MS);
+    if (outcome === 'open') restoreProgress.restored += 1;
+    else restoreProgress.failed += 1;
+    return outcome;
+}
+
+async function runLimited(items, limit, fn) {
+    let next = 0;
+    const worker = async () => {
+        while (next < items.length) {
+            await fn(items[next++]);
+        }
+    };
+    await Promise.all(Array.from({ length: Math.min(limit, items.length) }, worker));
+}
+
+function credsModifiedAt(phone) {
+    try {
+        return fs.statSync(path.join(SESSIONS_DIR, phone, 'creds.json')).mtimeMs;
+    } catch (e) {
+        return 0;
+    }
+}
+
+async function restoreStoredSessions() {
+    let phones = fs.readdirSync(SESSIONS_DIR).filter(isPaired);
+    restoreProgress.startedAt = Date.now();
+    if (RESTORE_MODE === 'lazy') {
+        restoreProgress.total = phones.length;
+        phones.forEach((phone) => storedSessions.add(phone));
+        logger.info(`${phones.length} stored sessions will be restored on first use`);
+        return;
+    }
+    // Only the most recently active sessions fit under the cap (creds are saved on activity); the rest start hibernated
+    phones.sort((a, b) => credsModifiedAt(b) - credsModifiedAt(a));
+    phones.slice(SESSION_MAX_ACTIVE).forEach((phone) => hibernated.add(phone));
+    phones = phones.slice(0, SESSION_MAX_ACTIVE);
+    restoreProgress.total = phones.length;
+    logger.info(`Restoring ${phones.length} stored sessions, ${RESTORE_CONCURRENCY} at a time (${hibernated.size} hibernated)`);
+    await runLimited(phones, RESTORE_CONCURRENCY, restoreSession);
+    restoreProgress.finishedAt = Date.now();
+    logger.info(`Session restore finished: ${restoreProgress.restored} open, ${restoreProgress.failed} failed`);
+}
+
+function touchSession(phone) {
+    lastUsed.delete(phone);
+    lastUsed.set(phone, Date.now());
+}
+
+// Heap + external (Buffers, which hold most of a socket's state); RSS rarely shrinks after a socket is freed
+function memoryUsedMb() {
+    const { heapUsed, external } = process.memoryUsage();
+    return (heapUsed + external) / 1024 / 1024;
+}
+
+function hibernateSession(phone) {
+    const sock = sessions.get(phone);
+    forgetSession(phone); // the close event of a socket that is no longer in `sessions` is ignored: no reconnect
+    hibernated.add(phone);
+    sock.end(undefined);
+    hibernation.hibernatedTotal += 1;
+}
+
+// Hibernates idle sessions, then the least recently used ones until both caps hold; returns the count
+function enforceSessionBudget(now = Date.now()) {
+    hibernation.lastCheckAt = now;
+    const live = []; // only authenticated, connected sockets; pending QR logins and reconnects are never evicted
+    for (const [phone, usedAt] of lastUsed) {
+        const sock = sessions.get(phone);
+        if (sock && sock.user && supervisor.get(phone)?.state === 'connected') live.push([phone, usedAt]);
+    }
+    let excess = live.length - SESSION_MAX_ACTIVE;
+    if (SESSION_MEMORY_BUDGET_MB > 0 && live.length) {
+        const used = memoryUsedMb();
+        if (used > SESSION_MEMORY_BUDGET_MB) {
+            // the per-session estimate includes the process baseline, so this undershoots and the next check continues
+            const perSession = used / sessions.size;
+            excess = Math.max(excess, Math.ceil((used - SESSION_MEMORY_BUDGET_MB) / perSession));
+        }
+    }
+    let count = 0;
+    for (const [phone, usedAt] of live) {
+        if (count >= excess && now - usedAt < SESSION_IDLE_MS) break; // LRU order: everything after is newer
+        hibernateSession(phone);
+        count += 1;
+    }
+    if (count) logger.info(`Hibernated ${count} sessions (${live.length - count} live, ${hibernated.size} hibernated)`);
+    return count;
+}
+
+// Rehydrates a hibernated session; resolves with the handshake outcome ('open', 'close', 'timeout', ...)
+function wakeSession(phone) {
+    if (!waking.has(phone)) {
+        hibernated.delete(phone);
+        hibernation.wokenTotal += 1;
+        logger.info(`Waking hibernated session for ${phone}`);
+        waking.set(phone, openStoredSession(phone, WAKE_TIMEOUT_MS).finally(() => waking.delete(phone)));
+    }
+    return waking.get(phone);
+}
+
+// Returns { sock, settled }; settled resolves with the first outcome of the handshake ('open', 'qr', 'close')
+async function connectToWhatsApp(phoneNumber, res, { state: initialState = 'connecting' } = {}) {
     const sessionPath = path.join(SESSIONS_DIR, phoneNumber);
     const { state, saveCreds } = await useMultiFileAuthState(sessionPath);
+    const entry = supervise(phoneNumber);
+    entry.state = initialState;
+    if (initialState !== 'reconnecting') Object.assign(entry, { attempts: 0, lastError: null });
+    let settle;
+    const settled = new Promise((resolve) => { settle = resolve; });
 
     const sock = getWAConnection({
         logger,
@@ -36,23 +284,48 @@ async function connectToWhatsApp(phoneNumber, res) {
 
     sock.ev.on('connection.update', (update) => {
         const { connection, lastDisconnect, qr } = update;
-        
+        if (sessions.get(phoneNumber) !== sock) return; // a newer socket replaced this one
+
+        if (qr && initialState !== 'connecting') {
+            // Stored creds were not accepted; a restore must not start an unattended QR login
+            settle('qr');
+            forgetSession(phoneNumber);
+            sock.end(undefined);
+            logger.warn(`Stored session for ${phoneNumber} asked for a new QR, dropping it`);
+            notifyBot('loggedOut', phoneNumber);
+            return;
+        }
+
         if (qr) {
-            qrcode.toDataURL(qr, (err, url) => {
+            settle('qr');
+            const generation = (qrCodes.get(phoneNumber)?.generation || 0) + 1;
+            qrcode.toBuffer(qr, { type: 'png' }, (err, png) => {
                 if (err) {
                     logger.error("QR Code generation error:", err);
-                    if (!res.headersSent) res.status(500).json({ error: 'QR Code generation error' });
+                    if (res && !res.headersSent) res.status(500).json({ error: 'QR Code generation error' });
                     return;
                 }
-                logger.info(`QR code generated for ${phoneNumber}`);
-                if (!res.headersSent) res.json({ qr_url: url });
-                // If the response has already been sent, don't send again.
-                // This can happen if the QR updates multiple times.
+                // Derived from the QR itself: the generation counter restarts with every login (and on restart),
+                // so a counter-based tag would repeat and the bot would resend a cached, already-dead QR.
+                const etag = `"${crypto.createHash('sha1').update(qr).digest('base64url')}"`;
+                qrCodes.set(phoneNumber, { png, etag, generation });
+                logger.info(`QR code generation ${generation} ready for ${phoneNumber}`);
+                // The first QR answers POST /sessions; later rotations are pushed to the bot
+                if (res && !res.headersSent) {
+                    res.json({ status: 'pending_qr', qr_path: `/sessions/${phoneNumber}/qr`, etag, generation });
+                }
+                notifyBot('qr', phoneNumber, { etag, generation });
             });
         }
 
         if (connection === 'open') {
+            settle('open');
+            Object.assign(entry, { state: 'connected', attempts: 0, lastError: null, connectedAt: Date.now() });
+            qrCodes.delete(phoneNumber);
+            touchSession(phoneNumber);
+            if (sessions.size > SESSION_MAX_ACTIVE) enforceSessionBudget();
             logger.info(`WhatsApp connection opened for ${phoneNumber}`);
+            notifyBot('open', phoneNumber);
             if (res && !res.headersSent) {
                 // If a pending request is waiting, signal success
                 res.json({ status: 'authenticated' });
@@ -60,15 +333,24 @@ async function connectToWhatsApp(phoneNumber, res) {
         }
 
         if (connection === 'close') {
-            const shouldReconnect = (lastDisconnect.error instanceof Boom)?.output?.statusCode !== DisconnectReason.loggedOut;
-            logger.info('connection closed due to ', lastDisconnect.error, ', reconnecting ', shouldReconnect);
-            // Clear session from memory if logged out
-            if (!shouldReconnect) {
-                sessions.delete(phoneNumber);
+            settle('close');
+            const statusCode = lastDisconnect?.error?.output?.statusCode;
+            const reason = lastDisconnect?.error?.message || `status ${statusCode}`;
+            // Baileys asks for an immediate restart right after a QR is scanned
+            const restartRequired = statusCode === DisconnectReason.restartRequired;
+            if (statusCode === DisconnectReason.loggedOut) {
+                forgetSession(phoneNumber);
                 logger.info(`Session for ${phoneNumber} logged out and removed.`);
+                notifyBot('loggedOut', phoneNumber);
+            } else if (restartRequired || isPaired(phoneNumber)) {
+                logger.info(`Connection for ${phoneNumber} closed (${reason}), reconnecting`);
+                scheduleReconnect(phoneNumber, reason, restartRequired, statusCode);
+            } else {
+                // An unpaired login whose QR expired: nothing to reconnect to
+                forgetSession(phoneNumber);
+                logger.info(`Pending login for ${phoneNumber} closed (${reason})`);
+                notifyBot('close', phoneNumber, { statusCode });
             }
-            // You might want to automatically restart here if shouldReconnect is true
-            // connectToWhatsApp(phoneNumber, null); // Reconnect without sending initial response
         }
     });
 
@@ -79,6 +361,7 @@ async function connectToWhatsApp(phoneNumber, res) {
         logger.info(`Already authenticated for ${phoneNumber}`);
         if (res && !res.headersSent) res.json({ status: 'authenticated' });
     }
+    return { sock, settled };
 }
 
 app.post('/sessions', async (req, res) => {
@@ -86,11 +369,13 @@ app.post('/sessions', async (req, res) => {
     if (!phone) {
         return res.status(400).json({ error: 'Phone number is required' });
     }
-    if (sessions.has(phone)) {
+    if (sessions.has(phone) || waking.has(phone)) {
         return res.status(409).json({ error: 'Session already exists or is connecting for this phone number.' });
     }
 
     try {
+        storedSessions.delete(phone);
+        hibernated.delete(phone);
         await connectToWhatsApp(phone, res);
     } catch (e) {
         logger.error(`Error connecting to WhatsApp for ${phone}:`, e);
@@ -98,27 +383,94 @@ app.post('/sessions', async (req, res) => {
     }
 });
 
-app.get('/sessions/:phone/status', (req, res) => {
-    const { phone } = req.params;
+// authenticated | pending_qr | hibernated | restoring | reconnecting | failed | not_found
+function sessionStatus(phone) {
+    const entry = supervisor.get(phone);
+    if (entry && ['restoring', 'reconnecting', 'failed'].includes(entry.state)) return entry.state;
     const sock = sessions.get(phone);
+    if (sock && sock.user) return 'authenticated';
+    if (sock) return 'pending_qr'; // QR code expected
+    if (hibernated.has(phone)) return 'hibernated';
+    if (storedSessions.has(phone)) {
+        restoreSession(phone); // lazy mode: the first lookup brings the session back
+        return 'restoring';
+    }
+    return 'not_found';
+}
 
-    if (sock && sock.user) {
-        res.json({ status: 'authenticated' });
-    } else if (sock) {
-        res.json({ status: 'pending_qr' }); // QR code expected
-    } else {
-        res.status(404).json({ status: 'not_found' });
+// Current QR as image/png; ETag changes with every QR generation, so polling clients get 304s
+app.get('/sessions/:phone/qr', (req, res) => {
+    const entry = qrCodes.get(req.params.phone);
+    if (!entry) {
+        return res.status(404).json({ error: 'No QR code pending for this phone number.' });
     }
+    res.set('ETag', entry.etag);
+    res.set('Cache-Control', 'no-cache');
+    if (req.get('If-None-Match') === entry.etag) {
+        return res.status(304).end();
+    }
+    res.type('png').send(entry.png);
+});
+
+// A status lookup counts as use: a hibernated session is woken first, unless ?wake=0
+app.get('/sessions/:phone/status', async (req, res) => {
+    const { phone } = req.params;
+    if (req.query.wake !== '0' && (hibernated.has(phone) || waking.has(phone))) await wakeSession(phone);
+    if (req.query.wake !== '0' && sessions.has(phone)) touchSession(phone);
+    const status = sessionStatus(phone);
+    const entry = supervisor.get(phone);
+    res.status(status === 'not_found' ? 404 : 200).json({ status, supervisor: entry ? supervisorInfo(entry) : null });
+});
+
+// Restore progress and reconnect state of every supervised session
+app.get('/supervisor', (req, res) => {
+    const states = {};
+    const reconnecting = {};
+    for (const [phone, entry] of supervisor.entries()) {
+        states[entry.state] = (states[entry.state] || 0) + 1;
+        if (entry.state === 'reconnecting' || entry.state === 'failed') reconnecting[phone] = supervisorInfo(entry);
+    }
+    const memory = {
+        live: sessions.size,
+        hibernated: hibernated.size,
+        waking: waking.size,
+        maxActive: SESSION_MAX_ACTIVE,
+        idleMs: SESSION_IDLE_MS,
+        budgetMb: SESSION_MEMORY_BUDGET_MB,
+        usedMb: Math.round(memoryUsedMb()),
+        ...hibernation,
+    };
+    res.json({ restore: { ...restoreProgress, pending: storedSessions.size }, states, reconnecting, memory });
+});
+
+// Batch status: { phones: [...], wake?: bool } -> { statuses: { phone: status } }
+// The periodic sweep leaves hibernated sessions asleep; wake: true rehydrates them like GET status
+app.post('/sessions/status', async (req, res) => {
+    const { phones, wake } = req.body;
+    if (!Array.isArray(phones)) {
+        return res.status(400).json({ error: 'phones must be an array' });
+    }
+    if (wake) {
+        await Promise.all(phones.filter((phone) => hibernated.has(phone) || waking.has(phone)).map(wakeSession));
+        phones.filter((phone) => sessions.has(phone)).forEach(touchSession);
+    }
+    const statuses = {};
+    for (const phone of phones) {
+        statuses[phone] = sessionStatus(phone);
+    }
+    res.json({ statuses });
 });
 
 app.delete('/sessions/:phone', async (req, res) => {
     const { phone } = req.params;
+    // Logging out unlinks the device on the phone, which needs a live socket
+    if (hibernated.has(phone) || waking.has(phone)) await wakeSession(phone);
     const sock = sessions.get(phone);
 
     if (sock) {
         try {
             await sock.logout();
-            sessions.delete(phone);
+            forgetSession(phone);
             // Optionally delete the session files from disk
             const sessionPath = path.join(SESSIONS_DIR, phone);
             if (fs.existsSync(sessionPath)) {
@@ -129,22 +481,35 @@ app.delete('/sessions/:phone', async (req, res) => {
             logger.error(`Error logging out session for ${phone}:`, e);
             res.status(500).json({ error: 'Failed to log out session.' });
         }
+    } else if (supervisor.has(phone) || storedSessions.has(phone)) {
+        // Reconnecting, failed or not yet restored: there is no live socket to log out
+        forgetSession(phone);
+        fs.rmSync(path.join(SESSIONS_DIR, phone), { recursive: true, force: true });
+        res.json({ status: 'logged_out', message: 'Session removed.' });
     } else {
         res.status(404).json({ status: 'not_found', message: 'Session not found.' });
     }
 });
 
-const PORT = 3000;
-app.listen(PORT, () => console.log(`WhatsApp API running on port ${PORT}`));
+const PORT = parseInt(process.env.PORT || '3000', 10);
+app.listen(PORT, () => {
+    console.log(`WhatsApp API running on port ${PORT}`);
+    restoreStoredSessions().catch((e) => logger.error(`Session restore failed: ${e.message}`));
+});
+setInterval(enforceSessionBudget, HIBERNATE_CHECK_MS).unref();
 
-// Graceful shutdown
-process.on('SIGINT', async () => {
+// Graceful shutdown: close sockets but keep the creds on disk so the next start restores them
+async function shutdown() {
+    shuttingDown = true;
     logger.info('Shutting down WhatsApp API server...');
+    for (const entry of supervisor.values()) {
+        if (entry.timer) clearTimeout(entry.timer);
+    }
     for (const [phone, sock] of sessions.entries()) {
-        if (sock.user) {
-            await sock.logout();
-            logger.info(`Logged out session for ${phone}`);
-        }
+        sock.end(undefined);
+        logger.info(`Closed session for ${phone}`);
     }
     process.exit(0);
-});
+}
+process.on('SIGINT', shutdown);
+process.on('SIGTERM', shutdown);
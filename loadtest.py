@@ -0,0 +1,651 @@
+"""অফলাইন লোড টেস্ট: ফেক Telegram Bot API ও স্টাব WhatsApp API সার্ভারের বিপরীতে bot.build_application()
+এ সিনথেটিক Update পাঠিয়ে থ্রুপুট, p50/p99 ল্যাটেন্সি ও মেমরি রিপোর্ট করে।
+
+    python loadtest.py --updates 5000 --concurrency 50 --mix start=2,menu=5,login=1,withdraw=1,admin=1
+    python loadtest.py --json --max-p99-ms 250   # রিগ্রেশন গেট: p99 বেশি হলে exit 1
+    python loadtest.py --seed-users 1000000      # মিলিয়ন ইউজারের টেবিলে রেফারেল/প্রোফাইল কুয়েরি
+    python loadtest.py --updates 0 --login-burst 500 --login-cap 20   # একসাথে লগইনের ঢেউ: সীমা, কিউ ও টাইমআউট
+    python loadtest.py --seed-users 100000 --background broadcast --max-p99-ms 250   # মিক্সের পাশে বড় কাজ
+    python loadtest.py --wa-latency-ms 2000 --mix start=2,menu=5,login=3   # ধীর WhatsApp API: লগইন ছাড়া বাকিরা আটকায় না
+    python loadtest.py --seed-users 50000 --seed-sessions 50000   # অ্যাডমিনের সেশন পেজ ও একটি পুরো হেলথ সুইপ
+
+নেটওয়ার্ক লাগে না; সব সার্ভার 127.0.0.1 এ চলে এবং ডাটাবেজ একটি টেম্প ডিরেক্টরিতে তৈরি হয়।
+"""
+import os
+import sys
+import json
+import base64
+import time
+import random
+import asyncio
+import logging
+import argparse
+import collections
+import resource
+import tempfile
+import itertools
+import contextlib
+import tracemalloc
+
+from aiohttp import web
+
+FAKE_TOKEN = "123456:LOADTEST"
+# 1x1 স্বচ্ছ PNG, স্টাব সার্ভারের QR হিসেবে
+QR_PNG = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+DEFAULT_MIX = "start=2,menu=5,login=1,withdraw=1,admin=1,signup=1"
+FIRST_USER_ID = 10_000_000
+SEED_USER_ID = 100_000_000  # --seed-users এর ইউজাররা এখান থেকে; signup এর নতুন ইউজাররা এর পরে
+SEED_CHUNK = 50_000
+BURST_USER_ID = 200_000_000
+SESSION_WALK_PAGES = 20  # --seed-sessions: মিক্সের পর অ্যাডমিন সেশন ম্যানেজমেন্টের এতগুলো পেজ দেখে
+BACKGROUND_ADMIN_ID = 300_000_000  # --background users এর দ্বিতীয় অ্যাডমিন, মিক্সের অ্যাডমিনের স্টেটে হাত দেয় না
+
+logger = logging.getLogger("loadtest")
+
+
+class FakeTelegram:
+    """Bot API এর যতটুকু বট ব্যবহার করে: প্রতিটি মেথডে সফল রেসপন্স দেয় এবং শেষ ইনলাইন কিবোর্ড মনে রাখে।
+    latency (সেকেন্ড) দিলে প্রতিটি রেসপন্স এতক্ষণ দেরিতে আসে, আসল API এর রাউন্ড-ট্রিপের মতো।
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self._handle)
+        self.calls = 0
+        self.keyboards = {}  # chat_id -> [callback_data, ...]
+        self.photo_chats = []  # sendPhoto (QR) এর প্রাপক, ক্রমানুসারে
+        self.photos = []  # (chat_id, file_id অথবা আপলোড হলে None); sendPhoto ও editMessageMedia
+        self.messages = collections.defaultdict(list)  # chat_id -> [(text, parse_mode), ...]; sendMessage
+        self._message_ids = itertools.count(1)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+        elif method in ("sendMessage", "sendPhoto", "sendDocument", "editMessageText", "editMessageCaption", "editMessageMedia"):
+            chat_id = int(params.get("chat_id", 0))
+            markup = params.get("reply_markup")
+            if isinstance(markup, str):
+                markup = json.loads(markup)
+            if markup and "inline_keyboard" in markup:
+                self.keyboards[chat_id] = [
+                    button["callback_data"] for row in markup["inline_keyboard"] for button in row
+                    if "callback_data" in button
+                ]
+            result = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+            if method == "sendMessage":
+                self.messages[chat_id].append((params.get("text", ""), params.get("parse_mode")))
+            if method == "sendPhoto":
+                self.photo_chats.append(chat_id)
+            if method in ("sendPhoto", "editMessageMedia"):
+                photo = params.get("photo") if method == "sendPhoto" else json.loads(params.get("media", "{}")).get("media")
+                file_id = photo if isinstance(photo, str) and not photo.startswith("attach://") else None
+                self.photos.append((chat_id, file_id))
+                file_id = file_id or f"qr-{result['message_id']}"
+                result["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+class StubWhatsApp:
+    """WhatsApp API সার্ভারের স্টাব: প্রতিটি নতুন সেশনে নতুন QR (নতুন ETag) দেয়, স্ট্যাটাসে authenticated
+    (statuses এ কোনো নম্বরের অন্য স্ট্যাটাস বসালে সেটি; not_found হলে GET এ আসলের মতো 404)।
+
+    স্ট্যাটাস জিজ্ঞেস না করা (স্ক্যান না হওয়া) ও মুছে না ফেলা সেশনগুলো pending; একসাথে সর্বোচ্চ কতগুলো
+    ছিল তা peak_pending এ, আসল সার্ভারে এগুলোর প্রতিটি একটি Baileys সকেট।
+    latency (সেকেন্ড) দিলে প্রতিটি রেসপন্স এতক্ষণ দেরিতে আসে, ধীর Node সার্ভারের মতো।
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0  # সব এন্ডপয়েন্ট মিলিয়ে
+        self.app = web.Application(middlewares=[self._delay])
+        self.app.router.add_post("/sessions", self._create)
+        self.app.router.add_post("/sessions/status", self._batch_status)
+        self.app.router.add_get("/sessions/{phone}/status", self._status)
+        self.app.router.add_get("/sessions/{phone}/qr", self._qr)
+        self.app.router.add_delete("/sessions/{phone}", self._delete)
+        self.pending = set()
+        self.peak_pending = 0
+        self.deleted = 0
+        self.qr_etags = {}  # phone -> ETag
+        self.statuses = {}  # phone -> স্ট্যাটাস, authenticated ছাড়া অন্য কিছু হলে
+        self._qr_serial = itertools.count(1)
+
+    @web.middleware
+    async def _delay(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def _create(self, request):
+        phone = (await request.json())["phone"]
+        self.pending.add(phone)
+        self.peak_pending = max(self.peak_pending, len(self.pending))
+        etag = self.qr_etags[phone] = f'"qr-{next(self._qr_serial)}"'
+        return web.json_response({"status": "pending_qr", "qr_path": f"/sessions/{phone}/qr", "etag": etag})
+
+    async def _qr(self, request):
+        etag = self.qr_etags.get(request.match_info["phone"])
+        if etag is None:
+            return web.json_response({"error": "No QR"}, status=404)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.Response(body=base64.b64decode(QR_PNG), content_type="image/png", headers={"ETag": etag})
+
+    async def _batch_status(self, request):
+        phones = (await request.json()).get("phones", [])
+        self.pending.difference_update(phones)
+        return web.json_response({"statuses": {phone: self.statuses.get(phone, "authenticated") for phone in phones}})
+
+    async def _status(self, request):
+        phone = request.match_info["phone"]
+        self.pending.discard(phone)
+        status = self.statuses.get(phone, "authenticated")
+        return web.json_response({"status": status}, status=404 if status == "not_found" else 200)
+
+    async def _delete(self, request):
+        self.pending.discard(request.match_info["phone"])
+        self.deleted += 1
+        return web.json_response({"ok": True})
+
+
+async def serve(app: web.Application):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+@contextlib.asynccontextmanager
+async def offline_bot(bot, whatsapp_latency: float = 0.0):
+    """ফেক Telegram ও স্টাব WhatsApp সার্ভারের সাথে চালু bot.build_application(); (application, telegram, whatsapp)।
+
+    ডাটাবেজ bot.DB_PATH এ (বর্তমান ডিরেক্টরিতে) তৈরি হয়; বের হওয়ার সময় বট আসলের মতো বন্ধ হয়।
+    """
+    from migrations import apply_migrations
+    from whatsapp_api import WhatsAppClient
+
+    telegram, whatsapp = FakeTelegram(), StubWhatsApp(latency=whatsapp_latency)
+    telegram_runner, telegram_url = await serve(telegram.app)
+    whatsapp_runner, whatsapp_url = await serve(whatsapp.app)
+    apply_migrations(bot.DB_PATH)
+    bot.wa_client = WhatsAppClient(whatsapp_url)
+    bot.BOT_EVENTS_PORT = 0
+    application = bot.build_application(FAKE_TOKEN, base_url=f"{telegram_url}/bot")
+    await application.initialize()
+    await application.post_init(application)
+    try:
+        yield application, telegram, whatsapp
+    finally:
+        await application.post_stop(application)  # বাকি নোটিফিকেশন বট বন্ধের আগে পাঠানো হয়
+        await application.shutdown()  # persistence এখানে ফ্লাশ হয়, তাই post_shutdown এর আগে
+        await application.post_shutdown(application)
+        await telegram_runner.cleanup()
+        await whatsapp_runner.cleanup()
+
+
+class UpdateFactory:
+    def __init__(self, bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id: int, text: str):
+        from telegram import Update
+
+        message = {
+            "message_id": next(self._update_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.bot)
+
+    def callback(self, user_id: int, data: str):
+        from telegram import Update
+
+        update_id = next(self._update_ids)
+        return Update.de_json({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "LoadTest"},
+                    "text": "menu",
+                },
+            },
+        }, self.bot)
+
+
+def scenario_steps(name: str, user_id: int, rng: random.Random, referrer: int = None):
+    """(kind, payload) এর তালিকা; kind 'msg' অথবা 'next_page' (শেষ কিবোর্ডের পরের পেজ বাটন)"""
+    if name == "start":
+        return [("msg", "/start")]
+    if name == "signup":
+        # নতুন ইউজার রেফারেল ডিপ লিংক থেকে; মাঝে মাঝে নিজের কোড দিয়ে (যা গণ্য হয় না)
+        code = user_id if rng.random() < 0.05 else referrer
+        return [("msg", f"/start ref_{code}"), ("msg", "🎁 রেফার কোড")]
+    if name == "menu":
+        return [("msg", rng.choice(["📊 আমার একাউন্ট", "🎁 রেফার কোড", "✅ Active Sessions"]))]
+    if name == "login":
+        phone = f"+8801{rng.randrange(10 ** 9):09d}"
+        return [("msg", "▶️ WhatsApp লগইন"), ("msg", phone), ("msg", "/confirm")]
+    if name == "withdraw":
+        return [("msg", "💰 উইথড্র"), ("msg", "100"), ("msg", "01700000000")]
+    if name == "admin":
+        menu = rng.choice(["👁️ ইউজার লিস্ট", "🧾 উইথড্র রিকুয়েস্ট", "🔁 সেশন ম্যানেজমেন্ট", "📈 পরিসংখ্যান"])
+        return [("msg", menu), ("next_page", None), ("next_page", None)]
+    raise ValueError(f"unknown scenario {name}")
+
+
+def seed_users(conn, count: int, rng: random.Random) -> None:
+    """count জন ইউজার সরাসরি SQL এ (হ্যান্ডলার ছাড়া); প্রায় অর্ধেক আগের কোনো ইউজারের রেফারেল"""
+    for start in range(0, count, SEED_CHUNK):
+        rows = []
+        for i in range(start, min(count, start + SEED_CHUNK)):
+            user_id = SEED_USER_ID + i
+            referred_by = SEED_USER_ID + rng.randrange(i) if i and rng.random() < 0.5 else None
+            rows.append((user_id, f"seed{i}", f"ref_{user_id}", referred_by))
+        with conn:
+            conn.executemany(
+                "INSERT INTO users (user_id, username, referral_code, referred_by) VALUES (?, ?, ?, ?)", rows
+            )
+
+
+def seed_sessions(conn, count: int, users: int, rng: random.Random) -> None:
+    """count টি সেশন --seed-users এর ইউজারদের মধ্যে ছড়িয়ে; প্রতি দশটির একটি 'disconnected'"""
+    for start in range(0, count, SEED_CHUNK):
+        rows = [
+            (SEED_USER_ID + rng.randrange(users), f"+8807{i:09d}", "disconnected" if i % 10 == 0 else "active")
+            for i in range(start, min(count, start + SEED_CHUNK))
+        ]
+        with conn:
+            conn.executemany("INSERT INTO sessions (user_id, phone_number, status) VALUES (?, ?, ?)", rows)
+
+
+async def session_pages_and_sweep(application, bot, send, count: int) -> dict:
+    """অ্যাডমিন সেশন ম্যানেজমেন্টের পেজগুলো দেখে (প্রতি আপডেটে DB রাউন্ড-ট্রিপ গুনে), তারপর একটি পুরো সুইপ"""
+    from db import track_queries
+
+    page_latencies, queries = {}, []
+    for page in range(SESSION_WALK_PAGES):
+        kind, payload = ("msg", "🔁 সেশন ম্যানেজমেন্ট") if page == 0 else ("next_page", None)
+        with track_queries("session page") as stats:
+            if not await send(bot.SUPER_ADMIN_ID, kind, payload, "sessions", page_latencies):
+                break
+        queries.append(stats.count)
+    await bot.sweeper.sweep(bot.wa_client)
+    checked, changed, seconds = bot.sweeper.last_sweep
+    values = page_latencies.get("sessions", [])
+    return {
+        "seeded": count,
+        "pages": len(values),
+        "page_p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "page_p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_queries_per_page": max(queries, default=0),
+        "sweep_checked": checked,
+        "sweep_changed": changed,
+        "sweep_seconds": round(seconds, 2),
+    }
+
+
+async def login_burst(application, bot, telegram, whatsapp, factory, args) -> dict:
+    """args.login_burst জন নতুন ইউজার একসাথে লগইন শুরু করে। QR পাওয়ার পর ~৬০% স্ক্যান করে /confirm দেয়,
+    ~১০% /cancel করে, বাকিরা ফেলে রাখে (টাইমআউটে বাতিল হয়)। কিউ খালি না হওয়া পর্যন্ত চলে।
+    """
+    import types
+
+    scheduler = bot.login_scheduler
+    scheduler.capacity, scheduler.qr_timeout = args.login_cap, args.qr_timeout
+    context = types.SimpleNamespace(application=application)  # expire_logins_job শুধু application পড়ে
+    rng = random.Random(args.seed)
+    users = [BURST_USER_ID + i for i in range(args.login_burst)]
+    for user_id in users:
+        await application.process_update(factory.message(user_id, "/start"))
+
+    async def begin(user_id):
+        await application.process_update(factory.message(user_id, "▶️ WhatsApp লগইন"))
+        await application.process_update(factory.message(user_id, f"+8809{user_id}"))
+
+    whatsapp.peak_pending = len(whatsapp.pending)
+    started = time.perf_counter()
+    await asyncio.gather(*(begin(user_id) for user_id in users))
+    accepted = time.perf_counter() - started
+    _, queued_after_burst, _ = await bot.repo.login_load()
+
+    outcomes = collections.Counter()
+    seen = 0
+    deadline = started + 60 + 4 * args.qr_timeout * len(users) / args.login_cap
+    while True:
+        actions = []
+        for user_id in telegram.photo_chats[seen:]:
+            if user_id < BURST_USER_ID:
+                continue
+            roll = rng.random()
+            if roll < 0.6:
+                outcomes["confirmed"] += 1
+                actions.append(factory.message(user_id, "/confirm"))
+            elif roll < 0.7:
+                outcomes["cancelled"] += 1
+                actions.append(factory.message(user_id, "/cancel"))
+            else:
+                outcomes["abandoned"] += 1
+        seen = len(telegram.photo_chats)
+        await asyncio.gather(*(application.process_update(update) for update in actions))
+        await bot.expire_logins_job(context)
+        pending, queued, hold = await bot.repo.login_load()
+        if (not pending and not queued) or time.perf_counter() > deadline:
+            break
+        await asyncio.sleep(0.2)
+
+    return {
+        "users": len(users),
+        "capacity": args.login_cap,
+        "peak_pending_at_api": whatsapp.peak_pending,
+        "queued_after_burst": queued_after_burst,
+        "accept_seconds": round(accepted, 3),
+        "drain_seconds": round(time.perf_counter() - started, 1),
+        "qr_sent": sum(outcomes.values()),
+        **outcomes,
+        "deleted_at_api": whatsapp.deleted,
+        "avg_hold_seconds": round(hold, 2) if hold is not None else None,
+        "left_pending": pending,
+        "left_queued": queued,
+    }
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run(args) -> dict:
+    import bot
+
+    async with offline_bot(bot, args.wa_latency_ms / 1000) as (application, telegram, whatsapp):
+        report = await _run(args, bot, application, telegram, whatsapp)
+    report["telegram_calls"] = telegram.calls  # বন্ধের সময় পাঠানো নোটিফিকেশনসহ
+    return report
+
+
+async def _run(args, bot, application, telegram, whatsapp) -> dict:
+    from callbacks import InvalidCallbackData
+    from metrics import HANDLER_ERRORS
+    from repository import post_points
+
+    factory = UpdateFactory(application.bot)
+    admin_id = bot.SUPER_ADMIN_ID
+    users = [FIRST_USER_ID + i for i in range(args.users)]
+    new_user_ids = itertools.count(SEED_USER_ID + args.seed_users)
+
+    if args.seed_users:
+        started = time.perf_counter()
+        await bot.repo.db.write(seed_users, args.seed_users, random.Random(args.seed))
+        logger.warning(f"Seeded {args.seed_users} users in {time.perf_counter() - started:.1f}s")
+    if args.seed_sessions:
+        started = time.perf_counter()
+        await bot.repo.db.write(seed_sessions, args.seed_sessions, args.seed_users, random.Random(args.seed))
+        logger.warning(f"Seeded {args.seed_sessions} sessions in {time.perf_counter() - started:.1f}s")
+
+    # ওয়ার্মআপ: সব ইউজার রেজিস্টার করে উইথড্রর জন্য পয়েন্ট দেওয়া হয় (মাপা হয় না)
+    for user_id in users + [admin_id]:
+        await application.process_update(factory.message(user_id, "/start"))
+        await bot.repo.db.write(post_points, user_id, 10 ** 6, "loadtest")
+    bot.repo.profiles.invalidate()
+    # সিনথেটিক ইউজাররা বারবার লগইন করে; প্রতি ইউজারের রেট লিমিট এখানে মাপার বিষয় নয়
+    bot.login_scheduler.per_user = 10 ** 9
+    if args.background == "users":
+        bot.ALL_ADMIN_IDS.append(BACKGROUND_ADMIN_ID)  # router একই লিস্ট দেখে
+        await application.process_update(factory.message(BACKGROUND_ADMIN_ID, "/start"))
+
+    weights = parse_mix(args.mix)
+    names, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+    latencies = {}
+    budget = {"left": args.updates}
+
+    def is_next_page(data: str) -> bool:
+        try:
+            route, args = bot.router.decode(data)
+        except InvalidCallbackData:
+            return False
+        return route.name.endswith("_page") and args[1].startswith("n")
+
+    async def send(user_id, kind, payload, label, into=latencies) -> bool:
+        if kind == "next_page":
+            pages = [data for data in telegram.keyboards.get(user_id, []) if is_next_page(data)]
+            if not pages:
+                return False
+            update = factory.callback(user_id, pages[-1])
+        else:
+            update = factory.message(user_id, payload)
+        start = time.perf_counter()
+        await application.process_update(update)
+        into.setdefault(label, []).append(time.perf_counter() - start)
+        return True
+
+    async def worker(worker_id: int, own_users):
+        rng = random.Random(args.seed + worker_id)
+        while budget["left"] > 0:
+            name = rng.choices(names, cum_weights=cumulative)[0]
+            user_id = admin_id if name == "admin" else rng.choice(own_users)
+            if name == "admin" and worker_id != 0:
+                continue  # একজন অ্যাডমিন, তাই তার আপডেটগুলো একটি ওয়ার্কারেই ক্রমানুসারে চলে
+            referrer = None
+            if name == "signup":
+                user_id, referrer = next(new_user_ids), rng.choice(own_users)
+                if args.seed_users and rng.random() < 0.5:
+                    referrer = SEED_USER_ID + rng.randrange(args.seed_users)
+            for step, (kind, payload) in enumerate(scenario_steps(name, user_id, rng, referrer)):
+                if budget["left"] <= 0:
+                    break
+                budget["left"] -= 1
+                await send(user_id, kind, payload, f"{name}.{step}")
+
+    background_latencies = {}
+    background_done = asyncio.Event()
+    background = {"kind": args.background, "pages": 0, "walks": 0}
+
+    async def walk_users():
+        # পুরো ইউজার লিস্ট পেজ ধরে, শেষ হলে আবার শুরু থেকে; মিক্স শেষ না হওয়া পর্যন্ত
+        while not background_done.is_set():
+            await send(BACKGROUND_ADMIN_ID, "msg", "👁️ ইউজার লিস্ট", "users.0", background_latencies)
+            background["pages"] += 1
+            while not background_done.is_set():
+                if not await send(BACKGROUND_ADMIN_ID, "next_page", None, "users.next", background_latencies):
+                    background["walks"] += 1
+                    break
+                background["pages"] += 1
+
+    if args.background == "broadcast":
+        # ফেক API তে রেট লিমিট নেই; বাকেট খুলে দিলে ব্রডকাস্ট যত দ্রুত পারে ডাটাবেজ পড়ে ও লেখে
+        bot.broadcaster.bucket.rate = bot.broadcaster.bucket.capacity = 10 ** 6
+        await send(admin_id, "msg", "🔔 ব্রডকাস্ট", "broadcast.0", background_latencies)
+        await send(admin_id, "msg", "লোড টেস্ট ব্রডকাস্ট", "broadcast.1", background_latencies)
+    background_task = asyncio.create_task(walk_users()) if args.background == "users" else None
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    concurrency = min(args.concurrency, len(users))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i, users[i::concurrency]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    background_done.set()
+    if background_task:
+        await background_task
+    if args.background == "broadcast":
+        job = await bot.repo.db.fetchone("SELECT status, sent, failed, total FROM broadcast_jobs ORDER BY job_id DESC LIMIT 1")
+        background.update(status=job[0], sent=job[1], failed=job[2], total=job[3])
+    background["steps"] = {
+        label: {"count": len(values), "p99_ms": round(percentile(values, 0.99) * 1000, 2)}
+        for label, values in sorted(background_latencies.items())
+    }
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    burst = await login_burst(application, bot, telegram, whatsapp, factory, args) if args.login_burst else None
+    sessions = await session_pages_and_sweep(application, bot, send, args.seed_sessions) if args.seed_sessions else None
+
+    # ট্রিগারে রাখা যোগফল ও পয়েন্ট লেজার পুরো টেবিল গোনার সাথে মেলে কিনা
+    await bot.repo.write_behind.flush()
+    stats_drift = await bot.repo.audit_stats()
+    points_mismatches = await bot.repo.audit_points()
+    referral_mismatches = await bot.repo.audit_referrals()
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "updates": len(everything),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(everything, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+        "handler_errors": int(sum(child.value for child in HANDLER_ERRORS._children.values())),
+        "telegram_calls": telegram.calls,
+        "stats_drift": {name: list(values) for name, values in stats_drift.items()},
+        "points_mismatches": len(points_mismatches),
+        "referral_mismatches": len(referral_mismatches),
+        "login_burst": burst,
+        "sessions": sessions,
+        "background": background if args.background else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "traced_peak_mb": round(traced_peak / 2 ** 20, 1) if traced_peak is not None else None,
+        "steps": {
+            label: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            }
+            for label, values in sorted(latencies.items())
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"updates:        {report['updates']} in {report['seconds']}s ({report['throughput']} updates/s)")
+    print(f"latency:        p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms")
+    print(f"handler errors: {report['handler_errors']}")
+    print(f"telegram calls: {report['telegram_calls']}")
+    print(f"consistency:    stats drift {report['stats_drift'] or 'none'}, "
+          f"{report['points_mismatches']} points mismatches, {report['referral_mismatches']} referral count mismatches")
+    print(f"max RSS:        {report['max_rss_mb']} MiB"
+          + (f", traced peak {report['traced_peak_mb']} MiB" if report["traced_peak_mb"] is not None else ""))
+    burst = report["login_burst"]
+    if burst:
+        print(f"login burst:    {burst['users']} users, cap {burst['capacity']}: peak {burst['peak_pending_at_api']} "
+              f"pending at API, {burst['queued_after_burst']} queued, accepted in {burst['accept_seconds']}s, "
+              f"drained in {burst['drain_seconds']}s")
+        print(f"                {burst['qr_sent']} QR sent ({burst.get('confirmed', 0)} confirmed, "
+              f"{burst.get('cancelled', 0)} cancelled, {burst.get('abandoned', 0)} abandoned), "
+              f"{burst['deleted_at_api']} sessions deleted, avg hold {burst['avg_hold_seconds']}s, "
+              f"left {burst['left_pending']} pending / {burst['left_queued']} queued")
+    sessions = report["sessions"]
+    if sessions:
+        print(f"sessions:       {sessions['seeded']} seeded; admin page p50 {sessions['page_p50_ms']} ms, "
+              f"p99 {sessions['page_p99_ms']} ms over {sessions['pages']} pages, "
+              f"at most {sessions['max_queries_per_page']} queries per page")
+        print(f"                sweep checked {sessions['sweep_checked']} ({sessions['sweep_changed']} changed) "
+              f"in {sessions['sweep_seconds']}s")
+    background = report["background"]
+    if background and background["kind"] == "broadcast":
+        print(f"background:     broadcast {background['status']}, {background['sent']}/{background['total']} sent "
+              f"during the mix")
+    elif background:
+        print(f"background:     user list, {background['pages']} pages ({background['walks']} full walks) "
+              f"during the mix")
+    print(f"\n{'step':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, step in report["steps"].items():
+        print(f"{label:<16}{step['count']:>8}{step['p50_ms']:>10}{step['p99_ms']:>10}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000, help="কতগুলো আপডেট পাঠানো হবে (ওয়ার্মআপ বাদে)")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--seed-users", type=int, default=0, help="ওয়ার্মআপের আগে SQL এ এতজন অতিরিক্ত ইউজার")
+    parser.add_argument("--seed-sessions", type=int, default=0,
+                        help="--seed-users এর ইউজারদের এতগুলো সেশন; মিক্সের পর সেশন পেজ ও একটি পুরো সুইপ মাপা হয়")
+    parser.add_argument("--login-burst", type=int, default=0, help="মিক্সের পর এতজন নতুন ইউজার একসাথে লগইন করে")
+    parser.add_argument("--login-cap", type=int, default=20, help="বার্স্টে একসাথে সর্বোচ্চ পেন্ডিং লগইন")
+    parser.add_argument("--qr-timeout", type=float, default=2.0, help="বার্স্টে QR টাইমআউট (সেকেন্ড)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--wa-latency-ms", type=float, default=0,
+                        help="স্টাব WhatsApp API এর প্রতিটি রেসপন্সে এতটা দেরি (ধীর Node সার্ভার)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="সিনারিও=ওজন, কমা দিয়ে আলাদা")
+    parser.add_argument("--background", choices=("broadcast", "users"),
+                        help="মিক্সের সাথে একটি বড় ব্রডকাস্ট অথবা পুরো ইউজার লিস্টের পেজ ধরে হাঁটা; এর আপডেট p99 এ গোনা হয় না")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="পাইথন হিপের পিক মাপে (ধীর)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--max-p99-ms", type=float, help="p99 এর বেশি হলে বা কোনো হ্যান্ডলার এরর হলে exit 1")
+    args = parser.parse_args(argv)
+    if args.seed_sessions and not args.seed_users:
+        parser.error("--seed-sessions needs --seed-users")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix="bot-loadtest-") as workdir:
+        os.chdir(workdir)  # bot_database.db টেম্প ডিরেক্টরিতে তৈরি হয়
+        report = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    if args.max_p99_ms is not None and (report["p99_ms"] > args.max_p99_ms or report["handler_errors"]):
+        sys.exit(1)
+    if report["stats_drift"] or report["points_mismatches"] or report["referral_mismatches"]:
+        sys.exit(1)
+    burst = report["login_burst"]
+    if burst and (burst["peak_pending_at_api"] > burst["capacity"] or burst["left_pending"] or burst["left_queued"]
+                  or burst["qr_sent"] != burst["users"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import math
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+LOGIN_MAX_PENDING = 50  # একসাথে সর্বোচ্চ পেন্ডিং QR সেশন (সব ওয়ার্কার মিলিয়ে); প্রতিটি API সার্ভারে একটি Baileys সকেট
+LOGIN_USER_LIMIT = 3  # প্রতি ইউজার LOGIN_USER_WINDOW সেকেন্ডে সর্বোচ্চ এতবার লগইন শুরু করতে পারে
+LOGIN_USER_WINDOW = 10 * 60.0
+LOGIN_QR_TIMEOUT = 3 * 60.0  # এতক্ষণে স্ক্যান না হলে QR সেশন বাতিল হয়ে জায়গা ছেড়ে দেয়
+LOGIN_EXPIRY_INTERVAL = 15.0  # সেকেন্ড; পরিত্যক্ত সেশন খোঁজা ও কিউ থেকে নতুন লগইন শুরুর জব
+LOGIN_RATE_TRACKED = 10000  # এর বেশি ইউজারের হিসাব জমলে পুরনোগুলো মুছে ফেলা হয়
+
+
+class LoginScheduler:
+    """WhatsApp লগইনের অ্যাডমিশন কন্ট্রোল।
+
+    প্রতিটি পেন্ডিং লগইন API সার্ভারে একটি পুরো Baileys সকেট ধরে রাখে, তাই একসাথে `capacity` টির বেশি
+    শুরু হয় না; বাকিরা login_queue তে FIFO ক্রমে অপেক্ষা করে এবং জায়গা খালি হলে admit() তাদের তোলে।
+    সীমা ও কিউ ডাটাবেজে থাকে বলে সব ওয়ার্কার প্রসেস মিলিয়ে প্রযোজ্য। প্রতি ইউজারের রেট লিমিট মেমরিতে,
+    কারণ একজন ইউজারের সব আপডেট একই ওয়ার্কারে আসে।
+    """
+
+    def __init__(self, repo, capacity: int = LOGIN_MAX_PENDING, per_user: int = LOGIN_USER_LIMIT,
+                 window: float = LOGIN_USER_WINDOW, qr_timeout: float = LOGIN_QR_TIMEOUT):
+        self.repo = repo
+        self.capacity = capacity
+        self.per_user = per_user
+        self.window = window
+        self.qr_timeout = qr_timeout
+        self._attempts = {}  # user_id -> শেষ লগইন শুরুর সময়গুলো (deque)
+
+    def retry_after(self, user_id: int) -> float:
+        """0 হলে লগইন শুরু করা যাবে (এবং এই চেষ্টাটি গোনা হলো); নাহলে কত সেকেন্ড পর আবার চেষ্টা করা যাবে"""
+        now = time.monotonic()
+        if len(self._attempts) > LOGIN_RATE_TRACKED:
+            self._attempts = {uid: stamps for uid, stamps in self._attempts.items() if stamps[-1] > now - self.window}
+        stamps = self._attempts.setdefault(user_id, deque())
+        while stamps and stamps[0] <= now - self.window:
+            stamps.popleft()
+        if len(stamps) >= self.per_user:
+            return stamps[0] + self.window - now
+        stamps.append(now)
+        return 0.0
+
+    async def request(self, user_id: int, phone_number: str) -> int:
+        """0 হলে এখনই লগইন শুরু করুন; নাহলে কিউতে অবস্থান"""
+        return await self.repo.enqueue_login(user_id, phone_number, self.capacity)
+
+    async def position(self, user_id: int) -> int:
+        return await self.repo.login_queue_position(user_id)
+
+    async def leave(self, user_id: int) -> bool:
+        return await self.repo.leave_login_queue(user_id)
+
+    async def estimated_wait(self, position: int) -> float:
+        """কিউর `position` এ থাকা ইউজারের আনুমানিক অপেক্ষা (সেকেন্ড)"""
+        _, _, hold = await self.repo.login_load()
+        # মাপ না থাকলে ধরা হয় অর্ধেক সেশন সময়মতো স্ক্যান হয়, বাকিরা টাইমআউট পর্যন্ত থাকে
+        hold = hold if hold is not None else self.qr_timeout / 2
+        return math.ceil(position / self.capacity) * hold
+
+    async def admit(self) -> list:
+        """খালি জায়গায় কিউর শুরুর ইউজাররা; [(user_id, phone_number)], কলার তাদের লগইন শুরু করবে"""
+        admitted = await self.repo.admit_queued_logins(self.capacity)
+        if admitted:
+            logger.info(f"Admitted {len(admitted)} queued WhatsApp logins")
+        return admitted
+
+    async def expire(self) -> list:
+        """qr_timeout এর বেশি পুরনো পেন্ডিং লগইন; [(phone_number, user_id)], কলার সার্ভারের সেশন বাতিল করবে"""
+        expired = await self.repo.expire_pending_logins(self.qr_timeout)
+        if expired:
+            logger.info(f"Expired {len(expired)} abandoned WhatsApp logins")
+        return expired
@@ -0,0 +1,388 @@
+"""bot_database.db এর রক্ষণাবেক্ষণ: বট চালু রেখে ব্যাকআপ, পুরনো সারি আর্কাইভ ও incremental vacuum।
+
+প্রতিটি কাজ একটি MaintenanceReport রিটার্ন করে (কতক্ষণ লাগল, কত বাইট খালি হলো) এবং লগ ও মেট্রিকে জানায়;
+bot.py এগুলো প্রাইমারি প্রসেসের JobQueue তে চালায়।
+
+    python maintenance.py --check [rows]   # অস্থায়ী ডাটাবেজে লেখা চলাকালীন তিনটি কাজ চালিয়ে ফলাফল যাচাই
+    python maintenance.py --convert [db]   # পুরনো ডাটাবেজে incremental auto_vacuum চালু (পুরো VACUUM; বট বন্ধ রেখে)
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import sqlite3
+import asyncio
+import logging
+import datetime
+import tempfile
+from collections import namedtuple
+
+from db import DB_PATH, DBExecutor, connect, transaction
+from metrics import MAINTENANCE_RECLAIMED, MAINTENANCE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL = 6 * 60 * 60  # সেকেন্ড
+BACKUP_KEEP = 8  # সবচেয়ে নতুন এতগুলো ব্যাকআপ রাখা হয়
+BACKUP_PAGES_PER_STEP = 256  # প্রতি ধাপে এতগুলো পেজ কপি হয় (৪ KiB পেজে ১ MiB)
+BACKUP_STEP_PAUSE = 0.005  # ধাপের মাঝে বিরতি (সেকেন্ড), যাতে ব্যাকআপ ডিস্ক একা দখল না করে
+
+ARCHIVE_DB_PATH = "bot_archive.db"
+ARCHIVE_INTERVAL = 24 * 60 * 60
+SESSION_ARCHIVE_DAYS = 30  # 'inactive' হওয়ার এতদিন পর সেশন আর্কাইভে যায়
+WITHDRAWAL_ARCHIVE_DAYS = 90  # নিষ্পত্তির এতদিন পর উইথড্র আর্কাইভে যায়; এর পুরনোগুলো CSV এক্সপোর্টে আর আসে না
+ARCHIVE_BATCH = 500  # প্রতি ট্রানজ্যাকশনে সর্বোচ্চ এতগুলো সারি; ব্যাচের মাঝে অন্য লেখা চলে
+
+VACUUM_INTERVAL = 6 * 60 * 60
+VACUUM_PAGES_PER_STEP = 512  # প্রতি রাইট ট্রানজ্যাকশনে এতগুলো খালি পেজ ফেরত দেওয়া হয়
+
+# টেবিল -> (প্রাইমারি কী, কোন সারি আর্কাইভ হবে, বয়স কোন সময় থেকে গোনা হয়)
+ARCHIVE_POLICIES = {
+    "sessions": ("session_id", "status = 'inactive'", "COALESCE(status_changed_at, created_at)"),
+    "withdrawals": ("request_id", "status != 'pending'", "COALESCE(settled_at, requested_at)"),
+}
+
+MaintenanceReport = namedtuple("MaintenanceReport", "job seconds reclaimed_bytes detail")
+
+
+def _report(job: str, started: float, reclaimed: int, **detail) -> MaintenanceReport:
+    report = MaintenanceReport(job, time.perf_counter() - started, reclaimed, detail)
+    MAINTENANCE_SECONDS.labels(job).observe(report.seconds)
+    MAINTENANCE_RECLAIMED.labels(job).inc(reclaimed)
+    logger.info(f"Maintenance {job}: {report.seconds:.2f}s, reclaimed {reclaimed} bytes, {detail}")
+    return report
+
+
+def _file_size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _page_stats(conn: sqlite3.Connection):
+    """(page_size, freelist_count)"""
+    return conn.execute("PRAGMA page_size").fetchone()[0], conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+# --- Backup ---
+def backup_database(path: str = DB_PATH, dest_dir: str = BACKUP_DIR, keep: int = BACKUP_KEEP,
+                    pages: int = BACKUP_PAGES_PER_STEP, pause: float = BACKUP_STEP_PAUSE) -> MaintenanceReport:
+    """চালু ডাটাবেজের একটি সামঞ্জস্যপূর্ণ কপি dest_dir এ লেখে ও পুরনো কপি মুছে দেয় (ব্লকিং; থ্রেডে চালান)।
+
+    SQLite এর backup API প্রতি ধাপে `pages` টি পেজ কপি করে। পুরো সময় একটি read ট্রানজ্যাকশন খোলা থাকে:
+    WAL মোডে এটি লেখকদের আটকায় না, কিন্তু না থাকলে অন্য কানেকশনের প্রতিটি লেখার পর ব্যাকআপ শুরু থেকে
+    আবার হয় এবং ব্যস্ত সময়ে কখনো শেষ হয় না। এই সময়ে WAL checkpoint পুরো হতে পারে না, তাই WAL ফাইল বাড়ে।
+    """
+    started = time.perf_counter()
+    os.makedirs(dest_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(dest_dir, f"{stem}-{stamp}.db")
+    partial = target + ".part"
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        time.sleep(pause)
+
+    source = connect(path)
+    copy = sqlite3.connect(partial, isolation_level=None)
+    try:
+        with transaction(source):
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # স্ন্যাপশট এখান থেকে
+            source.backup(copy, pages=pages, progress=progress)
+        copy.execute("PRAGMA journal_mode=DELETE")  # ব্যাকআপ একটিমাত্র ফাইল, পাশে -wal ছাড়া
+        check = copy.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"Backup {partial} failed quick_check: {check}")
+        copied_pages = copy.execute("PRAGMA page_count").fetchone()[0]
+    except BaseException:
+        copy.close()
+        for leftover in (partial, partial + "-wal", partial + "-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    finally:
+        source.close()
+    copy.close()
+    os.replace(partial, target)
+
+    # নাম সময় অনুযায়ী সাজানো, তাই শেষের `keep` টি সবচেয়ে নতুন; আগের কোনো ক্র্যাশ করা রানের .part ফাইলও যায়
+    stale = sorted(glob.glob(os.path.join(dest_dir, f"{stem}-*.db")))[:-keep]
+    stale += glob.glob(os.path.join(dest_dir, f"{stem}-*.db.part"))
+    reclaimed = 0
+    for old in stale:
+        reclaimed += _file_size(old)
+        os.remove(old)
+    return _report("backup", started, reclaimed, file=target, bytes=_file_size(target), pages=copied_pages,
+                   steps=steps, removed=len(stale))
+
+
+# --- Archival ---
+def _ensure_archive_table(conn: sqlite3.Connection, table: str, key: str) -> list:
+    """archive.<table> তৈরি করে ও main এ পরে যোগ হওয়া কলাম যোগ করে; main.<table> এর কলামগুলো রিটার্ন করে"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS archive.{table} "
+        f"({key} INTEGER PRIMARY KEY, archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    existing = {row[1] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+    for column in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+    return columns
+
+
+def _archive_batch(conn: sqlite3.Connection, archive_path: str, table: str, days: int, after: int, limit: int):
+    """কী `after` এর পরের সর্বোচ্চ `limit` টি পুরনো সারি archive_path এ সরায়; (শেষ কী, কতগুলো সরানো হলো)"""
+    key, condition, age = ARCHIVE_POLICIES[table]
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    try:
+        with transaction(conn, "IMMEDIATE"):
+            columns = ", ".join(_ensure_archive_table(conn, table, key))
+            # কাটঅফ একবারই হিসাব হয়, যাতে INSERT ও DELETE ঠিক একই সারিগুলো দেখে
+            cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{days} days",)).fetchone()[0]
+            last = conn.execute(
+                f"SELECT MAX({key}) FROM (SELECT {key} FROM main.{table} "
+                f"WHERE {key} > ? AND {condition} AND {age} < ? ORDER BY {key} LIMIT ?)",
+                (after, cutoff, limit)
+            ).fetchone()[0]
+            if last is None:
+                return after, 0
+            where = f"{key} > ? AND {key} <= ? AND {condition} AND {age} < ?"
+            params = (after, last, cutoff)
+            # দুই ফাইলের কমিট আলাদা হয়; আগের রান মাঝপথে ক্র্যাশ করলে সারিটি archive এ আগেই থাকতে পারে
+            conn.execute(
+                f"INSERT OR REPLACE INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE {where}",
+                params
+            )
+            moved = conn.execute(f"DELETE FROM main.{table} WHERE {where}", params).rowcount
+            if table == "sessions":
+                # ট্রিগার মোট সেশন থেকে বাদ দেয়; ড্যাশবোর্ড আর্কাইভের সংখ্যা আলাদা দেখায়
+                conn.execute(
+                    "INSERT INTO stats_totals (name, value) VALUES ('sessions_archived', ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                    (moved,)
+                )
+            return last, moved
+    finally:
+        conn.execute("DETACH DATABASE archive")
+
+
+async def archive_old_rows(db: DBExecutor, archive_path: str = ARCHIVE_DB_PATH,
+                           session_days: int = SESSION_ARCHIVE_DAYS, withdrawal_days: int = WITHDRAWAL_ARCHIVE_DAYS,
+                           batch: int = ARCHIVE_BATCH) -> MaintenanceReport:
+    """নীতিমালা অনুযায়ী পুরনো সেশন ও উইথড্র archive_path এ সরায়, প্রতি ব্যাচ আলাদা ছোট ট্রানজ্যাকশনে।
+
+    reclaimed_bytes মূল ডাটাবেজে খালি হওয়া পেজ; ফাইল ছোট হয় পরের incremental_vacuum() এ।
+    """
+    started = time.perf_counter()
+    page_size, free_before = await db.read(_page_stats)
+    archived = {}
+    for table, days in (("sessions", session_days), ("withdrawals", withdrawal_days)):
+        after, archived[table] = 0, 0
+        while True:
+            after, moved = await db.write(_archive_batch, archive_path, table, days, after, batch)
+            if not moved:
+                break
+            archived[table] += moved
+    _, free_after = await db.read(_page_stats)
+    return _report("archive", started, max(0, free_after - free_before) * page_size, archived=archived,
+                   archive_bytes=_file_size(archive_path))
+
+
+# --- Incremental vacuum ---
+def _vacuum_step(conn: sqlite3.Connection, pages: int) -> int:
+    # প্রতিটি sqlite3_step একটি পেজ ছাড়ে; execute() একবারই step করে, executescript() শেষ পর্যন্ত চালায়
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+async def incremental_vacuum(db: DBExecutor, pages: int = VACUUM_PAGES_PER_STEP) -> MaintenanceReport:
+    """খালি পেজগুলো ধাপে ধাপে (প্রতি ধাপ writer থ্রেডে একটি ছোট ট্রানজ্যাকশন) ফাইল থেকে ছেঁটে OS কে ফেরত দেয়"""
+    started = time.perf_counter()
+    mode = (await db.fetchone("PRAGMA auto_vacuum"))[0]
+    page_size, free_before = await db.read(_page_stats)
+    if mode != 2:  # 2 = INCREMENTAL
+        logger.warning(
+            f"{db.path} has auto_vacuum={mode}; {free_before} free pages stay in the file until "
+            f"`python maintenance.py --convert` is run with the bot stopped"
+        )
+        return _report("vacuum", started, 0, free_pages=free_before, auto_vacuum=mode)
+    size_before = _file_size(db.path)
+    free, steps = free_before, 0
+    while free:
+        remaining = await db.write(_vacuum_step, pages)
+        steps += 1
+        if remaining >= free:
+            break
+        free = remaining
+    # ছাঁটা পেজ WAL এ থাকে; checkpoint এর পর মূল ফাইল ছোট হয় (রিডার থাকলে PASSIVE অপেক্ষা না করে ফিরে আসে)
+    await db.write(lambda conn: conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall())
+    return _report("vacuum", started, (free_before - free) * page_size, steps=steps,
+                   file_bytes=(size_before, _file_size(db.path)))
+
+
+def convert_to_incremental(path: str = DB_PATH) -> MaintenanceReport:
+    """পুরনো ডাটাবেজে auto_vacuum=INCREMENTAL চালু করে; পুরো VACUUM তাই লেখা আটকায়, বট বন্ধ রেখে চালান"""
+    started = time.perf_counter()
+    size_before = _file_size(path)
+    conn = connect(path)
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # VACUUM এটি ফাইলে লেখে
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
+    return _report("convert", started, max(0, size_before - _file_size(path)), auto_vacuum=mode)
+
+
+# --- python maintenance.py --check ---
+# একই যাচাই (ছোট আকারে) tests/test_maintenance.py তে; এখানে বড় ডাটাবেজে লেখার ল্যাটেন্সিও দেখা যায়
+CHECK_SEED_ID = 300_000_000
+CHECK_WRITERS = 4
+
+
+def _seed(path: str, rows: int) -> dict:
+    """rows জন ইউজার, প্রত্যেকের একটি সেশন ও উইথড্র; দুই-তৃতীয়াংশ আর্কাইভের যোগ্য বয়সের। যোগ্য সারির সংখ্যা রিটার্ন করে"""
+    conn = connect(path)
+    users, sessions, withdrawals = [], [], []
+    expected = {"sessions": 0, "withdrawals": 0}
+    for i in range(rows):
+        user_id = CHECK_SEED_ID + i
+        old = i % 3 != 0
+        users.append((user_id, f"seed{i}", f"ref_{user_id}"))
+        status = "inactive" if old or i % 2 else "active"
+        sessions.append((user_id, f"+1{user_id}", status, "-60 days" if old else "-1 days"))
+        withdrawals.append((user_id, 100.0 + i % 50, 1000, f"017{i:08d}", "approved" if old else "pending",
+                            "-120 days" if old else "-1 days"))
+        expected["sessions"] += status == "inactive" and old
+        expected["withdrawals"] += old
+    with transaction(conn):
+        conn.executemany("INSERT INTO users (user_id, username, referral_code) VALUES (?, ?, ?)", users)
+        conn.executemany(
+            "INSERT INTO sessions (user_id, phone_number, status, status_changed_at) "
+            "VALUES (?, ?, ?, datetime('now', ?))", sessions
+        )
+        conn.executemany(
+            "INSERT INTO withdrawals (user_id, amount_bdt, points_used, payment_number, status, settled_at) "
+            "VALUES (?, ?, ?, ?, ?, datetime('now', ?))", withdrawals
+        )
+    conn.close()
+    return expected
+
+
+async def _audit(path: str) -> dict:
+    from repository import Repository
+
+    db = DBExecutor(path, readers=1)
+    repo = Repository(db)
+    try:
+        return {
+            "users": (await db.fetchone("SELECT COUNT(*) FROM users"))[0],
+            "stats_drift": await repo.audit_stats(),
+            "points_mismatches": len(await repo.audit_points()),
+            "referral_mismatches": len(await repo.audit_referrals()),
+        }
+    finally:
+        db.close()
+
+
+async def _check(rows: int) -> bool:
+    """অস্থায়ী ডাটাবেজে CHECK_WRITERS টি টাস্ক নতুন ইউজার, লগইন ও উইথড্র লিখতে থাকে; এর মধ্যে ব্যাকআপ,
+    আর্কাইভ ও vacuum চলে। ব্যাকআপের কপি একই স্ন্যাপশটের কিনা (ট্রিগারের যোগফল = পুরো গণনা), আর্কাইভে
+    ঠিক যোগ্য সারিগুলো গেছে কিনা এবং লেখার ল্যাটেন্সি কতটা বাড়ল তা দেখায়।
+    """
+    from migrations import apply_migrations
+    from repository import Repository
+
+    workdir = tempfile.mkdtemp(prefix="maintenance-check-")
+    path = os.path.join(workdir, "bot_database.db")
+    archive_path = os.path.join(workdir, "bot_archive.db")
+    apply_migrations(path)
+    expected = _seed(path, rows)
+    db = DBExecutor(path)
+    repo = Repository(db)
+    stop = asyncio.Event()
+    phase = "idle"
+    latencies = {}
+    written = [0]
+
+    async def writer(index: int) -> None:
+        user_id = CHECK_SEED_ID + rows + index
+        while not stop.is_set():
+            user_id += CHECK_WRITERS
+            start = time.perf_counter()
+            await repo.create_user(user_id, f"w{user_id}", f"ref_{user_id}", datetime.date.today(), 100)
+            await repo.record_login(user_id, f"+2{user_id}", 10)
+            await repo.create_withdrawal(user_id, 1.0, 50, "017")
+            latencies.setdefault(phase, []).append(time.perf_counter() - start)
+            written[0] += 1
+
+    tasks = [asyncio.create_task(writer(i)) for i in range(CHECK_WRITERS)]
+    ok = True
+    try:
+        await asyncio.sleep(1.0)
+        phase = "backup"
+        # ছোট ধাপ, যাতে ব্যাকআপ অনেকগুলো লেখার মধ্যে দিয়ে চলে
+        backup = await asyncio.to_thread(backup_database, path, os.path.join(workdir, "backups"), 2, 16, 0.001)
+        written_at_backup = written[0]
+        phase = "archive"
+        archive = await archive_old_rows(db, archive_path, batch=200)
+        phase = "vacuum"
+        vacuum = await incremental_vacuum(db, pages=64)
+        phase = "after"
+        await asyncio.sleep(0.5)
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks)
+        await repo.flush()
+        db.close()
+
+    backup_audit = await _audit(backup.detail["file"])
+    live_audit = await _audit(path)
+    archive_conn = sqlite3.connect(archive_path)
+    in_archive = {table: archive_conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ARCHIVE_POLICIES}
+    archive_conn.close()
+
+    for report in (backup, archive, vacuum):
+        print(f"{report.job:<8} {report.seconds:7.2f}s  reclaimed {report.reclaimed_bytes:>10} bytes  {report.detail}")
+    print(f"\n{'phase':<8}{'writes':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, values in latencies.items():
+        values = sorted(values)
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+        print(f"{name:<8}{len(values):>8}{pick(0.5):>9.2f}{pick(0.99):>9.2f}{values[-1] * 1000:>9.2f}")
+    print(f"\nbackup copy: {backup_audit} ({written_at_backup} writes had finished when it completed)")
+    print(f"live db:     {live_audit}")
+    print(f"archive:     {in_archive}, expected {expected}")
+
+    for name, audit in (("backup", backup_audit), ("live", live_audit)):
+        if audit["stats_drift"] or audit["points_mismatches"] or audit["referral_mismatches"]:
+            print(f"FAILED: {name} database is inconsistent")
+            ok = False
+    if backup_audit["users"] < rows or "backup" not in latencies:
+        print("FAILED: backup did not overlap the writers")
+        ok = False
+    if in_archive != expected or archive.detail["archived"] != expected:
+        print("FAILED: archived rows do not match the policy")
+        ok = False
+    if vacuum.reclaimed_bytes <= 0:
+        print("FAILED: incremental vacuum reclaimed nothing")
+        ok = False
+    shutil.rmtree(workdir)
+    return ok
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if "--convert" in sys.argv:
+        logging.getLogger().setLevel(logging.INFO)
+        report = convert_to_incremental(args[0] if args else DB_PATH)
+        sys.exit(0 if report.detail["auto_vacuum"] == 2 else 1)
+    if "--check" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    sys.exit(0 if asyncio.run(_check(int(args[0]) if args else 20000)) else 1)
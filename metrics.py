@@ -0,0 +1,222 @@
+import time
+import bisect
+import functools
+import threading
+
+from aiohttp import web
+
+# ল্যাটেন্সি হিস্টোগ্রামের ডিফল্ট বাকেট (সেকেন্ড)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        key = tuple(str(v) for v in values) or tuple(str(kwargs[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            yield from child.samples(self.name, self.labelnames, key)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def samples(self, name, labelnames, key):
+        yield f"{name}{_format_labels(labelnames, key)} {self.value}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """সেট করা মান, অথবা collect() কলব্যাক যা স্ক্র্যাপের সময় {label_tuple: value} রিটার্ন করে"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None, collect=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.collect = collect
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _samples(self):
+        if self.collect is None:
+            yield from super()._samples()
+            return
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # শেষটি +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name, labelnames, key):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _format_labels(labelnames, key, f'le="{le}"')
+            yield f"{name}_bucket{labels} {cumulative}"
+        yield f"{name}_sum{_format_labels(labelnames, key)} {self.sum}"
+        yield f"{name}_count{_format_labels(labelnames, key)} {cumulative}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_seconds", "Telegram handler latency", ("handler", "action")
+)
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ("handler", "action"))
+DB_QUERY_LATENCY = Histogram("bot_db_query_seconds", "SQLite calls run on the DB executor threads", ("pool",))
+WA_API_LATENCY = Histogram(
+    "bot_wa_api_request_seconds", "WhatsApp API server request latency", ("method", "endpoint")
+)
+WA_API_ERRORS = Counter(
+    "bot_wa_api_errors_total", "WhatsApp API requests that failed or returned 5xx", ("method", "endpoint", "reason")
+)
+BROADCAST_MESSAGES = Counter("bot_broadcast_messages_total", "Broadcast deliveries by outcome", ("status",))
+MAINTENANCE_SECONDS = Histogram(
+    "bot_maintenance_seconds", "Database maintenance job duration", ("job",),
+    buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0),
+)
+MAINTENANCE_RECLAIMED = Counter(
+    "bot_maintenance_reclaimed_bytes_total", "Bytes freed by database maintenance jobs", ("job",)
+)
+
+
+UNKNOWN_CALLBACK_ACTION = "unknown"
+
+
+def callback_action(update, decode=None) -> str:
+    """বাটনের রুটের নাম (যেমন 'users_page'); decode হলো CallbackRouter.decode।
+
+    callback_data অস্বচ্ছ (base64, এতে ফোন নম্বরও থাকতে পারে), তাই লেবেল শুধু ডিকোড করা রুট থেকে আসে;
+    ডিকোড না হলে সবসময় UNKNOWN_CALLBACK_ACTION, যাতে লেবেলের সংখ্যা রুটের সংখ্যায় সীমিত থাকে।
+    """
+    query = getattr(update, "callback_query", None)
+    if query is None or not query.data:
+        return ""
+    if decode is None:
+        return UNKNOWN_CALLBACK_ACTION
+    try:
+        route, _ = decode(query.data)
+    except Exception:  # InvalidCallbackData ছাড়াও; মেট্রিকের জন্য হ্যান্ডলার কখনো ব্যর্থ হবে না
+        return UNKNOWN_CALLBACK_ACTION
+    return route.name
+
+
+def instrument_handler(fn, decode=None):
+    """হ্যান্ডলার callback মুড়ে দেয়: ল্যাটেন্সি ও এক্সেপশন গোনে (wrap_handler_callbacks এর সাথে ব্যবহার)।
+
+    decode দিলে বাটনের আপডেট রুটের নাম দিয়ে লেবেল হয় (callback_action দেখুন)।
+    """
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    async def wrapper(update, context, *args, **kwargs):
+        labels = (name, callback_action(update, decode))
+        start = time.perf_counter()
+        try:
+            return await fn(update, context, *args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(*labels).observe(time.perf_counter() - start)
+    return wrapper
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
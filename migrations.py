@@ -0,0 +1,407 @@
+import sys
+import sqlite3
+import logging
+
+from db import DB_PATH, connect, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """কলাম না থাকলে ALTER TABLE ... ADD COLUMN চালায় (বারবার চালালেও সমস্যা নেই)"""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _m001_baseline(conn: sqlite3.Connection) -> None:
+    # পুরনো setup_database() এর স্কিমা; IF NOT EXISTS থাকায় আগের ডাটাবেজেও নিরাপদে চলে
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY, 
+        username TEXT, 
+        points INTEGER DEFAULT 0, 
+        referral_code TEXT,
+        referred_by INTEGER, 
+        last_login DATE, 
+        login_streak INTEGER DEFAULT 0,
+        successful_sessions INTEGER DEFAULT 0, 
+        failed_sessions INTEGER DEFAULT 0
+    )""")
+    # Note: 'session_data' will now store a placeholder, as baileys manages files.
+    # 'two_fa_pass' is removed as it's not applicable with baileys in this context.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+        user_id INTEGER, 
+        phone_number TEXT NOT NULL UNIQUE, -- Phone number should be unique per session
+        session_data TEXT DEFAULT 'Baileys Managed', -- Placeholder
+        status TEXT DEFAULT 'active', 
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS withdrawals (
+        request_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+        user_id INTEGER, 
+        amount_bdt REAL,
+        points_used INTEGER, 
+        payment_number TEXT, 
+        status TEXT DEFAULT 'pending',
+        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )""")
+    # ব্রডকাস্ট জব ও প্রতি ইউজারের ডেলিভারি স্টেট (রিস্টার্টের পর resume করার জন্য)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        admin_chat_id INTEGER NOT NULL,
+        progress_message_id INTEGER,
+        status TEXT DEFAULT 'running',
+        total INTEGER DEFAULT 0,
+        sent INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        last_user_id INTEGER DEFAULT 0, -- keyset cursor
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+        job_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT,
+        PRIMARY KEY (job_id, user_id)
+    ) WITHOUT ROWID""")
+    # QR দেখানো হয়েছে কিন্তু এখনও লগইন সম্পন্ন হয়নি এমন নম্বর -> ইউজার
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pending_logins (
+        phone_number TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+
+def _m002_hot_path_indexes(conn: sqlite3.Connection) -> None:
+    # sessions.phone_number এ UNIQUE কনস্ট্রেইন্টের অটো-ইনডেক্স আগে থেকেই আছে
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_status ON sessions (user_id, status)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_withdrawals_pending ON withdrawals (request_id) WHERE status = 'pending'"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_running ON broadcast_jobs (job_id) WHERE status = 'running'"
+    )
+
+
+
+def _m003_points_ledger(conn: sqlite3.Connection) -> None:
+    # পয়েন্টের প্রতিটি পরিবর্তনের append-only হিসাব; users.points একই ট্রানজ্যাকশনে আপডেট হয়।
+    # অপরিবর্তনীয় শর্ত: users.points = snapshot.balance + SUM(ledger.delta)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS points_ledger (
+        entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        delta INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        idempotency_key TEXT UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_points_ledger_user ON points_ledger (user_id, entry_id)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS points_snapshots (
+        user_id INTEGER PRIMARY KEY,
+        balance INTEGER NOT NULL DEFAULT 0,
+        last_entry_id INTEGER NOT NULL DEFAULT 0,
+        taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+    # লেজারের আগের ব্যালেন্স শুরুর স্ন্যাপশট হিসেবে
+    conn.execute("INSERT OR IGNORE INTO points_snapshots (user_id, balance) SELECT user_id, points FROM users")
+
+
+def _m004_persistence(conn: sqlite3.Connection) -> None:
+    # SQLitePersistence: কনভারসেশন স্টেট ও user_data (JSON), সব ওয়ার্কার প্রসেস শেয়ার করে
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS persisted_user_data (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL
+    )""")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS persisted_conversations (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID""")
+
+
+def _m005_pending_login_qr(conn: sqlite3.Connection) -> None:
+    # কোন টেলিগ্রাম মেসেজে QR দেখানো হচ্ছে; নতুন QR এলে সেটিই এডিট হয়
+    add_column(conn, "pending_logins", "qr_message_id", "INTEGER")
+    add_column(conn, "pending_logins", "qr_etag", "TEXT")
+
+
+def _m006_session_health(conn: sqlite3.Connection) -> None:
+    # SessionSweeper এর ফলাফল: সার্ভারের শেষ জানানো স্ট্যাটাস, কখন চেক হয়েছে ও কখন status বদলেছে
+    add_column(conn, "sessions", "server_status", "TEXT")
+    add_column(conn, "sessions", "last_checked_at", "TIMESTAMP")
+    add_column(conn, "sessions", "status_changed_at", "TIMESTAMP")
+
+
+def _total(name: str, delta: str) -> str:
+    return f"UPDATE stats_totals SET value = value + ({delta}) WHERE name = '{name}';"
+
+
+def _rollup(name: str, delta: str) -> str:
+    # একই ইভেন্ট ঘণ্টা ও দিনের বাকেটে; সময় UTC
+    return f"""INSERT INTO stats_rollups (period, bucket, name, value) VALUES
+            ('hour', strftime('%Y-%m-%d %H:00', 'now'), '{name}', {delta}),
+            ('day', date('now'), '{name}', {delta})
+        ON CONFLICT (period, bucket, name) DO UPDATE SET value = value + excluded.value;"""
+
+
+def _m007_stats_aggregates(conn: sqlite3.Connection) -> None:
+    # অ্যাডমিন ড্যাশবোর্ডের যোগফল; ট্রিগার লেখার একই ট্রানজ্যাকশনে আপডেট করে, তাই পড়া O(1)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        name TEXT PRIMARY KEY,
+        value NUMERIC NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""")
+    # ঘণ্টা/দিন ভিত্তিক ইভেন্ট কাউন্ট (নতুন ইউজার, লগইন, উইথড্র ...)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS stats_rollups (
+        period TEXT NOT NULL, -- 'hour' অথবা 'day'
+        bucket TEXT NOT NULL,
+        name TEXT NOT NULL,
+        value NUMERIC NOT NULL DEFAULT 0,
+        PRIMARY KEY (period, bucket, name)
+    ) WITHOUT ROWID""")
+    # শুরুর মান একবারই পুরো টেবিল গুনে; এরপর শুধু ট্রিগার
+    conn.execute("""
+    INSERT OR REPLACE INTO stats_totals (name, value)
+    SELECT 'users', COUNT(*) FROM users
+    UNION ALL SELECT 'referrals', COUNT(*) FROM users WHERE referred_by IS NOT NULL
+    UNION ALL SELECT 'logins_successful', COALESCE(SUM(successful_sessions), 0) FROM users
+    UNION ALL SELECT 'logins_failed', COALESCE(SUM(failed_sessions), 0) FROM users
+    UNION ALL SELECT 'sessions', COUNT(*) FROM sessions
+    UNION ALL SELECT 'sessions_active', COUNT(*) FROM sessions WHERE status = 'active'
+    UNION ALL SELECT 'withdrawals_pending', COUNT(*) FROM withdrawals WHERE status = 'pending'
+    UNION ALL SELECT 'withdrawals_pending_bdt', COALESCE(SUM(amount_bdt), 0) FROM withdrawals WHERE status = 'pending'
+    """)
+
+    triggers = {
+        "trg_stats_users_insert": f"""AFTER INSERT ON users BEGIN
+            {_total('users', '1')}
+            {_total('referrals', 'NEW.referred_by IS NOT NULL')}
+            {_rollup('new_users', '1')}
+        END""",
+        "trg_stats_users_delete": f"""AFTER DELETE ON users BEGIN
+            {_total('users', '-1')}
+            {_total('referrals', '-(OLD.referred_by IS NOT NULL)')}
+            {_total('logins_successful', '-OLD.successful_sessions')}
+            {_total('logins_failed', '-OLD.failed_sessions')}
+        END""",
+        "trg_stats_users_referral": f"""AFTER UPDATE OF referred_by ON users
+            WHEN (OLD.referred_by IS NULL) != (NEW.referred_by IS NULL) BEGIN
+            {_total('referrals', '(NEW.referred_by IS NOT NULL) - (OLD.referred_by IS NOT NULL)')}
+            {_rollup('referrals', '(NEW.referred_by IS NOT NULL) - (OLD.referred_by IS NOT NULL)')}
+        END""",
+        "trg_stats_users_logins": f"""AFTER UPDATE OF successful_sessions ON users
+            WHEN NEW.successful_sessions != OLD.successful_sessions BEGIN
+            {_total('logins_successful', 'NEW.successful_sessions - OLD.successful_sessions')}
+            {_rollup('logins_successful', 'NEW.successful_sessions - OLD.successful_sessions')}
+        END""",
+        "trg_stats_users_failed_logins": f"""AFTER UPDATE OF failed_sessions ON users
+            WHEN NEW.failed_sessions != OLD.failed_sessions BEGIN
+            {_total('logins_failed', 'NEW.failed_sessions - OLD.failed_sessions')}
+            {_rollup('logins_failed', 'NEW.failed_sessions - OLD.failed_sessions')}
+        END""",
+        "trg_stats_sessions_insert": f"""AFTER INSERT ON sessions BEGIN
+            {_total('sessions', '1')}
+            {_total('sessions_active', "NEW.status = 'active'")}
+        END""",
+        "trg_stats_sessions_delete": f"""AFTER DELETE ON sessions BEGIN
+            {_total('sessions', '-1')}
+            {_total('sessions_active', "-(OLD.status = 'active')")}
+        END""",
+        "trg_stats_sessions_status": f"""AFTER UPDATE OF status ON sessions
+            WHEN (OLD.status = 'active') != (NEW.status = 'active') BEGIN
+            {_total('sessions_active', "(NEW.status = 'active') - (OLD.status = 'active')")}
+        END""",
+        "trg_stats_withdrawals_insert": f"""AFTER INSERT ON withdrawals BEGIN
+            {_total('withdrawals_pending', "NEW.status = 'pending'")}
+            {_total('withdrawals_pending_bdt', "CASE WHEN NEW.status = 'pending' THEN NEW.amount_bdt ELSE 0 END")}
+            {_rollup('withdrawals_requested', '1')}
+            {_rollup('withdrawals_requested_bdt', 'NEW.amount_bdt')}
+        END""",
+        "trg_stats_withdrawals_delete": f"""AFTER DELETE ON withdrawals WHEN OLD.status = 'pending' BEGIN
+            {_total('withdrawals_pending', '-1')}
+            {_total('withdrawals_pending_bdt', '-OLD.amount_bdt')}
+        END""",
+        "trg_stats_withdrawals_status": f"""AFTER UPDATE OF status, amount_bdt ON withdrawals BEGIN
+            {_total('withdrawals_pending', "(NEW.status = 'pending') - (OLD.status = 'pending')")}
+            {_total('withdrawals_pending_bdt', "CASE WHEN NEW.status = 'pending' THEN NEW.amount_bdt ELSE 0 END"
+                    " - CASE WHEN OLD.status = 'pending' THEN OLD.amount_bdt ELSE 0 END")}
+        END""",
+        "trg_stats_withdrawals_approved": f"""AFTER UPDATE OF status ON withdrawals
+            WHEN NEW.status = 'approved' AND OLD.status != 'approved' BEGIN
+            {_rollup('withdrawals_approved', '1')}
+            {_rollup('withdrawals_approved_bdt', 'NEW.amount_bdt')}
+        END""",
+    }
+    for name, body in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def _m008_withdrawal_settled_at(conn: sqlite3.Connection) -> None:
+    # কখন অনুমোদন/বাতিল হয়েছে; পেমেন্টের CSV এক্সপোর্ট এই সময় দিয়ে ফিল্টার করে
+    add_column(conn, "withdrawals", "settled_at", "TIMESTAMP")
+
+
+def _m009_referrals(conn: sqlite3.Connection) -> None:
+    # /start ref_<code> এর রেফারার খোঁজা ইনডেক্সে হয়; আগের কোনো কোড ডুপ্লিকেট/খালি থাকলে ডিফল্ট কোড পায়
+    conn.execute("""
+    UPDATE users SET referral_code = 'ref_' || user_id
+    WHERE referral_code IS NULL
+       OR referral_code IN (SELECT referral_code FROM users GROUP BY referral_code HAVING COUNT(*) > 1)""")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_referral_code ON users(referral_code)")
+
+    # প্রতি রেফারারের রেফারেল সংখ্যা; ট্রিগারে রাখা হয়, তাই "আমার রেফারেল" পড়া O(1)
+    add_column(conn, "users", "referral_count", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute("""
+    UPDATE users SET referral_count = r.n
+    FROM (SELECT referred_by, COUNT(*) AS n FROM users WHERE referred_by IS NOT NULL GROUP BY referred_by) r
+    WHERE r.referred_by = users.user_id""")
+    triggers = {
+        # রেফারেল এখন সাইনআপের INSERT এই লেখা হয় (trg_stats_users_referral শুধু পরের UPDATE ধরে)
+        "trg_users_referral_insert": f"""AFTER INSERT ON users WHEN NEW.referred_by IS NOT NULL BEGIN
+            UPDATE users SET referral_count = referral_count + 1 WHERE user_id = NEW.referred_by;
+            {_rollup('referrals', '1')}
+        END""",
+        "trg_users_referral_update": """AFTER UPDATE OF referred_by ON users
+            WHEN OLD.referred_by IS NOT NEW.referred_by BEGIN
+            UPDATE users SET referral_count = referral_count - 1 WHERE user_id = OLD.referred_by;
+            UPDATE users SET referral_count = referral_count + 1 WHERE user_id = NEW.referred_by;
+        END""",
+        "trg_users_referral_delete": """AFTER DELETE ON users WHEN OLD.referred_by IS NOT NULL BEGIN
+            UPDATE users SET referral_count = referral_count - 1 WHERE user_id = OLD.referred_by;
+        END""",
+    }
+    for name, body in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def _m010_login_queue(conn: sqlite3.Connection) -> None:
+    # পেন্ডিং লগইনের সীমা পূর্ণ থাকলে ইউজাররা এখানে FIFO ক্রমে (queue_id) অপেক্ষা করে; প্রতি ইউজার একবার
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS login_queue (
+        queue_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL UNIQUE,
+        phone_number TEXT NOT NULL,
+        enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""")
+
+
+def _m011_login_credits(conn: sqlite3.Connection) -> None:
+    # কোন ইউজার কোন নম্বরে লগইন পয়েন্ট পেয়েছে; সেশন আর্কাইভ ও লেজার কমপ্যাক্ট হলেও এটি মোছা হয় না,
+    # তাই একই নম্বর আবার লিংক করে পয়েন্ট দ্বিতীয়বার পাওয়া যায় না
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS login_credits (
+        user_id INTEGER NOT NULL,
+        phone_number TEXT NOT NULL,
+        credited_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, phone_number)
+    ) WITHOUT ROWID""")
+    conn.execute("INSERT OR IGNORE INTO login_credits (user_id, phone_number) SELECT user_id, phone_number FROM sessions")
+    # ইতিমধ্যে আর্কাইভ হওয়া সেশনের হিসাব লেজারে এখনও থাকা 'login:<user_id>:<phone>' কী থেকে
+    conn.execute("""
+    INSERT OR IGNORE INTO login_credits (user_id, phone_number)
+    SELECT CAST(substr(rest, 1, instr(rest, ':') - 1) AS INTEGER), substr(rest, instr(rest, ':') + 1)
+    FROM (SELECT substr(idempotency_key, 7) AS rest FROM points_ledger WHERE idempotency_key LIKE 'login:%')
+    WHERE instr(rest, ':') > 0""")
+
+
+# ক্রমানুসারে মাইগ্রেশন; i-তম ধাপ চালানোর পর user_version = i + 1 হয়।
+# নতুন ধাপ সবসময় শেষে যোগ করুন, আগের ধাপ কখনো বদলাবেন না।
+MIGRATIONS = [
+    _m001_baseline,
+    _m002_hot_path_indexes,
+    _m003_points_ledger,
+    _m004_persistence,
+    _m005_pending_login_qr,
+    _m006_session_health,
+    _m007_stats_aggregates,
+    _m008_withdrawal_settled_at,
+    _m009_referrals,
+    _m010_login_queue,
+    _m011_login_credits,
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(path: str = DB_PATH) -> int:
+    """বাকি থাকা মাইগ্রেশনগুলো চালায় এবং চূড়ান্ত স্কিমা ভার্সন রিটার্ন করে।
+
+    প্রতিটি ধাপ ও তার user_version আপডেট একই BEGIN IMMEDIATE ট্রানজ্যাকশনে হয়,
+    তাই মাঝপথে ক্র্যাশ হলেও ডাটাবেজ আগের ভার্সনে থাকে।
+    """
+    conn = connect(path)
+    try:
+        version = schema_version(conn)
+        if version > len(MIGRATIONS):
+            raise RuntimeError(
+                f"Database {path} is at schema version {version}, newer than this code ({len(MIGRATIONS)})"
+            )
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            with transaction(conn, "IMMEDIATE"):
+                # অন্য প্রসেস এর মধ্যে মাইগ্রেট করে থাকলে আবার চালানো হয় না
+                if schema_version(conn) >= number:
+                    continue
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+            logger.info(f"Applied migration {number} ({step.__name__}) to {path}")
+        return schema_version(conn)
+    finally:
+        conn.close()
+
+
+def check_query_plans(conn: sqlite3.Connection) -> list:
+    """HOT_QUERIES এর EXPLAIN QUERY PLAN দেখে; ইনডেক্স ছাড়া SCAN করে এমন কুয়েরির তালিকা রিটার্ন করে"""
+    from repository import HOT_QUERIES
+
+    regressions = []
+    for name, sql in HOT_QUERIES.items():
+        params = (None,) * sql.count("?")
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[-1]
+            if detail.startswith("SCAN ") and "USING" not in detail:
+                regressions.append((name, detail))
+    return regressions
+
+
+if __name__ == "__main__":
+    # python migrations.py [--check-plans] [db_path]
+    # একই প্ল্যান যাচাই tests/test_query_plans.py তে প্রতি টেস্ট রানে চলে; এই ফ্ল্যাগ আসল ডাটাবেজ ফাইল দেখার জন্য
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    path = args[0] if args else DB_PATH
+    if "--check-plans" not in sys.argv:
+        print(f"{path}: schema version {apply_migrations(path)}")
+        sys.exit(0)
+
+    # প্ল্যান যাচাই একটি খালি ইন-মেমরি ডাটাবেজে হয়, আসল ডাটা বদলায় না
+    if args:
+        apply_migrations(path)
+        conn = connect(path)
+    else:
+        conn = connect(":memory:")
+        for step in MIGRATIONS:
+            step(conn)
+    regressions = check_query_plans(conn)
+    for name, detail in regressions:
+        print(f"FULL SCAN: {name}: {detail}")
+    print("All hot-path queries use an index" if not regressions else f"{len(regressions)} query plan regression(s)")
+    sys.exit(1 if regressions else 0)
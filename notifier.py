@@ -0,0 +1,78 @@
+import asyncio
+import logging
+
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+from broadcast import TokenBucket, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_RATE = 20  # নিজস্ব বাকেট হলে প্রতি সেকেন্ডে সর্বোচ্চ নোটিফিকেশন; বটে ব্রডকাস্টের বাকেটই শেয়ার হয়
+NOTIFY_QUEUE_SIZE = 10000
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_DRAIN_TIMEOUT = 10.0  # শাটডাউনে বাকি নোটিফিকেশন পাঠাতে সর্বোচ্চ এতক্ষণ অপেক্ষা
+
+
+class Notifier:
+    """ইউজারদের কাছে একক মেসেজ পাঠানোর রেট-লিমিটেড কিউ।
+
+    send() সাথে সাথে রিটার্ন করে; একটি ব্যাকগ্রাউন্ড টাস্ক TokenBucket মেনে মেসেজগুলো পাঠায়,
+    তাই বাল্ক অ্যাকশনের পর শত শত নোটিফিকেশনেও হ্যান্ডলার আটকে থাকে না বা ফ্লাড লিমিট লাগে না।
+    bucket দিলে (যেমন BroadcastEngine.bucket) সেই রেট ব্রডকাস্টের সাথে ভাগ হয়, RetryAfter এর বিরতিও দুজনেরই।
+    """
+
+    def __init__(self, rate: float = NOTIFY_RATE, bucket: TokenBucket = None):
+        self.bucket = bucket or TokenBucket(rate)
+        self._queue = asyncio.Queue(NOTIFY_QUEUE_SIZE)
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+
+    def start(self, bot) -> None:
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), NOTIFY_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self._queue.qsize()} undelivered notifications on shutdown")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def send(self, chat_id: int, text: str, **kwargs) -> None:
+        try:
+            self._queue.put_nowait((chat_id, text, kwargs))
+        except asyncio.QueueFull:
+            self.failed += 1
+            logger.error(f"Notification queue full, dropped message to {chat_id}")
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def _run(self, bot) -> None:
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            try:
+                await self._deliver(bot, chat_id, text, kwargs)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, bot, chat_id: int, text: str, kwargs) -> None:
+        for _ in range(NOTIFY_MAX_RETRIES):
+            await self.bucket.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                self.sent += 1
+                return
+            except RetryAfter as e:
+                self.bucket.pause(retry_after_seconds(e))
+            except (Forbidden, BadRequest):
+                break  # ইউজার বট ব্লক করেছে বা চ্যাট নেই
+            except TelegramError as e:
+                logger.warning(f"Notification to {chat_id} failed, retrying: {e}")
+                await asyncio.sleep(1)
+        self.failed += 1
+        logger.error(f"Could not notify {chat_id}")
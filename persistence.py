@@ -0,0 +1,118 @@
+import json
+import logging
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from db import DBExecutor
+from write_behind import WriteBehind
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_UPDATE_INTERVAL = 5  # সেকেন্ড; রিস্টার্টে সর্বোচ্চ এতক্ষণের স্টেট হারাতে পারে
+
+
+def _conversation_key(key) -> str:
+    return json.dumps(list(key))
+
+
+class SQLitePersistence(BasePersistence):
+    """ConversationHandler এর স্টেট ও user_data বটের SQLite ডাটাবেজে রাখে, যাতে রিস্টার্টে ও
+    একাধিক ওয়ার্কার প্রসেসে চলমান লগইন/উইথড্র কনভারসেশন হারিয়ে না যায়।
+
+    shard=(index, count) দিলে শুধু user_id % count == index ইউজারদের স্টেট লোড হয়;
+    আপডেট user_id অনুযায়ী ভাগ হয় বলে প্রতিটি ইউজারের স্টেটের মালিক একটিই ওয়ার্কার।
+    bot_data/chat_data/callback_data রাখা হয় না (bot_data তে সার্ভার অবজেক্ট থাকে)।
+    """
+
+    def __init__(self, executor: DBExecutor, write_behind: WriteBehind, shard=(0, 1),
+                 update_interval: float = PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = executor
+        self.write_behind = write_behind
+        self.shard_index, self.shard_count = shard
+
+    def _owns(self, user_id: int) -> bool:
+        return user_id % self.shard_count == self.shard_index
+
+    async def get_user_data(self) -> dict:
+        rows = await self.db.fetchall("SELECT user_id, data FROM persisted_user_data")
+        return {row[0]: json.loads(row[1]) for row in rows if self._owns(row[0])}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = await self.db.fetchall("SELECT key, state FROM persisted_conversations WHERE name = ?", (name,))
+        conversations = {}
+        for key, state in rows:
+            key = tuple(json.loads(key))
+            if self._owns(key[-1]):  # কী এর শেষ অংশ user_id (per_user=True)
+                conversations[key] = json.loads(state)
+        return conversations
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        def _write(conn):
+            if new_state is None:
+                conn.execute(
+                    "DELETE FROM persisted_conversations WHERE name = ? AND key = ?", (name, _conversation_key(key))
+                )
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO persisted_conversations (name, key, state) VALUES (?, ?, ?)",
+                    (name, _conversation_key(key), json.dumps(new_state))
+                )
+        await self.write_behind.submit(_write)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        try:
+            payload = json.dumps(data)
+        except TypeError as e:
+            logger.error(f"user_data for {user_id} is not JSON serialisable, not persisted: {e}")
+            return
+
+        def _write(conn):
+            if data:
+                conn.execute(
+                    "INSERT OR REPLACE INTO persisted_user_data (user_id, data) VALUES (?, ?)", (user_id, payload)
+                )
+            else:
+                conn.execute("DELETE FROM persisted_user_data WHERE user_id = ?", (user_id,))
+        await self.write_behind.submit(_write)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self.write_behind.submit(
+            lambda conn: conn.execute("DELETE FROM persisted_user_data WHERE user_id = ?", (user_id,))
+        )
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass  # মালিক ওয়ার্কার একটাই, তাই মেমরির কপিই সর্বশেষ
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self.write_behind.flush()
@@ -0,0 +1,181 @@
+"""ইউজার প্রোফাইলের LRU/TTL ক্যাশ।
+
+    python profile_cache.py --bench [taps]   # ঠান্ডা বনাম গরম ক্যাশে মেনু ট্যাপের প্রোফাইল পড়া, ও প্রতি এন্ট্রির মেমরি
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_SIZE = 10000  # সর্বোচ্চ কতজন ইউজারের প্রোফাইল মেমরিতে থাকবে
+PROFILE_CACHE_TTL = 300.0  # সেকেন্ড; বাইরে থেকে (যেমন হাতে SQL চালিয়ে) বদলানো ডাটাও এরপর রিফ্রেশ হয়
+
+
+class Profile:
+    """users সারির যে অংশ মেনুগুলো পড়ে, সাথে সক্রিয় সেশন সংখ্যা"""
+    __slots__ = ("points", "successful_sessions", "failed_sessions", "referral_code", "last_login",
+                 "referral_count", "active_sessions", "expires_at")
+
+    def __init__(self, points, successful_sessions, failed_sessions, referral_code, last_login, referral_count,
+                 active_sessions):
+        self.points = points
+        self.successful_sessions = successful_sessions
+        self.failed_sessions = failed_sessions
+        self.referral_code = referral_code
+        self.last_login = last_login
+        self.referral_count = referral_count
+        self.active_sessions = active_sessions
+        self.expires_at = 0.0
+
+
+class ProfileCache:
+    """user_id -> Profile এর LRU/TTL ক্যাশ।
+
+    প্রতিটি রাইটের পর adjust()/invalidate() ডাকতে হয়। রাইট চলাকালীন শুরু হওয়া রিড
+    (যার ডাটা পুরনো হতে পারে) store() এ বাতিল হয়ে যায়।
+    """
+
+    def __init__(self, max_entries: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None or entry.expires_at <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def write_token(self) -> int:
+        """DB থেকে পড়ার আগে নিন এবং store() এ ফেরত দিন"""
+        return self._writes
+
+    def store(self, user_id: int, profile: Profile, token: int) -> None:
+        if token != self._writes:
+            return  # পড়ার মাঝে কোনো রাইট হয়েছে; পরের রিড নতুন ডাটা আনবে
+        self.put(user_id, profile)
+
+    def put(self, user_id: int, profile: Profile) -> None:
+        profile.expires_at = time.monotonic() + self.ttl
+        self._entries[user_id] = profile
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def adjust(self, user_id: int, **deltas) -> None:
+        """write-through: ক্যাশে থাকলে সংখ্যাসূচক ফিল্ডগুলোতে deltas যোগ করে"""
+        self._writes += 1
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            for field, delta in deltas.items():
+                setattr(entry, field, getattr(entry, field) + delta)
+
+    def update(self, user_id: int, **values) -> None:
+        """write-through: ক্যাশে থাকলে ফিল্ডগুলো নতুন মান দিয়ে বদলায়"""
+        self._writes += 1
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            for field, value in values.items():
+                setattr(entry, field, value)
+
+    def invalidate(self, user_id: int = None) -> None:
+        """একজন ইউজারের (অথবা user_id না দিলে সবার) এন্ট্রি মুছে দেয়"""
+        self._writes += 1
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+BENCH_USERS = 10000
+BENCH_CONCURRENCY = 20
+
+
+async def _bench(taps: int) -> None:
+    from db import DBExecutor, connect
+    from loadtest import SEED_USER_ID, percentile, seed_users
+    from migrations import apply_migrations
+    from repository import Repository
+
+    print(f"{taps} menu taps (get_profile) over {BENCH_USERS} users, {BENCH_CONCURRENCY} at a time")
+    print(f"{'cache':<8}{'taps/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'hit rate':>10}")
+    with tempfile.TemporaryDirectory(prefix="profile-cache-bench-") as workdir:
+        path = os.path.join(workdir, "bench.db")
+        apply_migrations(path)
+        conn = connect(path)
+        seed_users(conn, BENCH_USERS, random.Random(1))
+        conn.close()
+        rng = random.Random(2)
+        user_ids = [SEED_USER_ID + rng.randrange(BENCH_USERS) for _ in range(taps)]
+        # cold: প্রতিটি ট্যাপ DB তে যায় (max_entries=0); warm: আগে একবার সবার প্রোফাইল পড়া
+        for name, cache in (("cold", ProfileCache(max_entries=0)), ("warm", ProfileCache())):
+            repo = Repository(DBExecutor(path), cache)
+            if name == "warm":
+                await asyncio.gather(*(repo.get_profile(SEED_USER_ID + i) for i in range(BENCH_USERS)))
+                cache.hits = cache.misses = 0
+            latencies = []
+
+            async def worker(ids):
+                for user_id in ids:
+                    start = time.perf_counter()
+                    await repo.get_profile(user_id)
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(user_ids[i::BENCH_CONCURRENCY]) for i in range(BENCH_CONCURRENCY)))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8}{taps / elapsed:>9.0f}{percentile(latencies, 0.50) * 1000:>9.3f}"
+                  f"{percentile(latencies, 0.99) * 1000:>9.3f}{cache.hit_rate:>10.2%}")
+            await repo.flush()
+            repo.close()
+
+    # __slots__ রেকর্ডের আকার; PROFILE_CACHE_SIZE পূর্ণ হলে মোট কত মেমরি
+    cache = ProfileCache()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(PROFILE_CACHE_SIZE):
+        cache.put(i, Profile(i, 1, 0, f"ref_{SEED_USER_ID + i}", "2024-01-01", 0, 1))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"full cache: {PROFILE_CACHE_SIZE} entries in {used / 2 ** 20:.1f} MiB ({used / PROFILE_CACHE_SIZE:.0f} B/entry)")
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    logging.basicConfig(level=logging.WARNING)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(_bench(int(args[0]) if args else 20000))
@@ -0,0 +1,676 @@
+import csv
+import time
+import logging
+from collections import namedtuple
+
+from db import DBExecutor, keyset_page, keyset_sql, transaction
+from profile_cache import Profile, ProfileCache
+from write_behind import WriteBehind
+
+logger = logging.getLogger(__name__)
+
+COUNT_CACHE_TTL = 30  # সেকেন্ড; অ্যাডমিন পেজের মোট সংখ্যা এতক্ষণ ক্যাশে থাকে
+LEDGER_RETENTION_DAYS = 30  # এর চেয়ে পুরনো লেজার এন্ট্রি স্ন্যাপশটে কম্প্যাক্ট হয় (idempotency কী এর মেয়াদও এটাই)
+LOGIN_HOLD_EWMA = 0.1  # নতুন মাপের ওজন
+STATS_HOURLY_RETENTION_DAYS = 14  # ঘণ্টাভিত্তিক রোলআপ এতদিন রাখা হয়; দৈনিক রোলআপ মোছা হয় না
+
+# rows: এই পেজের সারি; first_key/last_key: পরের/আগের পেজের কার্সর
+Page = namedtuple("Page", "rows has_prev has_next first_key last_key")
+
+# ট্রিগারে রাখা যোগফল (migration 7) থেকে, তাই টেবিল যত বড়ই হোক একটি সারি পড়া
+COUNT_QUERIES = {
+    "users": "SELECT value FROM stats_totals WHERE name = 'users'",
+    "sessions": "SELECT value FROM stats_totals WHERE name = 'sessions'",
+    "pending_withdrawals": "SELECT value FROM stats_totals WHERE name = 'withdrawals_pending'",
+}
+
+# stats_totals এর প্রতিটি মান পুরো টেবিল গুনে; শুধু audit_stats() এ ব্যবহার হয়
+STATS_RECOUNT_SQL = {
+    "users": "SELECT COUNT(*) FROM users",
+    "referrals": "SELECT COUNT(*) FROM users WHERE referred_by IS NOT NULL",
+    "logins_successful": "SELECT COALESCE(SUM(successful_sessions), 0) FROM users",
+    "logins_failed": "SELECT COALESCE(SUM(failed_sessions), 0) FROM users",
+    "sessions": "SELECT COUNT(*) FROM sessions",
+    "sessions_active": "SELECT COUNT(*) FROM sessions WHERE status = 'active'",
+    "withdrawals_pending": "SELECT COUNT(*) FROM withdrawals WHERE status = 'pending'",
+    "withdrawals_pending_bdt": "SELECT COALESCE(SUM(amount_bdt), 0) FROM withdrawals WHERE status = 'pending'",
+}
+
+# অ্যাডমিন পেজ: (SELECT, keyset কলাম, অতিরিক্ত WHERE)
+USERS_PAGE = ("SELECT user_id, username, points FROM users", "user_id", "")
+SESSIONS_PAGE = (
+    "SELECT s.session_id, s.phone_number, s.user_id, u.username FROM sessions s "
+    "LEFT JOIN users u ON u.user_id = s.user_id",
+    "s.session_id", ""
+)
+# SessionSweeper যে সেশনগুলো চেক করে; লগআউট হওয়া 'inactive' সেশন বাদ
+SWEEP_SESSIONS_PAGE = (
+    "SELECT session_id, phone_number, status, user_id FROM sessions", "session_id",
+    "status IN ('active', 'disconnected')"
+)
+PENDING_WITHDRAWALS_PAGE = (
+    "SELECT request_id, user_id, amount_bdt, payment_number FROM withdrawals", "request_id", "status = 'pending'"
+)
+
+PROFILE_SQL = """SELECT points, successful_sessions, failed_sessions, referral_code, last_login, referral_count,
+          (SELECT COUNT(*) FROM sessions s WHERE s.user_id = users.user_id AND s.status = 'active')
+   FROM users WHERE user_id = ?"""
+REFERRER_SQL = "SELECT user_id FROM users WHERE referral_code = ?"  # idx_users_referral_code
+ACTIVE_SESSIONS_SQL = """SELECT phone_number, created_at, server_status, last_checked_at
+   FROM sessions WHERE user_id = ? AND status = 'active'"""
+FAILED_SESSIONS_INCREMENT_SQL = "UPDATE users SET failed_sessions = failed_sessions + ? WHERE user_id = ?"
+USER_SESSION_EXISTS_SQL = "SELECT 1 FROM sessions WHERE user_id = ? AND phone_number = ?"
+LOGIN_CREDIT_SQL = "INSERT OR IGNORE INTO login_credits (user_id, phone_number) VALUES (?, ?)"
+DEACTIVATE_SESSION_SQL = (
+    "UPDATE sessions SET status = 'inactive', status_changed_at = CURRENT_TIMESTAMP WHERE phone_number = ?"
+)
+SET_SESSION_STATUS_SQL = """UPDATE sessions SET status = ?, status_changed_at = CURRENT_TIMESTAMP
+   WHERE phone_number = ? AND status != ? AND status IN ('active', 'disconnected') RETURNING user_id"""
+SESSION_CHECKED_SQL = (
+    "UPDATE sessions SET server_status = ?, last_checked_at = CURRENT_TIMESTAMP WHERE phone_number = ?"
+)
+PENDING_LOGINS_COUNT_SQL = "SELECT COUNT(*) FROM pending_logins"
+INSERT_PENDING_LOGIN_SQL = "INSERT OR REPLACE INTO pending_logins (phone_number, user_id) VALUES (?, ?)"
+LOGIN_QUEUE_POSITION_SQL = """SELECT COUNT(*) FROM login_queue
+   WHERE queue_id <= (SELECT queue_id FROM login_queue WHERE user_id = ?)"""
+HOLD_SECONDS_SQL = "(julianday('now') - julianday(created_at)) * 86400"
+SETTLE_WITHDRAWAL_SQL = """UPDATE withdrawals SET status = ?, settled_at = CURRENT_TIMESTAMP
+   WHERE request_id = ? AND status = 'pending' RETURNING request_id, user_id, amount_bdt, points_used"""
+# নির্দিষ্ট রেঞ্জের সব পেন্ডিং (ঐচ্ছিক সর্বোচ্চ পরিমাণসহ); idx_withdrawals_pending ব্যবহার করে
+SETTLE_PENDING_RANGE_SQL = """UPDATE withdrawals SET status = ?, settled_at = CURRENT_TIMESTAMP
+   WHERE status = 'pending' AND request_id BETWEEN ? AND ? AND amount_bdt <= ?
+   RETURNING request_id, user_id, amount_bdt, points_used"""
+WITHDRAWAL_EXPORT_COLUMNS = (
+    "request_id", "user_id", "amount_bdt", "points_used", "payment_number", "status", "requested_at", "settled_at"
+)
+WITHDRAWAL_EXPORT_CHUNK = 500
+STATS_ROLLUPS_SQL = "SELECT bucket, name, value FROM stats_rollups WHERE period = ? AND bucket >= ? ORDER BY bucket"
+RUNNING_BROADCASTS_SQL = "SELECT job_id FROM broadcast_jobs WHERE status = 'running' ORDER BY job_id"
+BROADCAST_RECIPIENTS_SQL = """SELECT u.user_id FROM users u
+               WHERE u.user_id > ?
+                 AND NOT EXISTS (SELECT 1 FROM broadcast_deliveries d WHERE d.job_id = ? AND d.user_id = u.user_id)
+               ORDER BY u.user_id LIMIT ?"""
+
+
+def post_points(conn, user_id: int, delta: int, reason: str, key: str = None) -> bool:
+    """চলমান ট্রানজ্যাকশনের ভেতরে লেজার এন্ট্রি যোগ করে users.points আপডেট করে।
+
+    একই key দিয়ে আগেই পোস্ট হয়ে থাকলে কিছু না করে False রিটার্ন করে। ডেবিট শর্তসাপেক্ষ:
+    ব্যালেন্স না থাকলে False রিটার্ন করে, কলারকে তখন ট্রানজ্যাকশন রোলব্যাক করতে হবে।
+    """
+    inserted = conn.execute(
+        "INSERT INTO points_ledger (user_id, delta, reason, idempotency_key) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (idempotency_key) DO NOTHING",
+        (user_id, delta, reason, key)
+    ).rowcount
+    if not inserted:
+        return False
+    return conn.execute(
+        "UPDATE users SET points = points + ? WHERE user_id = ? AND points + ? >= 0", (delta, user_id, delta)
+    ).rowcount == 1
+
+
+def _refund_declined(conn, settled: list, status: str) -> list:
+    if status != 'approved':
+        for request_id, user_id, _, points_used in settled:
+            post_points(conn, user_id, points_used, "withdrawal_refund", f"refund:{request_id}")
+    return settled
+
+
+def _record_login_hold(conn, seconds) -> None:
+    """পেন্ডিং লগইন কতক্ষণ জায়গা ধরে রেখেছিল তার EWMA; লগইন কিউর আনুমানিক অপেক্ষার সময় এটি থেকে"""
+    if seconds is not None:
+        conn.execute(
+            "INSERT INTO stats_totals (name, value) VALUES ('login_hold_seconds', ?) "
+            f"ON CONFLICT (name) DO UPDATE SET value = value + {LOGIN_HOLD_EWMA} * (excluded.value - value)",
+            (max(0.0, seconds),)
+        )
+
+
+def _set_statuses(conn, statuses: dict) -> list:
+    """শুধু যেগুলো সত্যিই বদলেছে: [(phone_number, user_id, নতুন status)]"""
+    changed = []
+    for phone, status in statuses.items():
+        row = conn.execute(SET_SESSION_STATUS_SQL, (status, phone, status)).fetchone()
+        if row:
+            changed.append((phone, row[0], status))
+    return changed
+
+
+class _InsufficientPoints(Exception):
+    pass
+
+
+def _page_queries(name: str, page) -> dict:
+    select, key, where = page
+    return {
+        f"{name}_next": keyset_sql(select, key, False, where),
+        f"{name}_prev": keyset_sql(select, key, True, where),
+    }
+
+
+# প্রতিটি আপডেটে চলে এমন কুয়েরি; `python migrations.py --check-plans` এগুলোর কোনোটি
+# ইনডেক্স ছাড়া ফুল স্ক্যান করলে ব্যর্থ হয়। নতুন হট কুয়েরি এখানে যোগ করুন।
+HOT_QUERIES = {
+    "profile": PROFILE_SQL,
+    "referrer": REFERRER_SQL,
+    "active_sessions": ACTIVE_SESSIONS_SQL,
+    "user_session_exists": USER_SESSION_EXISTS_SQL,
+    "deactivate_session": DEACTIVATE_SESSION_SQL,
+    "login_queue_position": LOGIN_QUEUE_POSITION_SQL,
+    "settle_withdrawal": SETTLE_WITHDRAWAL_SQL,
+    "settle_pending_range": SETTLE_PENDING_RANGE_SQL,
+    "running_broadcasts": RUNNING_BROADCASTS_SQL,
+    "stats_rollups": STATS_ROLLUPS_SQL,
+    "broadcast_recipients": BROADCAST_RECIPIENTS_SQL,
+    **_page_queries("users_page", USERS_PAGE),
+    **_page_queries("sessions_page", SESSIONS_PAGE),
+    **_page_queries("pending_withdrawals_page", PENDING_WITHDRAWALS_PAGE),
+}
+
+
+class Repository:
+    """বটের সব ডাটাবেজ অপারেশনের async API; কুয়েরি DBExecutor এর থ্রেডে চলে"""
+
+    def __init__(self, executor: DBExecutor, profiles: ProfileCache = None):
+        self.db = executor
+        self.profiles = profiles if profiles is not None else ProfileCache()  # খালি ক্যাশ falsy (__len__)
+        self.write_behind = WriteBehind(executor)
+        self._count_cache = {}
+
+    async def flush(self) -> None:
+        """জমে থাকা write-behind অপারেশন কমিট করে (শাটডাউনে close() এর আগে ডাকুন)"""
+        await self.write_behind.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    async def cached_count(self, name: str) -> int:
+        """COUNT_QUERIES এর একটি কাউন্ট, COUNT_CACHE_TTL সেকেন্ড ক্যাশ করা"""
+        cached = self._count_cache.get(name)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        row = await self.db.fetchone(COUNT_QUERIES[name])
+        self._count_cache[name] = (time.monotonic() + COUNT_CACHE_TTL, row[0])
+        return row[0]
+
+    async def _page(self, page, after: int, backward: bool, limit: int, params=()):
+        select, key, where = page
+        rows, has_more = await self.db.read(keyset_page, select, key, after, backward, limit, where, params)
+        if backward:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = after > 0, has_more
+        first_key = rows[0][0] if rows else after
+        last_key = rows[-1][0] if rows else after
+        return Page(rows, has_prev, has_next, first_key, last_key)
+
+    # --- Users ---
+    async def get_profile(self, user_id: int):
+        """ক্যাশ করা Profile (সক্রিয় সেশন সংখ্যাসহ); ইউজার না থাকলে None"""
+        profile = self.profiles.get(user_id)
+        if profile is not None:
+            return profile
+        token = self.profiles.write_token()
+        row = await self.db.fetchone(PROFILE_SQL, (user_id,))
+        if row is None:
+            return None
+        profile = Profile(*row)
+        self.profiles.store(user_id, profile, token)
+        return profile
+
+    async def create_user(self, user_id: int, username: str, referral_code: str, today, points: int,
+                          referred_by_code: str = None, referral_points: int = 0):
+        """নতুন ইউজার তৈরি করে সাইনআপ বোনাস দেয়; (created, referrer_id) রিটার্ন করে।
+
+        referred_by_code কোনো ইউজারের রেফার কোড হলে একই ট্রানজ্যাকশনে referred_by লেখা হয় ও
+        রেফারার referral_points পায়। শুধু নতুন ইউজারই রেফার হতে পারে এবং নিজের কোড চলে না,
+        তাই একজনের জন্য রেফারেল একবারই; না হলে referrer_id None।
+        """
+        def _write(conn):
+            with transaction(conn, "IMMEDIATE"):
+                referrer = None
+                if referred_by_code:
+                    row = conn.execute(REFERRER_SQL, (referred_by_code,)).fetchone()
+                    referrer = row[0] if row and row[0] != user_id else None
+                created = conn.execute(
+                    "INSERT OR IGNORE INTO users (user_id, username, referral_code, referred_by, last_login, "
+                    "login_streak) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, username, referral_code, referrer, today, 1)
+                ).rowcount
+                if not created:
+                    return False, None
+                post_points(conn, user_id, points, "signup", f"signup:{user_id}")
+                if referrer is not None:
+                    post_points(conn, referrer, referral_points, "referral", f"referral:{user_id}")
+                return True, referrer
+        created, referrer = await self.db.write(_write)
+        self.profiles.invalidate(user_id)
+        if referrer is not None:
+            self.profiles.adjust(referrer, points=referral_points, referral_count=1)
+        return created, referrer
+
+    async def claim_daily_bonus(self, user_id: int, today, points: int) -> bool:
+        """আজকের বোনাস দেয়; একই দিনে আগেই দেওয়া হয়ে থাকলে (যেমন দ্রুত দুবার /start) False"""
+        def _write(conn):
+            # write-behind ব্যাচের ট্রানজ্যাকশনের ভেতরে চলে
+            if not post_points(conn, user_id, points, "daily_bonus", f"daily:{user_id}:{today.isoformat()}"):
+                return False
+            conn.execute("UPDATE users SET last_login = ? WHERE user_id = ?", (today, user_id))
+            return True
+        credited = await self.write_behind.submit(_write)
+        if credited:
+            self.profiles.adjust(user_id, points=points)
+            self.profiles.update(user_id, last_login=today.isoformat())
+        return credited
+
+    async def get_points(self, user_id: int) -> int:
+        return (await self.get_profile(user_id)).points
+
+    async def get_referral_code(self, user_id: int) -> str:
+        return (await self.get_profile(user_id)).referral_code
+
+    async def page_users(self, after: int, backward: bool, limit: int) -> Page:
+        return await self._page(USERS_PAGE, after, backward, limit)
+
+    # --- Sessions ---
+    async def record_login(self, user_id: int, phone_number: str, points: int) -> bool:
+        """নতুন সেশন সেভ করে এবং এই নম্বরে আগে কখনো না পেলে পয়েন্ট যোগ করে; পয়েন্ট যোগ হলে True রিটার্ন করে
+
+        সেশন আর্কাইভ হওয়ার পর একই নম্বর আবার লিংক করলে সেশন সারি নতুন করে তৈরি হয়,
+        কিন্তু login_credits এ আগের সারি থাকায় পয়েন্ট দ্বিতীয়বার দেওয়া হয় না।
+        """
+        def _write(conn):
+            # আগে পড়ে পরে লেখে: DEFERRED হলে অন্য প্রসেসের কমিটের পর আপগ্রেড সাথে সাথে "database is locked" দেয়
+            with transaction(conn, "IMMEDIATE"):
+                exists = conn.execute(USER_SESSION_EXISTS_SQL, (user_id, phone_number)).fetchone()
+                if exists:
+                    return False, False
+                conn.execute(
+                    "INSERT INTO sessions (user_id, phone_number, session_data) VALUES (?, ?, ?)",
+                    (user_id, phone_number, 'Baileys Managed')
+                )
+                conn.execute(
+                    "UPDATE users SET successful_sessions = successful_sessions + 1 WHERE user_id = ?", (user_id,)
+                )
+                first_time = conn.execute(LOGIN_CREDIT_SQL, (user_id, phone_number)).rowcount == 1
+                credited = first_time and post_points(conn, user_id, points, "login", f"login:{user_id}:{phone_number}")
+            return True, credited
+        inserted, credited = await self.db.write(_write)
+        if inserted:
+            self.profiles.adjust(user_id, points=points if credited else 0, successful_sessions=1, active_sessions=1)
+        return credited
+
+    async def enqueue_login(self, user_id: int, phone_number: str, capacity: int) -> int:
+        """পেন্ডিং লগইন `capacity` এর কম ও কিউ খালি হলে সাথে সাথে pending_logins এ তুলে 0 রিটার্ন করে;
+        নাহলে কিউর শেষে রাখে (আগেই কিউতে থাকলে জায়গা একই থাকে, নম্বর বদলায়) এবং কিউতে অবস্থান (1..) রিটার্ন করে
+        """
+        def _write(conn):
+            with transaction(conn, "IMMEDIATE"):  # সব ওয়ার্কার প্রসেস একই সীমা মানে
+                queued = conn.execute(
+                    "UPDATE login_queue SET phone_number = ? WHERE user_id = ?", (phone_number, user_id)
+                ).rowcount
+                if not queued:
+                    waiting = conn.execute("SELECT 1 FROM login_queue LIMIT 1").fetchone()
+                    if not waiting and conn.execute(PENDING_LOGINS_COUNT_SQL).fetchone()[0] < capacity:
+                        conn.execute(INSERT_PENDING_LOGIN_SQL, (phone_number, user_id))
+                        return 0
+                    conn.execute(
+                        "INSERT INTO login_queue (user_id, phone_number) VALUES (?, ?)", (user_id, phone_number)
+                    )
+                return conn.execute(LOGIN_QUEUE_POSITION_SQL, (user_id,)).fetchone()[0]
+        return await self.db.write(_write)
+
+    async def admit_queued_logins(self, capacity: int) -> list:
+        """খালি জায়গা অনুযায়ী কিউর শুরু থেকে ইউজারদের pending_logins এ তোলে; [(user_id, phone_number)]"""
+        def _write(conn):
+            with transaction(conn, "IMMEDIATE"):
+                free = capacity - conn.execute(PENDING_LOGINS_COUNT_SQL).fetchone()[0]
+                if free <= 0:
+                    return []
+                rows = conn.execute(
+                    "SELECT queue_id, user_id, phone_number FROM login_queue ORDER BY queue_id LIMIT ?", (free,)
+                ).fetchall()
+                for _, user_id, phone_number in rows:
+                    conn.execute(INSERT_PENDING_LOGIN_SQL, (phone_number, user_id))
+                if rows:
+                    conn.execute("DELETE FROM login_queue WHERE queue_id <= ?", (rows[-1][0],))
+                return [(user_id, phone_number) for _, user_id, phone_number in rows]
+        return await self.db.write(_write)
+
+    async def login_queue_position(self, user_id: int) -> int:
+        """কিউতে ইউজারের অবস্থান (1..); কিউতে না থাকলে 0"""
+        return (await self.db.fetchone(LOGIN_QUEUE_POSITION_SQL, (user_id,)))[0]
+
+    async def leave_login_queue(self, user_id: int) -> bool:
+        return await self.db.execute("DELETE FROM login_queue WHERE user_id = ?", (user_id,)) > 0
+
+    async def login_load(self):
+        """(পেন্ডিং লগইন, কিউতে অপেক্ষমাণ, গড়ে একটি পেন্ডিং লগইন কত সেকেন্ড জায়গা ধরে রাখে বা None)"""
+        return await self.db.fetchone(
+            f"""SELECT ({PENDING_LOGINS_COUNT_SQL}), (SELECT COUNT(*) FROM login_queue),
+                       (SELECT value FROM stats_totals WHERE name = 'login_hold_seconds')"""
+        )
+
+    async def expire_pending_logins(self, max_age: float) -> list:
+        """max_age সেকেন্ডের বেশি পুরনো পেন্ডিং লগইন মুছে [(phone_number, user_id)] রিটার্ন করে"""
+        def _write(conn):
+            with transaction(conn):
+                rows = conn.execute(
+                    f"""DELETE FROM pending_logins WHERE created_at IS NULL OR created_at < datetime('now', ?)
+                        RETURNING phone_number, user_id, {HOLD_SECONDS_SQL}""",
+                    (f"-{max_age} seconds",)
+                ).fetchall()
+                for _, _, held in rows:
+                    _record_login_hold(conn, held)
+                return [(phone_number, user_id) for phone_number, user_id, _ in rows]
+        return await self.db.write(_write)
+
+    async def get_user_login(self, user_id: int):
+        """ইউজারের চলমান লগইনের নম্বর (কিউতে বা QR এর অপেক্ষায়, নতুনটি আগে); না থাকলে None।
+
+        user_data নয়, ডাটাবেজ থেকে; তাই অন্য ওয়ার্কারে ('open' ইভেন্ট, মেয়াদ শেষের জব) লগইন শেষ হলেও পুরনো থাকে না।
+        """
+        def _read(conn):
+            row = conn.execute("SELECT phone_number FROM login_queue WHERE user_id = ?", (user_id,)).fetchone()
+            # pending_logins এ সর্বোচ্চ LOGIN_MAX_PENDING সারি, তাই user_id এ ইনডেক্স লাগে না
+            row = row or conn.execute(
+                "SELECT phone_number FROM pending_logins WHERE user_id = ? ORDER BY rowid DESC LIMIT 1", (user_id,)
+            ).fetchone()
+            return row[0] if row else None
+        return await self.db.read(_read)
+
+    async def get_pending_login(self, phone_number: str):
+        return await self.db.fetchone(
+            "SELECT user_id, qr_message_id, qr_etag FROM pending_logins WHERE phone_number = ?", (phone_number,)
+        )
+
+    async def set_pending_login_qr(self, phone_number: str, message_id: int, etag: str) -> None:
+        await self.db.execute(
+            "UPDATE pending_logins SET qr_message_id = ?, qr_etag = ? WHERE phone_number = ?",
+            (message_id, etag, phone_number)
+        )
+
+    async def pop_pending_login(self, phone_number: str):
+        """পেন্ডিং লগইন মুছে তার user_id রিটার্ন করে; না থাকলে None"""
+        def _write(conn):
+            with transaction(conn):
+                row = conn.execute(
+                    f"DELETE FROM pending_logins WHERE phone_number = ? RETURNING user_id, {HOLD_SECONDS_SQL}",
+                    (phone_number,)
+                ).fetchone()
+                if row is None:
+                    return None
+                _record_login_hold(conn, row[1])
+                return row[0]
+        return await self.db.write(_write)
+
+    async def record_failed_login(self, user_id: int) -> None:
+        """কাউন্টারটি write-behind এ জমা হয়; কমিটের জন্য অপেক্ষা করে না"""
+        self.write_behind.increment(
+            FAILED_SESSIONS_INCREMENT_SQL, user_id,
+            on_commit=lambda: self.profiles.adjust(user_id, failed_sessions=1)
+        )
+
+    async def list_active_sessions(self, user_id: int):
+        return await self.db.fetchall(ACTIVE_SESSIONS_SQL, (user_id,))
+
+    async def page_sessions(self, after: int, backward: bool, limit: int) -> Page:
+        """সেশনের পেজ, মালিকের username সহ (একটি JOIN কুয়েরি, প্রতি সারিতে আলাদা লুকআপ নয়)"""
+        return await self._page(SESSIONS_PAGE, after, backward, limit)
+
+    async def page_sessions_to_sweep(self, after: int, limit: int) -> Page:
+        return await self._page(SWEEP_SESSIONS_PAGE, after, False, limit)
+
+    async def get_session_status(self, phone_number: str):
+        """(status, server_status, last_checked_at, status_changed_at); সেশন না থাকলে None"""
+        return await self.db.fetchone(
+            "SELECT status, server_status, last_checked_at, status_changed_at FROM sessions WHERE phone_number = ?",
+            (phone_number,)
+        )
+
+    async def record_session_checks(self, checks) -> list:
+        """checks: [(phone_number, server_status, নতুন status অথবা None)], একটি ট্রানজ্যাকশনে।
+
+        'active' থেকে 'disconnected' হওয়া সেশনগুলো [(phone_number, user_id)] হিসেবে রিটার্ন করে।
+        """
+        def _write(conn):
+            with transaction(conn):
+                conn.executemany(SESSION_CHECKED_SQL, [(server_status, phone) for phone, server_status, _ in checks])
+                return _set_statuses(conn, {phone: status for phone, _, status in checks if status})
+        if not checks:
+            return []
+        return self._session_status_changed(await self.db.write(_write))
+
+    async def set_session_statuses(self, statuses: dict) -> list:
+        """{phone_number: 'active' | 'disconnected'}; রিটার্ন record_session_checks এর মতো"""
+        def _write(conn):
+            with transaction(conn):
+                return _set_statuses(conn, statuses)
+        if not statuses:
+            return []
+        return self._session_status_changed(await self.db.write(_write))
+
+    def _session_status_changed(self, changed) -> list:
+        for _, user_id, _ in changed:
+            self.profiles.invalidate(user_id)
+        return [(phone, user_id) for phone, user_id, status in changed if status == "disconnected"]
+
+    async def deactivate_session(self, phone_number: str) -> None:
+        def _write(conn):
+            # আগে পড়ে পরে লেখে; অন্য প্রসেস মাঝখানে সারিটি বদলাতে না পারে
+            with transaction(conn, "IMMEDIATE"):
+                row = conn.execute("SELECT user_id FROM sessions WHERE phone_number = ?", (phone_number,)).fetchone()
+                conn.execute(DEACTIVATE_SESSION_SQL, (phone_number,))
+            return row[0] if row else None
+        user_id = await self.db.write(_write)
+        if user_id is not None:
+            self.profiles.invalidate(user_id)
+
+    # --- Withdrawals ---
+    async def create_withdrawal(self, user_id: int, amount_bdt: float, points: int, payment_number: str):
+        """রিকুয়েস্ট সেভ করে পয়েন্ট কাটে; ব্যালেন্স যথেষ্ট না থাকলে কিছু না করে None রিটার্ন করে।
+
+        ব্যালেন্স চেক ও কাটা একই BEGIN IMMEDIATE ট্রানজ্যাকশনে, তাই একসাথে কয়েকটি ট্যাপেও ওভারড্র হয় না।
+        """
+        def _write(conn):
+            try:
+                with transaction(conn, "IMMEDIATE"):
+                    request_id = conn.execute(
+                        "INSERT INTO withdrawals (user_id, amount_bdt, points_used, payment_number) VALUES (?, ?, ?, ?)",
+                        (user_id, amount_bdt, points, payment_number)
+                    ).lastrowid
+                    if not post_points(conn, user_id, -points, "withdrawal", f"withdraw:{request_id}"):
+                        raise _InsufficientPoints()
+                    return request_id
+            except _InsufficientPoints:
+                return None
+        request_id = await self.db.write(_write)
+        if request_id is None:
+            self.profiles.invalidate(user_id)  # ক্যাশের ব্যালেন্স পুরনো ছিল
+        else:
+            self.profiles.adjust(user_id, points=-points)
+        return request_id
+
+    async def page_pending_withdrawals(self, after: int, backward: bool, limit: int) -> Page:
+        return await self._page(PENDING_WITHDRAWALS_PAGE, after, backward, limit)
+
+    async def settle_withdrawals(self, request_ids, status: str) -> list:
+        """রিকুয়েস্টগুলো একটি ট্রানজ্যাকশনে নিষ্পত্তি করে (declined হলে পয়েন্ট ফেরত দেয়)।
+
+        সত্যিই নিষ্পত্তি হওয়াগুলোর [(request_id, user_id, amount_bdt, points_used)] রিটার্ন করে;
+        আগেই নিষ্পত্তি হয়ে থাকা রিকুয়েস্ট বাদ যায়।
+        """
+        def _write(conn):
+            with transaction(conn, "IMMEDIATE"):
+                rows = [conn.execute(SETTLE_WITHDRAWAL_SQL, (status, request_id)).fetchone() for request_id in request_ids]
+                return _refund_declined(conn, [tuple(row) for row in rows if row], status)
+        return self._settled(await self.db.write(_write), status)
+
+    async def settle_pending_range(self, status: str, first_id: int, last_id: int,
+                                   max_amount: float = float("inf")) -> list:
+        """first_id..last_id এর সব পেন্ডিং রিকুয়েস্ট (amount_bdt <= max_amount) একটি স্টেটমেন্টে; রিটার্ন উপরের মতো"""
+        def _write(conn):
+            with transaction(conn, "IMMEDIATE"):
+                rows = conn.execute(SETTLE_PENDING_RANGE_SQL, (status, first_id, last_id, max_amount)).fetchall()
+                return _refund_declined(conn, [tuple(row) for row in rows], status)
+        return self._settled(await self.db.write(_write), status)
+
+    def _settled(self, settled, status: str) -> list:
+        if status != 'approved':
+            for _, user_id, _, points_used in settled:
+                self.profiles.adjust(user_id, points=points_used)
+        return settled
+
+    async def summarize_pending_withdrawals(self, max_amount: float = float("inf")):
+        """(সংখ্যা, মোট BDT, সর্বোচ্চ request_id); বাল্ক অনুমোদনের আগে অ্যাডমিনকে দেখানোর জন্য"""
+        return tuple(await self.db.fetchone(
+            "SELECT COUNT(*), COALESCE(SUM(amount_bdt), 0), COALESCE(MAX(request_id), 0) FROM withdrawals "
+            "WHERE status = 'pending' AND amount_bdt <= ?",
+            (max_amount,)
+        ))
+
+    async def export_withdrawals(self, out, status: str = "pending", since: str = None) -> int:
+        """status এর রিকুয়েস্টগুলো CSV হিসেবে `out` (টেক্সট ফাইল) এ লেখে; কতগুলো সারি লেখা হলো রিটার্ন করে।
+
+        কার্সর থেকে WITHDRAWAL_EXPORT_CHUNK সারি করে পড়ে সরাসরি লেখে, পুরো তালিকা মেমরিতে আসে না।
+        since দিলে শুধু ওই সময়ের পরে নিষ্পত্তি (পেন্ডিং হলে রিকুয়েস্ট) হওয়াগুলো।
+        """
+        column = "requested_at" if status == "pending" else "settled_at"
+        sql = f"SELECT {', '.join(WITHDRAWAL_EXPORT_COLUMNS)} FROM withdrawals WHERE status = ?"
+        params = [status]
+        if since:
+            sql += f" AND {column} >= ?"
+            params.append(since)
+        sql += " ORDER BY request_id"
+
+        def _read(conn):
+            writer = csv.writer(out)
+            writer.writerow(WITHDRAWAL_EXPORT_COLUMNS)
+            cursor = conn.execute(sql, params)
+            count = 0
+            while rows := cursor.fetchmany(WITHDRAWAL_EXPORT_CHUNK):
+                writer.writerows(rows)
+                count += len(rows)
+            return count
+        return await self.db.read(_read)
+
+    # --- Points ledger ---
+    async def compact_points_ledger(self, retention_days: int = LEDGER_RETENTION_DAYS) -> int:
+        """retention_days এর পুরনো এন্ট্রিগুলো ইউজারভিত্তিক স্ন্যাপশটে যোগ করে মুছে দেয়; কতগুলো মুছল রিটার্ন করে"""
+        def _write(conn):
+            with transaction(conn, "IMMEDIATE"):
+                cutoff = conn.execute(
+                    "SELECT MAX(entry_id) FROM points_ledger WHERE created_at < datetime('now', ?)",
+                    (f"-{retention_days} days",)
+                ).fetchone()[0]
+                if cutoff is None:
+                    return 0
+                conn.execute(
+                    """INSERT INTO points_snapshots (user_id, balance, last_entry_id)
+                       SELECT user_id, SUM(delta), MAX(entry_id) FROM points_ledger WHERE entry_id <= ? GROUP BY user_id
+                       ON CONFLICT (user_id) DO UPDATE SET balance = balance + excluded.balance,
+                           last_entry_id = excluded.last_entry_id, taken_at = CURRENT_TIMESTAMP""",
+                    (cutoff,)
+                )
+                return conn.execute("DELETE FROM points_ledger WHERE entry_id <= ?", (cutoff,)).rowcount
+        return await self.db.write(_write)
+
+    async def audit_points(self):
+        """users.points যাদের ক্ষেত্রে স্ন্যাপশট + লেজারের যোগফলের সাথে মেলে না তাদের user_id"""
+        rows = await self.db.fetchall(
+            """SELECT u.user_id FROM users u
+               LEFT JOIN points_snapshots s ON s.user_id = u.user_id
+               WHERE u.points != COALESCE(s.balance, 0)
+                   + COALESCE((SELECT SUM(delta) FROM points_ledger l WHERE l.user_id = u.user_id), 0)"""
+        )
+        return [row[0] for row in rows]
+
+    async def audit_referrals(self):
+        """users.referral_count যাদের ক্ষেত্রে referred_by গোনার সাথে মেলে না তাদের user_id"""
+        rows = await self.db.fetchall(
+            """SELECT u.user_id FROM users u
+               LEFT JOIN (SELECT referred_by, COUNT(*) AS n FROM users
+                          WHERE referred_by IS NOT NULL GROUP BY referred_by) r ON r.referred_by = u.user_id
+               WHERE u.referral_count != COALESCE(r.n, 0)"""
+        )
+        return [row[0] for row in rows]
+
+    # --- Stats ---
+    async def get_stats(self) -> dict:
+        """ড্যাশবোর্ডের সব যোগফল {name: value}; stats_totals এর কয়েকটি সারি মাত্র"""
+        return dict(await self.db.fetchall("SELECT name, value FROM stats_totals"))
+
+    async def get_rollups(self, period: str, since: str) -> dict:
+        """{bucket: {name: value}}; period 'hour' অথবা 'day', since একই ফরম্যাটের বাকেট"""
+        rollups = {}
+        for bucket, name, value in await self.db.fetchall(STATS_ROLLUPS_SQL, (period, since)):
+            rollups.setdefault(bucket, {})[name] = value
+        return rollups
+
+    async def prune_stats_rollups(self, retention_days: int = STATS_HOURLY_RETENTION_DAYS) -> int:
+        return await self.db.execute(
+            "DELETE FROM stats_rollups WHERE period = 'hour' AND bucket < strftime('%Y-%m-%d %H:00', 'now', ?)",
+            (f"-{retention_days} days",)
+        )
+
+    async def audit_stats(self) -> dict:
+        """stats_totals এর যে মানগুলো পুরো টেবিল গোনার সাথে মেলে না: {name: (stored, actual)}"""
+        def _read(conn):
+            with transaction(conn):  # সব গণনা একই স্ন্যাপশটে
+                stored = dict(conn.execute("SELECT name, value FROM stats_totals").fetchall())
+                actual = {name: conn.execute(sql).fetchone()[0] for name, sql in STATS_RECOUNT_SQL.items()}
+            return {
+                name: (stored.get(name), value) for name, value in actual.items()
+                if abs((stored.get(name) or 0) - value) > 1e-6
+            }
+        return await self.db.read(_read)
+
+    # --- Broadcasts ---
+    async def create_broadcast_job(self, text: str, admin_chat_id: int) -> int:
+        def _write(conn):
+            total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            return conn.execute(
+                "INSERT INTO broadcast_jobs (text, admin_chat_id, total) VALUES (?, ?, ?)",
+                (text, admin_chat_id, total)
+            ).lastrowid
+        return await self.db.write(_write)
+
+    async def set_broadcast_progress_message(self, job_id: int, message_id: int) -> None:
+        await self.db.execute(
+            "UPDATE broadcast_jobs SET progress_message_id = ? WHERE job_id = ?", (message_id, job_id)
+        )
+
+    async def get_broadcast_job(self, job_id: int):
+        return await self.db.fetchone("SELECT * FROM broadcast_jobs WHERE job_id = ?", (job_id,))
+
+    async def list_running_broadcasts(self):
+        rows = await self.db.fetchall(RUNNING_BROADCASTS_SQL)
+        return [row[0] for row in rows]
+
+    async def fetch_broadcast_recipients(self, job_id: int, after_user_id: int, limit: int):
+        """keyset পেজিনেশন: after_user_id এর পরের যেসব ইউজারকে এই জবে এখনও পাঠানো হয়নি"""
+        rows = await self.db.fetchall(BROADCAST_RECIPIENTS_SQL, (after_user_id, job_id, limit))
+        return [row[0] for row in rows]
+
+    async def record_broadcast_batch(self, job_id: int, results, last_user_id: int) -> None:
+        """results: [(user_id, (status, error)), ...] — ডেলিভারি স্টেট ও কার্সর একই ট্রানজ্যাকশনে সেভ হয়"""
+        rows = [(job_id, user_id, status, error) for user_id, (status, error) in results]
+        sent = sum(1 for row in rows if row[2] == "sent")
+        def _write(conn):
+            with transaction(conn):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO broadcast_deliveries (job_id, user_id, status, error) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                conn.execute(
+                    "UPDATE broadcast_jobs SET sent = sent + ?, failed = failed + ?, last_user_id = ? WHERE job_id = ?",
+                    (sent, len(rows) - sent, last_user_id, job_id)
+                )
+        await self.db.write(_write)
+
+    async def finish_broadcast(self, job_id: int, status: str = "done") -> None:
+        """status 'done' অথবা 'failed'; দুটোর কোনোটিই রিস্টার্টে resume হয় না"""
+        await self.db.execute(
+            "UPDATE broadcast_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE job_id = ?", (status, job_id)
+        )
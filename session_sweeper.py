@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+
+from telegram.constants import ParseMode
+
+from notifier import Notifier
+
+logger = logging.getLogger(__name__)
+
+SWEEP_CHUNK_SIZE = 200  # প্রতি ব্যাচ স্ট্যাটাস রিকুয়েস্টে কতগুলো নম্বর
+SWEEP_CONCURRENCY = 4  # একসাথে কতগুলো ব্যাচ রিকুয়েস্ট চলে
+SWEEP_RATE = 20.0  # গড়ে প্রতি সেকেন্ডে কতগুলো সেশন চেক হবে; টেবিল বড় হলে সুইপের বিরতি বাড়ে
+SWEEP_MIN_INTERVAL = 60.0  # সেকেন্ড
+SWEEP_MAX_INTERVAL = 60 * 60.0
+
+# সার্ভারের স্ট্যাটাস -> sessions.status। restoring/reconnecting/pending_qr অস্থায়ী, তাই status বদলায় না।
+# not_found কেও 'disconnected' ধরা হয় (পুরনো সার্ভার রিস্টার্টের পর সব সেশনকে not_found বলে), পরে ফিরলে আবার 'active'
+# hibernated: মেমরি বাঁচাতে সকেট বন্ধ, কিন্তু creds ঠিক আছে এবং চাইলেই জেগে ওঠে, তাই সেশনটি সক্রিয়
+SESSION_STATUS_FOR = {
+    "authenticated": "active",
+    "hibernated": "active",
+    "failed": "disconnected",
+    "not_found": "disconnected",
+}
+
+DROP_NOTICE = "⚠️ আপনার WhatsApp সেশন `{phone}` এর সংযোগ বিচ্ছিন্ন হয়েছে। সেশনটি চালু রাখতে আবার লগইন করুন।"
+
+
+def sweep_interval(total: int, rate: float = SWEEP_RATE) -> float:
+    """পুরো টেবিল গড়ে `rate` সেশন/সেকেন্ডে ঘুরে আসে এমন বিরতি, সীমার মধ্যে"""
+    return min(SWEEP_MAX_INTERVAL, max(SWEEP_MIN_INTERVAL, total / rate))
+
+
+class SessionSweeper:
+    """সব সেশনের স্ট্যাটাস পর্যায়ক্রমে WhatsApp API সার্ভার থেকে চেক করে ডাটাবেজে লেখে।
+
+    ইউজার ও অ্যাডমিনের স্ক্রিন sessions.server_status/last_checked_at পড়ে, API এর জন্য অপেক্ষা করে না।
+    সক্রিয় সেশন বিচ্ছিন্ন হলে মালিককে জানায়।
+    """
+
+    def __init__(self, repo, notifier: Notifier, chunk_size: int = SWEEP_CHUNK_SIZE,
+                 concurrency: int = SWEEP_CONCURRENCY):
+        self.repo = repo
+        self.notifier = notifier
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.last_sweep = None  # (checked, changed, seconds)
+
+    async def sweep(self, wa_client) -> int:
+        """একবার পুরো টেবিল ঘুরে আসে; কতগুলো সেশন চেক হলো তা রিটার্ন করে"""
+        start = time.monotonic()
+        after, checked, changed = 0, 0, 0
+        while True:
+            # একসাথে `concurrency` টি চাংক: পেজগুলো ধারাবাহিক keyset রিড, স্ট্যাটাস কল সমান্তরাল
+            chunks = []
+            for _ in range(self.concurrency):
+                page = await self.repo.page_sessions_to_sweep(after, self.chunk_size)
+                if page.rows:
+                    chunks.append(page.rows)
+                    after = page.last_key
+                if not page.has_next:
+                    break
+            if not chunks:
+                break
+            results = await asyncio.gather(*(self._check(wa_client, rows) for rows in chunks))
+            checks = [check for result in results for check in result]
+            drops = await self.repo.record_session_checks(checks)
+            self.notify_drops(drops)
+            checked += sum(len(rows) for rows in chunks)
+            changed += sum(1 for _, _, status in checks if status)
+            if not page.has_next:
+                break
+        self.last_sweep = (checked, changed, time.monotonic() - start)
+        logger.info(f"Session sweep: {checked} checked, {changed} changed status in {self.last_sweep[2]:.1f}s")
+        return checked
+
+    async def _check(self, wa_client, rows):
+        """[(phone, server_status, নতুন status অথবা None)]; API ত্রুটির সারি বাদ যায়"""
+        statuses = await wa_client.get_statuses([row[1] for row in rows], use_cache=False)
+        checks = []
+        for _, phone_number, current, _ in rows:
+            server_status = statuses.get(phone_number, "error")
+            if server_status == "error":
+                continue
+            target = SESSION_STATUS_FOR.get(server_status)
+            checks.append((phone_number, server_status, target if target != current else None))
+        return checks
+
+    def notify_drops(self, drops) -> None:
+        """drops: [(phone_number, user_id)] যেগুলো 'active' থেকে 'disconnected' হয়েছে"""
+        for phone_number, user_id in drops:
+            if user_id is not None:
+                self.notifier.send(user_id, DROP_NOTICE.format(phone=phone_number), parse_mode=ParseMode.MARKDOWN)
@@ -0,0 +1,105 @@
+import hmac
+import asyncio
+import logging
+
+import httpx
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+SHARD_QUEUE_SIZE = 10000  # প্রতি ওয়ার্কারের জন্য রাউটারে সর্বোচ্চ জমে থাকা আপডেট
+SHARD_FORWARD_RETRIES = 5
+
+# আপডেটের যে অংশে প্রেরকের তথ্য থাকে (Update এর ফিল্ডের নাম)
+_SENDER_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def shard_key(update: dict) -> int:
+    """আপডেটের user_id (না থাকলে chat_id, তাও না থাকলে 0)"""
+    for field in _SENDER_FIELDS:
+        payload = update.get(field)
+        if not payload:
+            continue
+        sender = payload.get("from") or {}
+        if "id" in sender:
+            return sender["id"]
+        chat = payload.get("chat") or {}
+        if "id" in chat:
+            return chat["id"]
+    return 0
+
+
+class UpdateRouter:
+    """Telegram webhook গ্রহণ করে user_id % workers অনুযায়ী ওয়ার্কার প্রসেসে পাঠায়।
+
+    প্রতিটি ওয়ার্কারের জন্য একটি কিউ ও একটি ফরওয়ার্ডার, তাই একই ইউজারের আপডেট
+    যে ক্রমে এসেছে সেই ক্রমেই ওয়ার্কারে পৌঁছায়।
+    """
+
+    def __init__(self, worker_urls, path: str = "/webhook", secret: str = None):
+        self.worker_urls = list(worker_urls)
+        self.secret = secret
+        self.app = web.Application()
+        self.app.router.add_post(path, self._handle)
+        self.app.on_startup.append(self._start_forwarders)
+        self.app.on_cleanup.append(self._stop_forwarders)
+        self._queues = [asyncio.Queue(SHARD_QUEUE_SIZE) for _ in self.worker_urls]
+        self._tasks = []
+        self._client = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(TELEGRAM_SECRET_HEADER, ""), self.secret):
+            return web.Response(status=403)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        queue = self._queues[shard_key(update) % len(self._queues)]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return web.Response(status=503)  # Telegram পরে আবার পাঠাবে
+        return web.Response()
+
+    async def _start_forwarders(self, app) -> None:
+        self._client = httpx.AsyncClient(timeout=10)
+        self._tasks = [
+            asyncio.create_task(self._forward(url, queue)) for url, queue in zip(self.worker_urls, self._queues)
+        ]
+
+    async def _stop_forwarders(self, app) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    async def _forward(self, url: str, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            for attempt in range(SHARD_FORWARD_RETRIES):
+                try:
+                    response = await self._client.post(url, json=update)
+                    if response.status_code == 200:
+                        break
+                    logger.warning(f"Worker {url} returned {response.status_code}")
+                except httpx.HTTPError as e:
+                    logger.warning(f"Forwarding update to {url} failed: {e}")
+                await asyncio.sleep(min(2 ** attempt, 10))
+            else:
+                logger.error(f"Dropped update {update.get('update_id')} after {SHARD_FORWARD_RETRIES} attempts")
+
+
+def worker_update_app(application) -> web.Application:
+    """ওয়ার্কারের ভেতরে POST /update; রাউটার থেকে আসা আপডেট application.update_queue তে দেয়"""
+    async def handle(request: web.Request) -> web.Response:
+        await application.update_queue.put(Update.de_json(await request.json(), application.bot))
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post("/update", handle)
+    return app
@@ -0,0 +1,152 @@
+// whatsapp_api_server/soak.js
+// Memory soak for the session manager in index.js, with fake Baileys sockets instead of WhatsApp:
+//
+//   node --expose-gc soak.js [sessions=2000] [rounds=20]
+//
+// Every fake socket holds SOAK_SOCKET_KB of Buffers, standing in for the signal store, caches and WebSocket
+// buffers of a real one. All sessions are created, then each round wakes random hibernated ones through
+// GET status and sweeps the rest with a batch status. Memory must follow SESSION_MAX_ACTIVE, not the number
+// of sessions; the exit code is 1 when it does not.
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { EventEmitter } = require('events');
+
+const TOTAL = parseInt(process.argv[2] || '2000', 10);
+const ROUNDS = parseInt(process.argv[3] || '20', 10);
+const LOOKUPS = parseInt(process.env.SOAK_LOOKUPS || '200', 10); // woken per round
+const SOCKET_KB = parseInt(process.env.SOAK_SOCKET_KB || '256', 10);
+const CONCURRENCY = 50;
+
+const sessionsDir = fs.mkdtempSync(path.join(os.tmpdir(), 'wa-soak-'));
+Object.assign(process.env, {
+    SESSIONS_DIR: sessionsDir,
+    PORT: process.env.SOAK_PORT || '3999',
+    LOG_LEVEL: process.env.LOG_LEVEL || 'warn',
+    SESSION_MAX_ACTIVE: process.env.SESSION_MAX_ACTIVE || '100',
+    BOT_EVENTS_URL: 'http://soak.invalid/events',
+});
+const BASE = `http://127.0.0.1:${process.env.PORT}`;
+const CAP = parseInt(process.env.SESSION_MAX_ACTIVE, 10);
+
+// Events for the bot are swallowed; everything else goes to the real fetch
+const realFetch = global.fetch;
+global.fetch = (url, options) => (url === process.env.BOT_EVENTS_URL ? Promise.resolve({ ok: true }) : realFetch(url, options));
+
+let opened = 0;
+let closed = 0;
+const fakeBaileys = {
+    DisconnectReason: { loggedOut: 401, restartRequired: 515, connectionClosed: 428 },
+    async useMultiFileAuthState(dir) {
+        fs.mkdirSync(dir, { recursive: true });
+        const creds = path.join(dir, 'creds.json');
+        if (!fs.existsSync(creds)) fs.writeFileSync(creds, JSON.stringify({ me: { id: path.basename(dir) } }));
+        return { state: {}, saveCreds() {} };
+    },
+    getWAConnection() {
+        const ev = new EventEmitter();
+        const sock = { ev, user: null, memory: Buffer.alloc(SOCKET_KB * 1024, 1) };
+        const close = (statusCode) => {
+            sock.memory = null;
+            closed += 1;
+            setImmediate(() => ev.emit('connection.update', { connection: 'close', lastDisconnect: { error: { output: { statusCode } } } }));
+        };
+        sock.end = () => close(428);
+        sock.logout = async () => close(401);
+        setTimeout(() => {
+            opened += 1;
+            sock.user = { id: 'soak' };
+            ev.emit('connection.update', { connection: 'open' });
+        }, 5);
+        return sock;
+    },
+};
+const baileysPath = require.resolve('@adiwajshing/baileys');
+require.cache[baileysPath] = { id: baileysPath, filename: baileysPath, loaded: true, exports: fakeBaileys };
+
+const phoneOf = (i) => `+1555${String(i).padStart(7, '0')}`;
+const tick = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function api(method, url, body) {
+    const res = await realFetch(BASE + url, {
+        method,
+        headers: { 'Content-Type': 'application/json' },
+        body: body && JSON.stringify(body),
+    });
+    return res.json();
+}
+
+async function runLimited(items, fn) {
+    let next = 0;
+    const worker = async () => {
+        while (next < items.length) await fn(items[next++]);
+    };
+    await Promise.all(Array.from({ length: CONCURRENCY }, worker));
+}
+
+function usedMb() {
+    if (global.gc) global.gc();
+    const { heapUsed, external } = process.memoryUsage();
+    return (heapUsed + external) / 1024 / 1024;
+}
+
+async function main() {
+    require('./index.js');
+    await tick(200);
+    const baseline = usedMb();
+    const phones = Array.from({ length: TOTAL }, (_, i) => phoneOf(i));
+    const samples = [];
+    let lastStatuses = {};
+    const sample = async (label) => {
+        const { memory } = await api('GET', '/supervisor');
+        const { statuses } = await api('POST', '/sessions/status', { phones });
+        const counts = {};
+        Object.values(statuses).forEach((status) => { counts[status] = (counts[status] || 0) + 1; });
+        const row = { label, live: memory.live, hibernated: memory.hibernated, woken: memory.wokenTotal, mb: usedMb() - baseline, counts };
+        samples.push(row);
+        lastStatuses = statuses;
+        console.log(`${label.padEnd(9)} live ${String(row.live).padStart(5)}  hibernated ${String(row.hibernated).padStart(5)}  `
+            + `woken ${String(row.woken).padStart(6)}  +${row.mb.toFixed(1).padStart(7)} MB  ${JSON.stringify(counts)}`);
+    };
+
+    console.log(`${TOTAL} sessions, cap ${CAP} live, ${SOCKET_KB} KB per socket, ${LOOKUPS} wakes per round`
+        + `${global.gc ? '' : ' (run with --expose-gc for exact numbers)'}`);
+    await runLimited(phones, (phone) => api('POST', '/sessions', { phone }));
+    await sample('created');
+    for (let round = 1; round <= ROUNDS; round++) {
+        const picked = Array.from({ length: LOOKUPS }, () => phones[Math.floor(Math.random() * TOTAL)]);
+        const woken = [];
+        await runLimited(picked, async (phone) => woken.push((await api('GET', `/sessions/${phone}/status`)).status));
+        const notAuthenticated = woken.filter((status) => status !== 'authenticated').length;
+        if (notAuthenticated) console.log(`  ${notAuthenticated} lookups did not come back authenticated`);
+        await sample(`round ${round}`);
+    }
+
+    // A hibernated session can still be logged out: it is woken, unlinked and its files removed
+    const sleeper = phones.find((phone) => lastStatuses[phone] === 'hibernated');
+    let logoutOk = true;
+    if (sleeper) {
+        const logout = await api('DELETE', `/sessions/${sleeper}`);
+        logoutOk = logout.status === 'logged_out' && !fs.existsSync(path.join(sessionsDir, sleeper));
+        console.log(`logout of a hibernated session: ${logout.status}, files removed: ${logoutOk}`);
+    }
+
+    const peakLive = Math.max(...samples.map((row) => row.live));
+    const peakMb = Math.max(...samples.map((row) => row.mb));
+    const boundMb = (CAP * SOCKET_KB * 1.5) / 1024 + 32; // live sockets plus bookkeeping for every session
+    const unboundedMb = (TOTAL * SOCKET_KB) / 1024;
+    const lost = samples.filter((row) => (row.counts.authenticated || 0) + (row.counts.hibernated || 0) !== TOTAL).length;
+    console.log(`peak live ${peakLive} (cap ${CAP}), peak +${peakMb.toFixed(1)} MB (bound ${boundMb.toFixed(0)} MB, `
+        + `${unboundedMb.toFixed(0)} MB without hibernation), sockets opened ${opened} / closed ${closed}`);
+
+    fs.rmSync(sessionsDir, { recursive: true, force: true });
+    const ok = peakLive <= CAP && peakMb <= boundMb && !lost && logoutOk;
+    if (!ok) console.log(`FAILED${lost ? `: ${lost} samples lost sessions` : ''}`);
+    process.exit(ok ? 0 : 1);
+}
+
+main().catch((e) => {
+    console.error(e);
+    fs.rmSync(sessionsDir, { recursive: true, force: true });
+    process.exit(1);
+});
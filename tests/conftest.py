@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# মডিউলগুলো রিপোর রুটে, প্যাকেজ হিসেবে নয়
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """মাইগ্রেশন চালানো একটি নতুন ডাটাবেজ ফাইল"""
+    from migrations import apply_migrations
+
+    path = str(tmp_path / "bot_database.db")
+    apply_migrations(path)
+    return path
+
+
+@pytest.fixture
+def bot_module(tmp_path, monkeypatch):
+    """প্রতি টেস্টে নতুন করে ইমপোর্ট করা bot (নিজস্ব repo, notifier, scheduler), ডাটাবেজ tmp_path এ"""
+    monkeypatch.chdir(tmp_path)  # bot.DB_PATH আপেক্ষিক পাথ
+    sys.modules.pop("bot", None)
+    import bot
+
+    yield bot
+    sys.modules.pop("bot", None)
+
+
+def pytest_addoption(parser):
+    parser.addoption("--loadtest", action="store_true", help="loadtest মার্ক করা ধীর টেস্টগুলোও চালায়")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "loadtest: loadtest.py চালায় (কয়েক মিনিট); শুধু --loadtest দিলে চলে")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--loadtest"):
+        return
+    skip = pytest.mark.skip(reason="ধীর লোড টেস্ট; চালাতে --loadtest দিন")
+    for item in items:
+        if item.get_closest_marker("loadtest"):
+            item.add_marker(skip)
@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+import logging
+
+from broadcast import PROGRESS_HEADERS, BroadcastEngine
+from db import DBExecutor
+from repository import Repository
+
+USERS = 250
+
+
+class FakeBot:
+    def __init__(self, broken_chat: int = None):
+        self.sent = []
+        self.edits = []
+        self.broken_chat = broken_chat
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id == self.broken_chat:
+            raise RuntimeError("boom")  # TelegramError নয়, তাই _send এর রিট্রাই ধরে না
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.edits.append((chat_id, message_id, text))
+
+
+async def _job(repo) -> int:
+    for user_id in range(1, USERS + 1):
+        await repo.create_user(user_id, f"user{user_id}", f"ref_{user_id}", datetime.date.today(), 0)
+    job_id = await repo.create_broadcast_job("hello", 1)
+    await repo.set_broadcast_progress_message(job_id, 77)
+    return job_id
+
+
+def test_broadcast_reaches_every_user_in_batches(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        job_id = await _job(repo)
+        bot = FakeBot()
+        await BroadcastEngine(repo, rate=10 ** 6, batch_size=100)._run(bot, job_id)
+        job = await repo.get_broadcast_job(job_id)
+        await repo.flush()
+        repo.close()
+        return bot, job
+
+    bot, job = asyncio.run(scenario())
+    assert sorted(bot.sent) == list(range(1, USERS + 1))
+    assert (job["status"], job["sent"], job["failed"], job["last_user_id"]) == ("done", USERS, 0, USERS)
+    assert bot.edits[-1][:2] == (1, 77) and bot.edits[-1][2].startswith(PROGRESS_HEADERS["done"])
+
+
+def test_unexpected_error_marks_the_job_failed_and_tells_the_admin(db_path, caplog):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        job_id = await _job(repo)
+        bot = FakeBot(broken_chat=150)
+        engine = BroadcastEngine(repo, rate=10 ** 6, batch_size=100)
+        await engine._run(bot, job_id)
+        job = await repo.get_broadcast_job(job_id)
+        running = await repo.list_running_broadcasts()
+        await repo.flush()
+        repo.close()
+        return bot, job, running
+
+    with caplog.at_level(logging.ERROR, logger="broadcast"):
+        bot, job, running = asyncio.run(scenario())
+    # প্রথম ব্যাচ সেভ হয়েছিল; দ্বিতীয় ব্যাচে ত্রুটি, জবটি আর 'running' নয় তাই রিস্টার্টে আবার চলে না
+    assert (job["status"], job["sent"], job["last_user_id"]) == ("failed", 100, 100)
+    assert job["finished_at"] is not None and running == []
+    assert bot.edits[-1][:2] == (1, 77) and bot.edits[-1][2].startswith(PROGRESS_HEADERS["failed"])
+    assert f"Broadcast job {job['job_id']} failed" in caplog.text and "boom" in caplog.text
@@ -0,0 +1,122 @@
+import time
+import random
+import asyncio
+import types
+
+import pytest
+
+import callbacks
+from callbacks import (
+    CALLBACK_DATA_LIMIT, CALLBACK_VERSION, EXPIRED_NOTICE, CallbackRouter, InvalidCallbackData, TokenStore,
+    _random_value, pack_args,
+)
+
+FORMATS = ["", "i", "ii", "is", "s", "fi", "isf", "sss"]
+
+
+async def _echo(update, context, *args):
+    return args
+
+
+def _router(**kwargs) -> CallbackRouter:
+    router = CallbackRouter(**kwargs)
+    for opcode, fmt in enumerate(FORMATS, start=1):
+        router.add(opcode, f"route{opcode}", _echo, fmt)
+    return router
+
+
+def test_random_payloads_round_trip_within_64_bytes():
+    rng = random.Random(1)
+    router = _router()
+    for _ in range(5000):
+        opcode = rng.randrange(len(FORMATS)) + 1
+        fmt = FORMATS[opcode - 1]
+        args = tuple(_random_value(kind, rng) for kind in fmt)
+        data = router.data(f"route{opcode}", *args)
+        assert len(data.encode()) <= CALLBACK_DATA_LIMIT
+        route, decoded = router.decode(data)
+        assert route.name == f"route{opcode}" and decoded == args
+    assert len(router.tokens) > 0  # কিছু পেলোড টোকেনে গেছে
+
+
+def test_payload_at_the_limit_stays_inline_and_one_byte_more_uses_a_token():
+    router = _router()
+    inline_lengths = set()
+    for length in range(30, 60):
+        data = router.data("route5", "x" * length)
+        inline = len(CALLBACK_VERSION) + len(callbacks._b64encode(b"\x05" + pack_args("s", ["x" * length])))
+        if inline <= CALLBACK_DATA_LIMIT:
+            assert len(data) == inline
+            inline_lengths.add(inline)
+        else:
+            assert len(data) < CALLBACK_DATA_LIMIT and callbacks._b64decode(data[1:])[0] == callbacks.TOKEN_OPCODE
+        assert router.decode(data)[1] == ("x" * length,)
+    assert CALLBACK_DATA_LIMIT in inline_lengths  # ঠিক ৬৪ অক্ষরের ডাটাও বাটনেই থাকে
+
+
+def test_oversized_payload_is_stored_server_side():
+    router = _router()
+    phone_numbers = "+8801712345678," * 40  # ৬০০ বাইট
+    data = router.data("route5", phone_numbers)
+    assert len(data.encode()) <= CALLBACK_DATA_LIMIT
+    assert "8801712345678" not in data
+    assert len(router.tokens) == 1
+    assert router.decode(data)[1] == (phone_numbers,)
+
+
+def test_token_store_overflow_evicts_the_oldest():
+    router = _router(tokens=TokenStore(max_entries=3))
+    datas = [router.data("route5", f"{n}" * 80) for n in range(5)]
+    assert len(router.tokens) == 3
+    for data in datas[:2]:
+        with pytest.raises(InvalidCallbackData, match="expired token"):
+            router.decode(data)
+    for n, data in enumerate(datas[2:], start=2):
+        assert router.decode(data)[1] == (f"{n}" * 80,)
+
+
+def test_token_expires_after_ttl(monkeypatch):
+    router = _router(tokens=TokenStore(ttl=60))
+    data = router.data("route5", "y" * 100)
+    assert router.decode(data)[1] == ("y" * 100,)
+    now = time.monotonic()
+    monkeypatch.setattr(callbacks.time, "monotonic", lambda: now + 61)
+    with pytest.raises(InvalidCallbackData, match="expired token"):
+        router.decode(data)
+    assert len(router.tokens) == 0
+
+
+@pytest.mark.parametrize("data", [
+    "", "admin_users_page_0_n5", "approve_12", "1", "1AAAA", "1_w", "1/+", "1@@@",
+    "1" + "A" * 10,  # টোকেন অপকোড কিন্তু অজানা টোকেন
+    "1" + callbacks._b64encode(b"\xff"),  # অজানা অপকোড
+    "1" + callbacks._b64encode(b"\x02\x80"),  # অসম্পূর্ণ varint
+    "1" + callbacks._b64encode(b"\x05\x05ab"),  # স্ট্রিং দৈর্ঘ্যের চেয়ে ছোট
+    "1" + callbacks._b64encode(b"\x05\x02\xff\xfe"),  # ভুল UTF-8
+    "1" + callbacks._b64encode(b"\x01\x00"),  # বাড়তি বাইট
+    "1" + callbacks._b64encode(b"\x06\x00\x00"),  # 'fi' এর float অসম্পূর্ণ
+])
+def test_malformed_data_is_rejected(data):
+    with pytest.raises(InvalidCallbackData):
+        _router().decode(data)
+
+
+def test_dispatch_answers_stale_buttons_without_calling_a_handler():
+    router = _router(tokens=TokenStore(max_entries=1))
+    stale = router.data("route5", "a" * 80)
+    fresh = router.data("route5", "b" * 80)
+    answers = []
+
+    async def answer(*args, **kwargs):
+        answers.append(args)
+
+    def update(data):
+        query = types.SimpleNamespace(data=data, from_user=types.SimpleNamespace(id=1), answer=answer)
+        return types.SimpleNamespace(callback_query=query)
+
+    async def scenario():
+        assert await router.dispatch(update(stale), None) is None
+        assert await router.dispatch(update(fresh), None) == ("b" * 80,)
+
+    asyncio.run(scenario())
+    assert answers == [(EXPIRED_NOTICE,), ()]
@@ -0,0 +1,34 @@
+import sqlite3
+
+import pytest
+
+from db import connect, transaction
+
+
+def test_transaction_rolls_back_when_commit_fails(tmp_path):
+    conn = connect(str(tmp_path / "t.db"))
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TABLE child (parent_id INTEGER REFERENCES parent (id) DEFERRABLE INITIALLY DEFERRED)")
+
+    # deferred foreign key এর ভুল ধরা পড়ে COMMIT এর সময়, ট্রানজ্যাকশন তখনও খোলা
+    with pytest.raises(sqlite3.IntegrityError):
+        with transaction(conn):
+            conn.execute("INSERT INTO child VALUES (1)")
+
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM child").fetchone()[0] == 0
+    with transaction(conn):
+        conn.execute("INSERT INTO parent VALUES (1)")
+    assert conn.execute("SELECT COUNT(*) FROM parent").fetchone()[0] == 1
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    conn = connect(str(tmp_path / "t.db"))
+    conn.execute("CREATE TABLE t (v INTEGER)")
+    with pytest.raises(ValueError):
+        with transaction(conn, "IMMEDIATE"):
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
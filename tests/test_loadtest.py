@@ -0,0 +1,35 @@
+import sys
+import asyncio
+
+import pytest
+
+import loadtest
+
+pytestmark = pytest.mark.loadtest
+
+MIX = ["--updates", "1500", "--users", "200", "--concurrency", "20", "--seed-users", "20000"]
+FLAT_FACTOR = 2.0  # ব্যাকগ্রাউন্ড কাজ চলার সময় p99 এর বেশি বাড়লে ইভেন্ট লুপ বা রাইটার আটকে আছে
+
+
+def _loadtest(workdir, monkeypatch, *argv) -> dict:
+    """নতুন ডিরেক্টরিতে নতুন করে ইমপোর্ট করা bot এর বিপরীতে loadtest.run()"""
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)  # bot.DB_PATH আপেক্ষিক পাথ
+    sys.modules.pop("bot", None)
+    try:
+        report = asyncio.run(loadtest.run(loadtest.parse_args(list(argv))))
+    finally:
+        sys.modules.pop("bot", None)
+    assert not (report["stats_drift"] or report["points_mismatches"] or report["referral_mismatches"])
+    return report
+
+
+@pytest.mark.parametrize("background", ["broadcast", "users"])
+def test_p99_stays_flat_while_a_large_background_job_runs(background, tmp_path, monkeypatch):
+    baseline = _loadtest(tmp_path / "baseline", monkeypatch, *MIX)
+    loaded = _loadtest(tmp_path / background, monkeypatch, *MIX, "--background", background)
+
+    assert loaded["handler_errors"] == 0
+    work = loaded["background"]
+    assert work["sent"] > 0 if background == "broadcast" else work["pages"] > 1
+    assert loaded["p99_ms"] <= FLAT_FACTOR * baseline["p99_ms"], (baseline["p99_ms"], loaded["p99_ms"], work)
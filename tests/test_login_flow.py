@@ -0,0 +1,168 @@
+import types
+import asyncio
+
+from loadtest import FAKE_TOKEN, UpdateFactory, offline_bot
+
+
+def _conversation_state(application, user_id):
+    conv = next(h for h in application.handlers[0] if getattr(h, "name", None) == "main_conversation")
+    return conv._conversations.get((user_id, user_id))
+
+
+async def _start_login(application, factory, user_id, phone_number):
+    for text in ("/start", "▶️ WhatsApp লগইন", phone_number):
+        await application.process_update(factory.message(user_id, text))
+
+
+def test_confirm_after_open_event_ends_conversation(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, _):
+            factory = UpdateFactory(application.bot)
+            await _start_login(application, factory, 11, "+8801711000011")
+            assert _conversation_state(application, 11) == bot.WAIT_FOR_QR_CONFIRMATION
+
+            await bot.handle_session_event(application, {"event": "open", "phone": "+8801711000011"})
+            await application.process_update(factory.message(11, "/confirm"))
+
+            texts = [text for text, _ in telegram.messages[11]]
+            assert sum(text.startswith("✅ WhatsApp সফলভাবে লগইন") for text in texts) == 1
+            assert texts[-1] == bot.LOGIN_ALREADY_SETTLED_TEXT
+            assert _conversation_state(application, 11) is None
+            assert await bot.repo.list_active_sessions(11)
+
+    asyncio.run(scenario())
+
+
+def test_open_event_during_confirm_is_recorded_once(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, _):
+            factory = UpdateFactory(application.bot)
+            await _start_login(application, factory, 12, "+8801711000012")
+
+            # /confirm এর স্ট্যাটাস চেকের মাঝেই push ইভেন্ট এসে লগইন সম্পন্ন করে
+            check_status = bot.check_whatsapp_login_status
+
+            async def racing_status(phone_number, use_cache=False):
+                status = await check_status(phone_number, use_cache)
+                await bot.handle_session_event(application, {"event": "open", "phone": phone_number})
+                return status
+
+            bot.check_whatsapp_login_status = racing_status
+            await application.process_update(factory.message(12, "/confirm"))
+
+            texts = [text for text, _ in telegram.messages[12]]
+            assert sum(text.startswith("✅ WhatsApp") for text in texts) == 1
+            assert texts[-1] == bot.LOGIN_ALREADY_SETTLED_TEXT
+            assert _conversation_state(application, 12) is None
+            profile = await bot.repo.get_profile(12)
+            assert profile.successful_sessions == 1
+
+    asyncio.run(scenario())
+
+
+def test_login_settled_on_primary_worker_is_seen_by_user_shard(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (primary, telegram, _):
+            # ইউজারের আপডেট ওয়ার্কার 1 এ যায়; ইভেন্ট সার্ভার ও জবগুলো শুধু প্রথম ওয়ার্কারে চলে
+            worker = bot.build_application(
+                FAKE_TOKEN, base_url=primary.bot.base_url.removesuffix(FAKE_TOKEN), shard=(1, 2)
+            )
+            await worker.initialize()
+            factory = UpdateFactory(worker.bot)
+
+            await _start_login(worker, factory, 21, "+8801711000021")
+            assert await bot.repo.get_user_login(21) == "+8801711000021"
+            await bot.handle_session_event(primary, {"event": "open", "phone": "+8801711000021"})
+            assert "phone_number" not in worker.user_data.get(21, {})
+            await worker.process_update(factory.message(21, "/confirm"))
+            assert telegram.messages[21][-1][0] == bot.LOGIN_ALREADY_SETTLED_TEXT
+            assert _conversation_state(worker, 21) is None
+
+            # প্রথম ওয়ার্কারের মেয়াদ শেষের জব QR টি বাতিল করে
+            await _start_login(worker, factory, 21, "+8801711000022")
+            await bot.repo.db.execute("UPDATE pending_logins SET created_at = datetime('now', '-1 hour')")
+            await bot.expire_logins_job(types.SimpleNamespace(application=primary))
+            assert await bot.repo.get_user_login(21) is None
+            await worker.process_update(factory.message(21, "/confirm"))
+            assert telegram.messages[21][-1][0] == bot.LOGIN_ALREADY_SETTLED_TEXT
+            assert _conversation_state(worker, 21) is None
+            await worker.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_new_login_uploads_its_own_qr(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, whatsapp):
+            factory = UpdateFactory(application.bot)
+            await _start_login(application, factory, 31, "+8801711000031")
+            await bot.handle_session_event(application, {"event": "open", "phone": "+8801711000031"})
+            assert "+8801711000031" not in bot.qr_file_ids
+
+            # একই নম্বরে নতুন লগইন: সার্ভারের নতুন QR আপলোড হয়, আগের লগইনের file_id নয়
+            await _start_login(application, factory, 31, "+8801711000031")
+            assert telegram.photos == [(31, None), (31, None)]
+
+            # একই QR এর rotation ইভেন্ট (ETag অপরিবর্তিত) কিছু পাঠায় না; নতুন QR আগের মেসেজটিই এডিট করে
+            etag = whatsapp.qr_etags["+8801711000031"]
+            await bot.handle_session_event(application, {"event": "qr", "phone": "+8801711000031", "etag": etag})
+            whatsapp.qr_etags["+8801711000031"] = '"qr-rotated"'
+            await bot.handle_session_event(application, {"event": "qr", "phone": "+8801711000031", "etag": '"qr-rotated"'})
+            assert telegram.photos[2:] == [(31, None)]
+            assert bot.qr_file_ids["+8801711000031"][0] == '"qr-rotated"'
+
+            await bot.repo.db.execute("UPDATE pending_logins SET created_at = datetime('now', '-1 hour')")
+            await bot.expire_logins_job(types.SimpleNamespace(application=application))
+            assert "+8801711000031" not in bot.qr_file_ids
+
+    asyncio.run(scenario())
+
+
+def test_active_sessions_markdown_keeps_server_status_literal(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, _):
+            factory = UpdateFactory(application.bot)
+            await _start_login(application, factory, 41, "+8801711000041")
+            await bot.handle_session_event(application, {"event": "open", "phone": "+8801711000041"})
+            await bot.repo.record_session_checks([("+8801711000041", "pending_qr", None)])
+            await application.process_update(factory.message(41, "✅ Active Sessions"))
+
+            text, parse_mode = telegram.messages[41][-1]
+            assert parse_mode == "Markdown"
+            assert "`pending_qr`" in text
+            # ব্যাকটিকের বাইরে '_' থাকলে টেলিগ্রাম মেসেজটি পার্স করতে পারে না
+            assert "_" not in "".join(text.split("`")[::2])
+
+    asyncio.run(scenario())
+
+
+def test_settled_withdrawal_notice_is_sent_as_markdown(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, _):
+            factory = UpdateFactory(application.bot)
+            admin = bot.SUPER_ADMIN_ID
+            await application.process_update(factory.message(51, "/start"))
+            assert await bot.repo.create_withdrawal(51, 0.5, 5, "01700000000")
+
+            await application.process_update(factory.message(admin, "/approve_withdrawals"))
+            approve = telegram.keyboards[admin][0]
+            await application.process_update(factory.callback(admin, approve))
+            await bot.notifier._queue.join()
+
+            text, parse_mode = telegram.messages[51][-1]
+            assert text.startswith("✅ আপনার `0.5` BDT")
+            assert parse_mode == "Markdown"
+
+    asyncio.run(scenario())
@@ -0,0 +1,111 @@
+import asyncio
+
+import login_scheduler
+from db import DBExecutor
+from login_scheduler import LoginScheduler
+from repository import Repository
+
+CAPACITY = 3
+
+
+def _phone(user_id: int) -> str:
+    return f"+88017{user_id:08d}"
+
+
+async def _pending(repo) -> list:
+    return [tuple(row) for row in await repo.db.fetchall("SELECT user_id, phone_number FROM pending_logins ORDER BY rowid")]
+
+
+def test_queue_is_fifo_and_admits_into_free_slots(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        scheduler = LoginScheduler(repo, capacity=CAPACITY)
+        positions = [await scheduler.request(user_id, _phone(user_id)) for user_id in range(1, 9)]
+        assert positions == [0, 0, 0, 1, 2, 3, 4, 5]
+
+        # আবার চাইলে জায়গা একই থাকে, শুধু নম্বর বদলায়; কিউ ছাড়লে পেছনের সবাই এগোয়
+        assert await scheduler.request(5, "+8801999999999") == 2
+        assert await scheduler.leave(4)
+        assert [await scheduler.position(user_id) for user_id in (4, 5, 6, 7, 8)] == [0, 1, 2, 3, 4]
+        # কিউতে কেউ থাকলে জায়গা খালি থাকলেও নতুন ইউজার লাইন ভাঙে না
+        await repo.pop_pending_login(_phone(1))
+        assert await scheduler.request(9, _phone(9)) == 5
+
+        assert await scheduler.admit() == [(5, "+8801999999999")]
+        assert await scheduler.admit() == []  # আবার পূর্ণ
+        for user_id in (2, 3):
+            await repo.pop_pending_login(_phone(user_id))
+        assert await scheduler.admit() == [(6, _phone(6)), (7, _phone(7))]
+        assert await _pending(repo) == [(5, "+8801999999999"), (6, _phone(6)), (7, _phone(7))]
+        assert [await scheduler.position(user_id) for user_id in (8, 9)] == [1, 2]
+        await repo.flush()
+        repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_requests_from_workers_never_exceed_capacity(db_path):
+    async def scenario():
+        # আলাদা DBExecutor: একই ফাইলে লেখা আলাদা ওয়ার্কার প্রসেসের মতো
+        repos = [Repository(DBExecutor(db_path)) for _ in range(3)]
+        schedulers = [LoginScheduler(repo, capacity=CAPACITY) for repo in repos]
+        users = range(100, 160)
+        positions = await asyncio.gather(*(
+            schedulers[user_id % 3].request(user_id, _phone(user_id)) for user_id in users
+        ))
+        assert positions.count(0) == CAPACITY
+        assert sorted(p for p in positions if p) == list(range(1, len(users) - CAPACITY + 1))
+        assert len(await _pending(repos[0])) == CAPACITY
+
+        # একসাথে অনেক admit/pop এর পরেও সীমা মানা হয় এবং কিউর ক্রম বজায় থাকে
+        queued = [user_id for user_id, position in sorted(zip(users, positions), key=lambda item: item[1]) if position]
+        admitted = []
+        while len(admitted) < len(queued):
+            for user_id, phone_number in await _pending(repos[0]):
+                await repos[user_id % 3].pop_pending_login(phone_number)
+            batches = await asyncio.gather(*(scheduler.admit() for scheduler in schedulers))
+            assert len(await _pending(repos[0])) <= CAPACITY
+            admitted += sorted((user_id for batch in batches for user_id, _ in batch), key=queued.index)
+        assert admitted == queued
+        for repo in repos:
+            await repo.flush()
+            repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_expired_logins_are_evicted_and_free_their_slot(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        scheduler = LoginScheduler(repo, capacity=CAPACITY, qr_timeout=60)
+        for user_id in range(1, 6):
+            await scheduler.request(user_id, _phone(user_id))
+        assert await scheduler.expire() == []
+
+        await repo.db.execute(
+            "UPDATE pending_logins SET created_at = datetime('now', '-2 minutes') WHERE user_id IN (1, 3)"
+        )
+        assert sorted(await scheduler.expire()) == [(_phone(1), 1), (_phone(3), 3)]
+        assert await repo.get_user_login(1) is None
+        assert await scheduler.admit() == [(4, _phone(4)), (5, _phone(5))]
+        assert [user_id for user_id, _ in await _pending(repo)] == [2, 4, 5]
+
+        # মেয়াদোত্তীর্ণ লগইনগুলো ~120 সেকেন্ড জায়গা ধরে ছিল; অপেক্ষার অনুমান সেই মাপ থেকে
+        _, _, hold = await repo.login_load()
+        assert 110 <= hold <= 130
+        assert await scheduler.estimated_wait(CAPACITY + 1) == 2 * hold
+        await repo.flush()
+        repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_per_user_rate_limit(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(login_scheduler.time, "monotonic", lambda: now[0])
+    scheduler = LoginScheduler(None, per_user=2, window=600)
+    assert scheduler.retry_after(1) == 0 and scheduler.retry_after(1) == 0
+    assert scheduler.retry_after(1) == 600
+    assert scheduler.retry_after(2) == 0  # অন্য ইউজারের উপর প্রভাব নেই
+    now[0] += 601
+    assert scheduler.retry_after(1) == 0
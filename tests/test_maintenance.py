@@ -0,0 +1,184 @@
+import os
+import asyncio
+import sqlite3
+import datetime
+
+from db import DBExecutor
+from maintenance import (
+    ARCHIVE_POLICIES, CHECK_SEED_ID, _audit, _seed, archive_old_rows, backup_database, convert_to_incremental,
+    incremental_vacuum,
+)
+from migrations import apply_migrations
+from repository import Repository
+
+ROWS = 3000
+WRITERS = 3
+
+
+def _count(path: str, sql: str):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _consistent(audit: dict) -> bool:
+    return not (audit["stats_drift"] or audit["points_mismatches"] or audit["referral_mismatches"])
+
+
+def test_backup_taken_during_writes_is_a_consistent_snapshot(db_path, tmp_path):
+    _seed(db_path, ROWS)
+    dest = str(tmp_path / "backups")
+    os.makedirs(dest)
+    # আগের রানের পুরনো কপি ও ক্র্যাশ করা .part ফাইল; keep=2 এ নতুনটিসহ দুটি থাকে
+    for name in ("bot_database-20000101-000000.db", "bot_database-20000102-000000.db",
+                 "bot_database-20000103-000000.db.part"):
+        (tmp_path / "backups" / name).write_bytes(b"old")
+
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        stop = asyncio.Event()
+        written = []
+
+        async def writer(index):
+            user_id = CHECK_SEED_ID + ROWS + index
+            while not stop.is_set():
+                user_id += WRITERS
+                await repo.create_user(user_id, f"w{user_id}", f"ref_{user_id}", datetime.date.today(), 100)
+                await repo.record_login(user_id, f"+2{user_id}", 10)
+                await repo.create_withdrawal(user_id, 1.0, 50, "017")
+                written.append(user_id)
+
+        tasks = [asyncio.create_task(writer(i)) for i in range(WRITERS)]
+        await asyncio.sleep(0.2)
+        before = len(written)
+        try:
+            # ছোট ধাপ, যাতে কপি অনেকগুলো লেখার মধ্যে দিয়ে চলে
+            report = await asyncio.to_thread(backup_database, db_path, dest, 2, 16, 0.001)
+        finally:
+            stop.set()
+            await asyncio.gather(*tasks)
+            await repo.flush()
+            repo.close()
+        return report, len(written) - before
+
+    report, written_during = asyncio.run(scenario())
+    assert written_during > 0  # ব্যাকআপ চলার সময় লেখা হয়েছে
+    assert sorted(os.listdir(dest)) == ["bot_database-20000102-000000.db", os.path.basename(report.detail["file"])]
+    assert report.detail["removed"] == 2 and report.reclaimed_bytes == 6
+    # পাশে -wal ছাড়া একটিমাত্র ফাইল (_audit এর connect() এটিকে আবার WAL করে, তাই আগে দেখা)
+    assert _count(report.detail["file"], "PRAGMA journal_mode") == "delete"
+
+    backup = asyncio.run(_audit(report.detail["file"]))
+    live = asyncio.run(_audit(db_path))
+    assert _consistent(backup) and _consistent(live)
+    assert ROWS <= backup["users"] <= live["users"]
+
+
+def test_archive_moves_exactly_the_rows_the_policy_selects(db_path, tmp_path):
+    expected = _seed(db_path, ROWS)
+    archive_path = str(tmp_path / "bot_archive.db")
+    sessions, withdrawals = (_count(db_path, f"SELECT COUNT(*) FROM {table}") for table in ("sessions", "withdrawals"))
+
+    async def scenario():
+        db = DBExecutor(db_path)
+        try:
+            first = await archive_old_rows(db, archive_path, batch=200)
+            again = await archive_old_rows(db, archive_path, batch=200)
+        finally:
+            db.close()
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert first.detail["archived"] == expected
+    assert again.detail["archived"] == {"sessions": 0, "withdrawals": 0}
+    assert first.reclaimed_bytes > 0
+    for table, (key, _, _) in ARCHIVE_POLICIES.items():
+        assert _count(archive_path, f"SELECT COUNT(*) FROM {table}") == expected[table]
+        # আর্কাইভে থাকা কোনো সারি মূল ডাটাবেজে নেই
+        conn = sqlite3.connect(db_path)
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        assert conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {key} IN (SELECT {key} FROM archive.{table})").fetchone()[0] == 0
+        conn.close()
+    assert _count(db_path, "SELECT COUNT(*) FROM sessions") == sessions - expected["sessions"]
+    assert _count(db_path, "SELECT COUNT(*) FROM withdrawals") == withdrawals - expected["withdrawals"]
+    # _seed: প্রতি তৃতীয় সারি নতুন (পেন্ডিং উইথড্র), তার অর্ধেকের সেশন active
+    assert _count(db_path, "SELECT COUNT(*) FROM sessions WHERE status = 'active'") == -(-ROWS // 6)
+    assert _count(db_path, "SELECT COUNT(*) FROM withdrawals WHERE status = 'pending'") == -(-ROWS // 3)
+    assert _consistent(asyncio.run(_audit(db_path)))
+
+
+def test_relinking_an_archived_session_does_not_credit_points_again(db_path, tmp_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        await repo.create_user(1, "user1", "ref_1", datetime.date.today(), 1000)
+        assert await repo.record_login(1, "+8801700000001", 10)
+        assert not await repo.record_login(1, "+8801700000001", 10)  # সেশন এখনও আছে
+        await repo.deactivate_session("+8801700000001")
+        await repo.db.execute("UPDATE sessions SET status_changed_at = datetime('now', '-400 days')")
+        archived = await archive_old_rows(repo.db, str(tmp_path / "bot_archive.db"))
+        assert archived.detail["archived"]["sessions"] == 1
+        await repo.db.execute("UPDATE points_ledger SET created_at = datetime('now', '-400 days')")
+        assert await repo.compact_points_ledger() > 0  # login:<user>:<phone> কী-ও মুছে গেছে
+
+        # একই নম্বর আবার: সেশন নতুন করে তৈরি হয়, পয়েন্ট নয়; অন্য নম্বরে পয়েন্ট আগের মতোই
+        assert not await repo.record_login(1, "+8801700000001", 10)
+        assert await repo.record_login(1, "+8801700000002", 10)
+        profile = await repo.get_profile(1)
+        await repo.flush()
+        repo.close()
+        return profile
+
+    profile = asyncio.run(scenario())
+    assert profile.points == 1020 and profile.successful_sessions == 3
+    assert _count(db_path, "SELECT COUNT(*) FROM sessions") == 2
+    assert _consistent(asyncio.run(_audit(db_path)))
+
+
+def test_incremental_vacuum_returns_archived_pages_to_the_os(db_path, tmp_path):
+    _seed(db_path, ROWS)
+
+    async def scenario():
+        db = DBExecutor(db_path)
+        try:
+            archive = await archive_old_rows(db, str(tmp_path / "bot_archive.db"))
+            free_before = (await db.fetchone("PRAGMA freelist_count"))[0]
+            vacuum = await incremental_vacuum(db, pages=64)
+            free_after = (await db.fetchone("PRAGMA freelist_count"))[0]
+        finally:
+            db.close()
+        return archive, free_before, vacuum, free_after
+
+    archive, free_before, vacuum, free_after = asyncio.run(scenario())
+    page_size = _count(db_path, "PRAGMA page_size")
+    assert free_before > 0 and free_after == 0
+    assert vacuum.reclaimed_bytes == free_before * page_size >= archive.reclaimed_bytes
+    assert vacuum.detail["steps"] > 1
+    size_before, size_after = vacuum.detail["file_bytes"]
+    assert size_after < size_before
+    assert _consistent(asyncio.run(_audit(db_path)))
+
+
+def test_vacuum_needs_conversion_on_old_databases(tmp_path):
+    path = str(tmp_path / "old.db")
+    sqlite3.connect(path).close()  # auto_vacuum ছাড়া তৈরি পুরনো ফাইল
+    apply_migrations(path)
+    _seed(path, 300)
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM withdrawals")
+    conn.commit()
+    conn.close()
+
+    async def vacuum():
+        db = DBExecutor(path)
+        try:
+            return await incremental_vacuum(db)
+        finally:
+            db.close()
+
+    skipped = asyncio.run(vacuum())
+    assert skipped.reclaimed_bytes == 0 and skipped.detail["auto_vacuum"] == 0
+    assert convert_to_incremental(path).detail["auto_vacuum"] == 2
+    assert _count(path, "PRAGMA freelist_count") == 0
+    assert _count(path, "SELECT COUNT(*) FROM users") == 300
@@ -0,0 +1,81 @@
+import types
+
+from callbacks import CallbackRouter, TokenStore
+from metrics import UNKNOWN_CALLBACK_ACTION, Counter, Gauge, Histogram, Registry, callback_action
+
+
+def _samples(metric):
+    """render() এর সারিগুলো {নাম ও লেবেল: মান}"""
+    lines = metric.render().splitlines()
+    return dict(line.rsplit(" ", 1) for line in lines if not line.startswith("#"))
+
+
+def test_histogram_bucket_boundaries_are_inclusive():
+    histogram = Histogram("latency_seconds", "Latency", registry=Registry(), buckets=(0.5, 0.1, 1.0))
+    for value in (0.05, 0.1, 0.1000001, 0.5, 1.0, 7.0):
+        histogram.observe(value)
+    samples = _samples(histogram)
+    # বাকেট সাজানো হয় এবং le সীমার সমান মান সেই বাকেটেই পড়ে; গণনা ক্রমযোজিত
+    assert samples['latency_seconds_bucket{le="0.1"}'] == "2"
+    assert samples['latency_seconds_bucket{le="0.5"}'] == "4"
+    assert samples['latency_seconds_bucket{le="1.0"}'] == "5"
+    assert samples['latency_seconds_bucket{le="+Inf"}'] == "6"
+    assert samples["latency_seconds_count"] == "6"
+    assert float(samples["latency_seconds_sum"]) == sum((0.05, 0.1, 0.1000001, 0.5, 1.0, 7.0))
+
+
+def test_histogram_exposition_format():
+    histogram = Histogram("db_seconds", "DB calls", ("pool",), registry=Registry(), buckets=(0.01, 1.0))
+    histogram.labels("writer").observe(0.2)
+    assert histogram.render().splitlines() == [
+        "# HELP db_seconds DB calls",
+        "# TYPE db_seconds histogram",
+        'db_seconds_bucket{pool="writer",le="0.01"} 0',
+        'db_seconds_bucket{pool="writer",le="1.0"} 1',
+        'db_seconds_bucket{pool="writer",le="+Inf"} 1',
+        'db_seconds_sum{pool="writer"} 0.2',
+        'db_seconds_count{pool="writer"} 1',
+    ]
+
+
+def test_empty_histogram_child_reports_zeros():
+    histogram = Histogram("idle_seconds", "Idle", ("job",), registry=Registry(), buckets=(1.0,))
+    histogram.labels("backup")
+    samples = _samples(histogram)
+    assert samples['idle_seconds_bucket{job="backup",le="+Inf"}'] == "0"
+    assert samples['idle_seconds_count{job="backup"}'] == "0"
+    assert samples['idle_seconds_sum{job="backup"}'] == "0.0"
+
+
+def test_registry_renders_every_metric_and_escapes_labels():
+    registry = Registry()
+    counter = Counter("errors_total", "Errors", ("reason",), registry=registry)
+    counter.labels('bad "quote"\nline\\').inc(2)
+    Gauge("queue_depth", "Queue", registry=registry, collect=lambda: 3)
+    text = registry.render()
+    assert text.endswith("\n")
+    assert 'errors_total{reason="bad \\"quote\\"\\nline\\\\"} 2.0' in text.splitlines()
+    assert "# TYPE queue_depth gauge" in text and "queue_depth 3" in text.splitlines()
+
+
+def test_callback_action_labels_by_route_name():
+    async def handler(update, context, *args):
+        pass
+
+    router = CallbackRouter(tokens=TokenStore(ttl=0))  # টোকেনগুলো সাথে সাথে মেয়াদোত্তীর্ণ
+    router.add(1, "session_terminate", handler, "s")
+    router.add(2, "users_page", handler, "is")
+
+    def action(data):
+        update = types.SimpleNamespace(callback_query=types.SimpleNamespace(data=data))
+        return callback_action(update, router.decode)
+
+    assert action(router.data("session_terminate", "+8801712345678")) == "session_terminate"
+    assert action(router.data("users_page", 3, "n42")) == "users_page"
+    # পুরনো ফরম্যাট, ভাঙা ডাটা বা মেয়াদোত্তীর্ণ টোকেন: ফোন নম্বর বা অন্য কিছু লেবেলে যায় না
+    expired = router.data("session_terminate", "+880" * 20)
+    for data in ("admin_terminate_+8801712345678", "1@@@", "1" + "A" * 10, expired):
+        assert action(data) == UNKNOWN_CALLBACK_ACTION
+    assert callback_action(types.SimpleNamespace(callback_query=None), router.decode) == ""
+    update = types.SimpleNamespace(callback_query=types.SimpleNamespace(data=router.data("users_page", 1, "")))
+    assert callback_action(update) == UNKNOWN_CALLBACK_ACTION
@@ -0,0 +1,61 @@
+import time
+import asyncio
+
+from telegram.error import RetryAfter
+
+from broadcast import TokenBucket
+from notifier import Notifier
+
+RATE = 100
+
+
+class FakeBot:
+    def __init__(self, retry_after: float = 0):
+        self.sent = []
+        self.retry_after = retry_after
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.retry_after:
+            delay, self.retry_after = self.retry_after, 0
+            raise RetryAfter(delay)
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def test_notifications_and_broadcast_share_one_rate():
+    async def scenario():
+        bucket = TokenBucket(RATE, capacity=1)
+        notifier = Notifier(bucket=bucket)
+        bot = FakeBot()
+        notifier.start(bot)
+        start = time.monotonic()
+        for chat_id in range(20):
+            notifier.send(chat_id, "hi")
+        # ব্রডকাস্টের ওয়ার্কাররা একই বাকেট থেকে টোকেন নেয়
+        await asyncio.gather(*(bucket.acquire() for _ in range(20)))
+        await notifier.stop()
+        elapsed = time.monotonic() - start
+
+        assert len(bot.sent) == 20
+        # মোট 40 মেসেজ এক রেটে; আলাদা বাকেট হলে অর্ধেক সময়েই শেষ হতো
+        assert elapsed >= 39 / RATE * 0.9
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_on_a_notification_pauses_the_broadcast():
+    async def scenario():
+        bucket = TokenBucket(RATE)
+        notifier = Notifier(bucket=bucket)
+        bot = FakeBot(retry_after=0.3)
+        notifier.start(bot)
+        notifier.send(1, "hi")
+        await asyncio.sleep(0.05)  # প্রথম চেষ্টাটি RetryAfter পায়
+        start = time.monotonic()
+        await bucket.acquire()
+        paused = time.monotonic() - start
+        await notifier.stop()
+
+        assert paused >= 0.2
+        assert [chat_id for chat_id, _ in bot.sent] == [1]
+
+    asyncio.run(scenario())
@@ -0,0 +1,139 @@
+import asyncio
+
+from db import DBExecutor, track_queries, transaction
+from loadtest import UpdateFactory, offline_bot
+from repository import Repository
+
+LIMIT = 5
+
+
+async def _add_users(repo, user_ids) -> None:
+    # সরাসরি SQL, লেজার ছাড়া; তাই পরে সারি মুছে ফেলা যায়
+    def _write(conn):
+        with transaction(conn):
+            conn.executemany(
+                "INSERT INTO users (user_id, username, referral_code) VALUES (?, ?, ?)",
+                [(user_id, f"user{user_id}", f"ref_{user_id}") for user_id in user_ids]
+            )
+    await repo.db.write(_write)
+
+
+async def _page(repo, after, backward=False):
+    with track_queries("users page") as stats:
+        page = await repo.page_users(after, backward, LIMIT)
+    assert stats.count == 1  # পরের পেজ আছে কিনা একই কুয়েরির LIMIT + 1 থেকে
+    return [row[0] for row in page.rows], page.has_prev, page.has_next, page.first_key, page.last_key
+
+
+def test_pages_forward_and_back_at_the_boundaries(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        try:
+            # ঠিক দুই পেজ: দ্বিতীয় পেজের পর আর কোনো সারি নেই, lookahead তা ধরবে
+            await _add_users(repo, range(1, 2 * LIMIT + 1))
+            assert await _page(repo, 0) == ([1, 2, 3, 4, 5], False, True, 1, 5)
+            assert await _page(repo, 5) == ([6, 7, 8, 9, 10], True, False, 6, 10)
+
+            await _add_users(repo, (11, 12))
+            assert await _page(repo, 5) == ([6, 7, 8, 9, 10], True, True, 6, 10)
+            assert await _page(repo, 10) == ([11, 12], True, False, 11, 12)
+
+            # পেছনে: আগের পেজ পুরো LIMIT টি, আর প্রথম পেজে পৌঁছালে has_prev False
+            assert await _page(repo, 11, backward=True) == ([6, 7, 8, 9, 10], True, True, 6, 10)
+            assert await _page(repo, 6, backward=True) == ([1, 2, 3, 4, 5], False, True, 1, 5)
+            assert await _page(repo, 1, backward=True) == ([], False, True, 1, 1)
+        finally:
+            repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_stale_cursor_after_rows_are_deleted(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        try:
+            await _add_users(repo, range(1, 13))
+            # বাটন পাঠানোর পর কার্সরের সারিটিই মুছে গেছে; কী দিয়ে তুলনা হয়, তাই পেজ একই জায়গা থেকে চলে
+            await repo.db.execute("DELETE FROM users WHERE user_id IN (5, 6)")
+            assert await _page(repo, 5) == ([7, 8, 9, 10, 11], True, True, 7, 11)
+            assert await _page(repo, 6, backward=True) == ([1, 2, 3, 4], False, True, 1, 4)
+            # শেষের পরের কার্সর: খালি পেজ, শুধু পেছনে যাওয়া যায়
+            assert await _page(repo, 99) == ([], True, False, 99, 99)
+        finally:
+            repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_admin_walks_the_user_list_through_the_buttons(bot_module):
+    bot = bot_module
+    user_ids = list(range(1, 2 * bot.ITEMS_PER_PAGE + 3))
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, _):
+            factory = UpdateFactory(application.bot)
+            admin = bot.SUPER_ADMIN_ID
+            await application.process_update(factory.message(admin, "/start"))
+            await _add_users(bot.repo, user_ids)
+
+            def buttons():
+                decoded = [bot.router.decode(data) for data in telegram.keyboards[admin]]
+                listed = [args[0] for route, args in decoded if route.name == "users_select"]
+                nav = {args[1][0]: data for data, (route, args) in zip(telegram.keyboards[admin], decoded)
+                       if route.name == "users_page"}
+                return listed, nav
+
+            pages = []
+            await application.process_update(factory.message(admin, "👁️ ইউজার লিস্ট"))
+            while True:
+                listed, nav = buttons()
+                pages.append(listed)
+                if "n" not in nav:
+                    break
+                await application.process_update(factory.callback(admin, nav["n"]))
+            headers = [text for text, _ in telegram.messages[admin] if text.startswith("👥")]
+
+            back = []
+            while "p" in nav:
+                await application.process_update(factory.callback(admin, nav["p"]))
+                listed, nav = buttons()
+                back.append(listed)
+            return pages, back, headers
+
+    pages, back, headers = asyncio.run(scenario())
+    everyone = user_ids + [bot.SUPER_ADMIN_ID]
+    assert [len(page) for page in pages] == [5, 5, 3]
+    assert sum(pages, []) == everyone
+    assert back == pages[-2::-1]
+    assert headers == [f"👥 **ইউজার লিস্ট (পেজ {n}/3)**" for n in (1, 2, 3)]
+
+
+def test_selecting_a_user_shows_their_details(bot_module):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, telegram, _):
+            factory = UpdateFactory(application.bot)
+            admin = bot.SUPER_ADMIN_ID
+            await application.process_update(factory.message(admin, "/start"))
+            await application.process_update(factory.message(7, "/start"))
+            await bot.repo.record_login(7, "+8801700000007", bot.POINTS_PER_LOGIN)
+            await _add_users(bot.repo, (8,))
+
+            await application.process_update(factory.message(admin, "👁️ ইউজার লিস্ট"))
+            rows = {bot.router.decode(data)[1][0]: data for data in telegram.keyboards[admin]
+                    if bot.router.decode(data)[0].name == "users_select"}
+            await application.process_update(factory.callback(admin, rows[7]))
+            details = telegram.messages[admin][-1][0]
+            points = (await bot.repo.get_profile(7)).points
+
+            # তালিকা পাঠানোর পর মুছে যাওয়া ইউজারের বাটন
+            await bot.repo.db.execute("DELETE FROM users WHERE user_id = 8")
+            await application.process_update(factory.callback(admin, rows[8]))
+            return details, points, telegram.messages[admin][-1][0]
+
+    details, points, missing = asyncio.run(scenario())
+    assert details.startswith("👤 **ইউজার** `7`")
+    assert f"পয়েন্ট ব্যালেন্স:** `{points}`" in details and "সক্রিয় সেশন:** `1` টি" in details
+    assert "1. `+8801700000007`" in details
+    assert missing == "ইউজারটি পাওয়া যায়নি।"
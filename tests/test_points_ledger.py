@@ -0,0 +1,72 @@
+import asyncio
+import datetime
+import random
+
+from db import DBExecutor
+from repository import Repository
+
+WORKERS = 3  # আলাদা DBExecutor, যেন আলাদা ওয়ার্কার প্রসেস একই ফাইলে লিখছে
+USERS = 20
+SIGNUP_POINTS = 1000
+WITHDRAW_POINTS = 150
+WITHDRAW_TAPS = 12  # প্রতি ইউজারের একসাথে উইথড্র চেষ্টা; ব্যালেন্সে ৬-৭টির বেশি হয় না
+LOGINS = 5  # প্রতি ইউজারের আলাদা নম্বরে লগইন ক্রেডিট, প্রতিটি দুবার পাঠানো হয়
+LOGIN_POINTS = 10
+READS = 10
+
+
+def test_parallel_withdrawals_and_credits(db_path):
+    async def scenario():
+        repos = [Repository(DBExecutor(db_path)) for _ in range(WORKERS)]
+        users = list(range(1, USERS + 1))
+        today = datetime.date.today()
+        for user_id in users:
+            await repos[0].create_user(user_id, f"user{user_id}", f"ref_{user_id}", today, SIGNUP_POINTS)
+
+        calls = []
+        for user_id in users:
+            calls += [("withdraw", user_id, None)] * WITHDRAW_TAPS
+            calls += [("login", user_id, f"+8801{user_id:04d}{n:04d}") for n in range(LOGINS)] * 2
+            calls += [("read", user_id, None)] * READS
+        random.Random(7).shuffle(calls)
+
+        async def run(index, kind, user_id, phone_number):
+            repo = repos[index % WORKERS]
+            if kind == "withdraw":
+                return await repo.create_withdrawal(user_id, WITHDRAW_POINTS / 10, WITHDRAW_POINTS, "01700000000")
+            if kind == "login":
+                return await repo.record_login(user_id, phone_number, LOGIN_POINTS)
+            row = await repo.db.fetchone("SELECT points FROM users WHERE user_id = ?", (user_id,))
+            assert row[0] >= 0
+            return row[0]
+
+        # কোনো কলে "database is locked" বা অন্য এক্সেপশন হলে gather সেটিই তোলে
+        results = await asyncio.gather(*(run(i, *call) for i, call in enumerate(calls)))
+        await repos[0].compact_points_ledger(retention_days=0)
+
+        outcomes = {user_id: {"withdrawn": 0, "credited": 0} for user_id in users}
+        for (kind, user_id, _), result in zip(calls, results):
+            if kind == "withdraw" and result is not None:
+                outcomes[user_id]["withdrawn"] += 1
+            elif kind == "login" and result:
+                outcomes[user_id]["credited"] += 1
+
+        db = repos[0].db
+        for user_id, outcome in outcomes.items():
+            # একই নম্বরের দ্বিতীয় ক্রেডিট idempotency key এ আটকায়
+            assert outcome["credited"] == LOGINS
+            points, withdrawals = await db.fetchone(
+                "SELECT points, (SELECT COUNT(*) FROM withdrawals w WHERE w.user_id = u.user_id) FROM users u "
+                "WHERE user_id = ?", (user_id,)
+            )
+            assert withdrawals == outcome["withdrawn"]
+            assert points == SIGNUP_POINTS + LOGINS * LOGIN_POINTS - outcome["withdrawn"] * WITHDRAW_POINTS
+            assert 0 <= points
+            # ব্যালেন্সে যতগুলো ধরে অন্তত ততগুলো, তার বেশি নয়
+            assert outcome["withdrawn"] >= SIGNUP_POINTS // WITHDRAW_POINTS
+        assert await repos[0].audit_points() == []
+        for repo in repos:
+            await repo.flush()
+            repo.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,27 @@
+import asyncio
+import datetime
+
+from db import DBExecutor
+from profile_cache import ProfileCache
+from repository import Repository
+
+
+def test_repository_uses_the_given_cache_and_writes_through(db_path):
+    async def scenario():
+        cache = ProfileCache(max_entries=2)
+        repo = Repository(DBExecutor(db_path), cache)
+        assert repo.profiles is cache  # খালি ক্যাশও (len 0) বদলে যায় না
+        for user_id in (1, 2, 3):
+            await repo.create_user(user_id, f"user{user_id}", f"ref_{user_id}", datetime.date.today(), 100)
+            await repo.get_profile(user_id)
+        assert len(cache) == 2 and cache.evictions == 1
+
+        cache.hits = cache.misses = 0
+        await repo.record_login(3, "+8801700000003", 10)
+        profile = await repo.get_profile(3)
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert (profile.points, profile.successful_sessions, profile.active_sessions) == (110, 1, 1)
+        await repo.flush()
+        repo.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,22 @@
+import pytest
+
+from db import connect
+from migrations import check_query_plans
+from repository import HOT_QUERIES
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = connect(db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(conn, name):
+    assert [detail for query, detail in check_query_plans(conn) if query == name] == []
+
+
+def test_missing_index_is_reported(conn):
+    conn.execute("DROP INDEX idx_sessions_user_status")
+    assert "active_sessions" in {query for query, _ in check_query_plans(conn)}
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from db import DBExecutor
+from loadtest import StubWhatsApp, serve
+from repository import Repository
+from session_sweeper import (
+    DROP_NOTICE, SWEEP_MAX_INTERVAL, SWEEP_MIN_INTERVAL, SWEEP_RATE, SessionSweeper, sweep_interval,
+)
+from whatsapp_api import WhatsAppClient
+
+
+class _Notifier:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def _phone(n: int) -> str:
+    return f"+88017{n:08d}"
+
+
+async def _sessions(repo) -> dict:
+    rows = await repo.db.fetchall("SELECT phone_number, status, server_status, last_checked_at FROM sessions")
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+# (ডাটাবেজের status, সার্ভার যা বলে, সুইপের পরের status)
+RECONCILE = {
+    _phone(1): ("active", "authenticated", "active"),
+    _phone(2): ("active", "not_found", "disconnected"),  # সার্ভার রিস্টার্টে creds হারিয়েছে
+    _phone(3): ("active", "failed", "disconnected"),  # রিকানেক্টের চেষ্টা শেষ
+    _phone(4): ("active", "restoring", "active"),  # অস্থায়ী, status বদলায় না
+    _phone(5): ("active", "reconnecting", "active"),
+    _phone(6): ("disconnected", "authenticated", "active"),  # রিস্টোর হয়ে ফিরেছে
+    _phone(7): ("disconnected", "hibernated", "active"),
+    _phone(8): ("disconnected", "not_found", "disconnected"),
+}
+
+
+@pytest.mark.parametrize("batch", [True, False], ids=["batch", "per-phone"])
+def test_reconciliation_syncs_status_with_the_server(db_path, batch):
+    async def scenario():
+        stub = StubWhatsApp()
+        runner, url = await serve(stub.app)
+        client = WhatsAppClient(url)
+        await client.start()
+        client._batch_supported = batch  # False: পুরনো সার্ভার, প্রতিটি নম্বরে GET (not_found হলে 404)
+        repo = Repository(DBExecutor(db_path))
+        notifier = _Notifier()
+        try:
+            for n, phone in enumerate([*RECONCILE, _phone(9)], start=1):
+                await repo.record_login(n, phone, 10)
+            await repo.set_session_statuses({phone: "disconnected" for phone, (status, _, _) in RECONCILE.items()
+                                             if status == "disconnected"})
+            await repo.deactivate_session(_phone(9))  # লগআউট করা সেশন রিকনসাইল হয় না
+            stub.statuses = {phone: server for phone, (_, server, _) in RECONCILE.items()}
+            stub.statuses[_phone(9)] = "authenticated"
+
+            sweeper = SessionSweeper(repo, notifier, chunk_size=3, concurrency=2)
+            assert await sweeper.sweep(client) == len(RECONCILE)
+            return await _sessions(repo), notifier.sent, sweeper.last_sweep
+        finally:
+            repo.close()
+            await client.close()
+            await runner.cleanup()
+
+    sessions, sent, (checked, changed, _) = asyncio.run(scenario())
+    for phone, (_, server, expected) in RECONCILE.items():
+        status, server_status, last_checked_at = sessions[phone]
+        assert (status, server_status) == (expected, server), phone
+        assert last_checked_at is not None
+    assert sessions[_phone(9)] == ("inactive", None, None)
+    assert changed == 4
+    # শুধু active থেকে disconnected হওয়া সেশনের মালিকেরা জানতে পারে
+    assert sorted(sent) == [(2, DROP_NOTICE.format(phone=_phone(2))), (3, DROP_NOTICE.format(phone=_phone(3)))]
+
+
+def test_sweep_writes_back_in_bulk_and_stamps_only_real_changes(db_path):
+    phones = [_phone(n) for n in range(1, 11)]
+
+    async def scenario():
+        stub = StubWhatsApp()
+        runner, url = await serve(stub.app)
+        client = WhatsAppClient(url)
+        await client.start()
+        repo = Repository(DBExecutor(db_path))
+        notifier = _Notifier()
+        writes = []
+        record = repo.record_session_checks
+
+        async def counted(checks):
+            writes.append(len(checks))
+            return await record(checks)
+
+        repo.record_session_checks = counted
+        try:
+            for n, phone in enumerate(phones, start=1):
+                await repo.record_login(n, phone, 10)
+            await repo.db.execute("UPDATE sessions SET status_changed_at = '2000-01-01 00:00:00'")
+            sweeper = SessionSweeper(repo, notifier, chunk_size=3, concurrency=2)
+
+            # প্রতি রাউন্ডে concurrency টি চাংক, স্ট্যাটাস চাংক প্রতি একটি ব্যাচ রিকুয়েস্টে, লেখা রাউন্ড প্রতি একবার
+            assert await sweeper.sweep(client) == len(phones)
+            first = {phone: await repo.get_session_status(phone) for phone in phones}
+            assert writes == [6, 4] and stub.requests == 4 and notifier.sent == []
+
+            await repo.db.execute("UPDATE sessions SET last_checked_at = '2000-01-01 00:00:00'")
+            stub.statuses = {phones[0]: "failed", phones[1]: "reconnecting"}
+            await sweeper.sweep(client)
+            second = {phone: await repo.get_session_status(phone) for phone in phones}
+            return first, second, notifier.sent, sweeper.last_sweep
+        finally:
+            repo.close()
+            await client.close()
+            await runner.cleanup()
+
+    first, second, sent, (checked, changed, _) = asyncio.run(scenario())
+    # কিছু বদলায়নি: শুধু চেকের সময় লেখা হয়, status_changed_at আগের মতোই
+    for status, server_status, last_checked_at, status_changed_at in first.values():
+        assert (status, server_status, status_changed_at) == ("active", "authenticated", "2000-01-01 00:00:00")
+        assert last_checked_at > "2000-01-01 00:00:00"
+    # দ্বিতীয় সুইপে প্রতিটি সারির last_checked_at নতুন, কিন্তু status_changed_at শুধু বিচ্ছিন্ন হওয়া সেশনের
+    assert second[phones[0]][0] == "disconnected" and second[phones[0]][3] > "2000-01-01 00:00:00"
+    assert second[phones[1]][:2] == ("active", "reconnecting") and second[phones[1]][3] == "2000-01-01 00:00:00"
+    assert all(row[2] > "2000-01-01 00:00:00" for row in second.values())
+    assert (checked, changed) == (len(phones), 1)
+    assert sent == [(1, DROP_NOTICE.format(phone=phones[0]))]
+
+
+def test_sweep_interval_grows_with_the_table_within_bounds():
+    assert sweep_interval(0) == SWEEP_MIN_INTERVAL
+    assert sweep_interval(int(SWEEP_RATE * SWEEP_MIN_INTERVAL) - 1) == SWEEP_MIN_INTERVAL
+    assert sweep_interval(int(SWEEP_RATE * 600)) == 600
+    assert sweep_interval(10 ** 9) == SWEEP_MAX_INTERVAL
+    assert sweep_interval(6000, rate=10) == 600
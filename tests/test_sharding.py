@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import datetime
+import subprocess
+
+import httpx
+
+from db import DBExecutor
+from loadtest import FakeTelegram, StubWhatsApp, UpdateFactory, serve
+from migrations import apply_migrations
+from repository import Repository
+from sharding import shard_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 2
+USERS = range(500, 510)  # দুই ওয়ার্কারেই পাঁচজন করে
+STARTUP_TIMEOUT = 60
+REPLY_TIMEOUT = 30
+
+# প্রতিটি ধাপের উত্তর আগের ধাপের স্টেটের উপর নির্ভর করে; ক্রম বদলালে উত্তরের ক্রমও বদলায়
+STEPS = [
+    ("💰 উইথড্র", "উইথড্র করার পরিমাণ লিখুন"),
+    ("50", "নূন্যতম উইথড্র পরিমাণ"),
+    ("abc", "ভুল ইনপুট"),
+    ("100", "নম্বরটি দিন"),
+]
+AFTER_RESTART = ("01700000000", "অ্যাডমিনের অনুমোদনের পর")
+
+
+def _free_ports(count: int) -> int:
+    """পরপর count টি খালি পোর্টের প্রথমটি"""
+    while True:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            first = probe.getsockname()[1]
+        if first + count > 65535:
+            continue
+        sockets = []
+        try:
+            for port in range(first, first + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return first
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+
+
+class _BotProcess:
+    """`python bot.py` webhook মোডে: রাউটার এই প্রসেসে, ওয়ার্কাররা spawn করা চাইল্ড প্রসেসে"""
+
+    def __init__(self, cwd, env, log_path):
+        self.cwd, self.env, self.log_path = cwd, env, log_path
+        self.proc = None
+
+    async def start(self, client: httpx.AsyncClient) -> None:
+        with open(self.log_path, "ab") as log:
+            self.proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "bot.py")], cwd=self.cwd, env=self.env,
+                                         stdout=log, stderr=subprocess.STDOUT)
+        base = int(self.env["BOT_WORKER_BASE_PORT"])
+        urls = [f"http://127.0.0.1:{base + i}/metrics" for i in range(WORKERS)]
+        urls.append(f"http://127.0.0.1:{self.env['BOT_WEBHOOK_PORT']}/webhook")
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        for url in urls:
+            while True:
+                assert self.proc.poll() is None, self.log()
+                assert time.monotonic() < deadline, self.log()
+                try:
+                    await client.get(url)
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.2)
+
+    def stop(self) -> None:
+        # SIGTERM: রাউটার বন্ধ হয়ে ওয়ার্কারদের SIGTERM দেয়, তারা persistence ফ্লাশ করে বের হয়
+        self.proc.send_signal(signal.SIGTERM)
+        assert self.proc.wait(timeout=STARTUP_TIMEOUT) == 0, self.log()
+
+    def kill(self) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def log(self) -> str:
+        with open(self.log_path, encoding="utf-8", errors="replace") as log:
+            return log.read()[-4000:]
+
+
+async def _replies(telegram, bot, expected: int) -> dict:
+    """প্রতিটি ইউজারের কাছে expected টি মেসেজ না আসা পর্যন্ত অপেক্ষা করে"""
+    deadline = time.monotonic() + REPLY_TIMEOUT
+    while any(len(telegram.messages[user_id]) < expected for user_id in USERS):
+        assert time.monotonic() < deadline, bot.log()
+        await asyncio.sleep(0.1)
+    return {user_id: [text for text, _ in telegram.messages[user_id]] for user_id in USERS}
+
+
+def test_workers_keep_per_user_order_and_state_across_restart(tmp_path):
+    db_path = str(tmp_path / "bot_database.db")
+    apply_migrations(db_path)
+
+    async def seed():
+        repo = Repository(DBExecutor(db_path))
+        for user_id in USERS:  # উইথড্রর জন্য যথেষ্ট পয়েন্ট
+            await repo.create_user(user_id, f"user{user_id}", f"ref_{user_id}", datetime.date.today(), 5000)
+        await repo.flush()
+        repo.close()
+
+    asyncio.run(seed())
+
+    async def scenario():
+        telegram, whatsapp = FakeTelegram(), StubWhatsApp()
+        telegram_runner, telegram_url = await serve(telegram.app)
+        whatsapp_runner, whatsapp_url = await serve(whatsapp.app)
+        router_port = _free_ports(WORKERS + 2)
+        events_port, base_port = router_port + 1, router_port + 2
+        env = dict(
+            os.environ, BOT_WORKERS=str(WORKERS), BOT_WORKER_BASE_PORT=str(base_port), BOT_EVENTS_PORT=str(events_port),
+            BOT_WEBHOOK_URL=f"http://127.0.0.1:{router_port}", BOT_WEBHOOK_LISTEN="127.0.0.1",
+            BOT_WEBHOOK_PORT=str(router_port), TELEGRAM_API_BASE_URL=f"{telegram_url}/bot",
+            WHATSAPP_API_URL=whatsapp_url,
+        )
+        bot = _BotProcess(str(tmp_path), env, str(tmp_path / "bot.log"))
+        factory = UpdateFactory(None)
+        webhook = f"http://127.0.0.1:{router_port}/webhook"
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                await bot.start(client)
+                # ধাপগুলো ইউজারদের মধ্যে পালাক্রমে; রাউটার প্রতিটি ক্রমানুসারে পায়
+                for text, _ in STEPS:
+                    for user_id in USERS:
+                        response = await client.post(webhook, json=factory.message(user_id, text).to_dict())
+                        assert response.status_code == 200
+                before = await _replies(telegram, bot, len(STEPS))
+                bot.stop()
+
+                # পুরো প্রসেস ট্রি নতুন করে; কনভারসেশন WITHDRAW_NUMBER এ ও user_data তে পরিমাণ থাকতে হবে
+                await bot.start(client)
+                for user_id in USERS:
+                    await client.post(webhook, json=factory.message(user_id, AFTER_RESTART[0]).to_dict())
+                after = await _replies(telegram, bot, len(STEPS) + 1)
+                bot.stop()
+        finally:
+            bot.kill()
+            await telegram_runner.cleanup()
+            await whatsapp_runner.cleanup()
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert {shard_key(UpdateFactory(None).message(user_id, "x").to_dict()) % WORKERS for user_id in USERS} == {0, 1}
+    for user_id in USERS:
+        assert len(before[user_id]) == len(STEPS)
+        for reply, (_, expected) in zip(before[user_id], STEPS):
+            assert expected in reply, (user_id, before[user_id])
+        assert AFTER_RESTART[1] in after[user_id][-1], (user_id, after[user_id])
+
+    async def withdrawals():
+        db = DBExecutor(db_path)
+        try:
+            return await db.fetchall("SELECT user_id, amount_bdt, points_used, payment_number FROM withdrawals ORDER BY user_id")
+        finally:
+            db.close()
+
+    assert [tuple(row) for row in asyncio.run(withdrawals())] == [
+        (user_id, 100.0, 1000, AFTER_RESTART[0]) for user_id in USERS
+    ]
@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import random
+
+from db import DBExecutor
+from loadtest import offline_bot
+from repository import Repository
+
+OPERATIONS = 600
+CHECKPOINT = 150
+
+# দিনের রোলআপের প্রতিটি ইভেন্ট পুরো টেবিল গুনে; টেস্টের সব সারি এই টেস্টেই তৈরি, তাই যোগফল সমান হতে হবে
+ROLLUP_RECOUNT_SQL = {
+    "new_users": "SELECT COUNT(*) FROM users",
+    "logins_successful": "SELECT COALESCE(SUM(successful_sessions), 0) FROM users",
+    "logins_failed": "SELECT COALESCE(SUM(failed_sessions), 0) FROM users",
+    "withdrawals_requested": "SELECT COUNT(*) FROM withdrawals",
+    "withdrawals_requested_bdt": "SELECT COALESCE(SUM(amount_bdt), 0) FROM withdrawals",
+    "withdrawals_approved": "SELECT COUNT(*) FROM withdrawals WHERE status = 'approved'",
+    "withdrawals_approved_bdt": "SELECT COALESCE(SUM(amount_bdt), 0) FROM withdrawals WHERE status = 'approved'",
+}
+
+
+class _World:
+    def __init__(self):
+        self.users = []
+        self.phones = {}  # নম্বর -> মালিক; অন্য ইউজার একই নম্বরে লগইন করতে পারে না
+        self.requests = []
+        self.next_phone = 0
+
+
+async def _random_operations(repo, rng, world, count):
+    users, phones, requests = world.users, world.phones, world.requests
+    today = datetime.date.today()
+    for _ in range(count):
+        kind = rng.choice(["signup"] * 3 + ["login"] * 4 + ["failed"] * 2 + ["status", "logout", "withdraw",
+                           "withdraw", "settle", "settle_range", "delete_session"])
+        if kind == "signup" or not users:
+            user_id = len(users) + 1
+            referrer = f"ref_{rng.choice(users)}" if users and rng.random() < 0.5 else None
+            await repo.create_user(user_id, f"user{user_id}", f"ref_{user_id}", today, 1000,
+                                   referred_by_code=referrer, referral_points=50)
+            users.append(user_id)
+        elif kind == "login":
+            # কখনো একই মালিকের একই নম্বর আবার (সেশন আবার active হয়, পয়েন্ট দ্বিতীয়বার নয়)
+            if phones and rng.random() < 0.3:
+                phone = rng.choice(list(phones))
+            else:
+                world.next_phone += 1
+                phone = f"+8801{world.next_phone:09d}"
+                phones[phone] = rng.choice(users)
+            await repo.record_login(phones[phone], phone, 10)
+        elif kind == "failed":
+            await repo.record_failed_login(rng.choice(users))
+        elif kind == "status" and phones:
+            await repo.set_session_statuses({rng.choice(list(phones)): rng.choice(["active", "disconnected"])})
+        elif kind == "logout" and phones:
+            await repo.deactivate_session(rng.choice(list(phones)))
+        elif kind == "withdraw":
+            points = rng.choice([100, 250, 400])
+            request_id = await repo.create_withdrawal(rng.choice(users), points / 10, points, "01700000000")
+            if request_id is not None:
+                requests.append(request_id)
+        elif kind == "settle" and requests:
+            await repo.settle_withdrawals(rng.sample(requests, min(3, len(requests))),
+                                          rng.choice(["approved", "declined"]))
+        elif kind == "settle_range" and requests:
+            first = rng.choice(requests)
+            await repo.settle_pending_range(rng.choice(["approved", "declined"]), first, first + 5, max_amount=30)
+        elif kind == "delete_session" and phones:
+            phone = rng.choice(list(phones))
+            del phones[phone]
+            await repo.db.execute("DELETE FROM sessions WHERE phone_number = ?", (phone,))
+
+
+async def _rollup_drift(repo) -> dict:
+    day_totals, hour_totals = {}, {}
+    for period, totals in (("day", day_totals), ("hour", hour_totals)):
+        for values in (await repo.get_rollups(period, "0000")).values():
+            for name, value in values.items():
+                totals[name] = totals.get(name, 0) + value
+    drift = {}
+    for name, sql in ROLLUP_RECOUNT_SQL.items():
+        actual = (await repo.db.fetchone(sql))[0]
+        if abs(day_totals.get(name, 0) - actual) > 1e-6 or abs(hour_totals.get(name, 0) - actual) > 1e-6:
+            drift[name] = (day_totals.get(name), hour_totals.get(name), actual)
+    return drift
+
+
+def test_stats_aggregates_match_full_recount(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        rng, world = random.Random(19), _World()
+        for _ in range(OPERATIONS // CHECKPOINT):
+            await _random_operations(repo, rng, world, CHECKPOINT)
+            await repo.write_behind.flush()
+            assert await repo.audit_stats() == {}
+            assert await _rollup_drift(repo) == {}
+
+        stats = await repo.get_stats()
+        assert stats["users"] == len(world.users) and stats["referrals"] > 0
+        assert stats["sessions"] == len(world.phones) and 0 < stats["sessions_active"] < stats["sessions"]
+        assert stats["logins_failed"] > 0
+        await repo.flush()
+        repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_audit_stats_reports_drift(db_path):
+    async def scenario():
+        repo = Repository(DBExecutor(db_path))
+        await repo.create_user(1, "user1", "ref_1", datetime.date.today(), 1000)
+        await repo.db.execute("UPDATE stats_totals SET value = value + 2 WHERE name = 'users'")
+        assert await repo.audit_stats() == {"users": (3, 1)}
+        await repo.flush()
+        repo.close()
+
+    asyncio.run(scenario())
+
+
+def _maintenance_count(job: str) -> float:
+    from metrics import MAINTENANCE_SECONDS
+
+    for line in MAINTENANCE_SECONDS.render().splitlines():
+        if line.startswith(f'bot_maintenance_seconds_count{{job="{job}"}}'):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+def test_stats_audit_is_its_own_job(bot_module, caplog):
+    bot = bot_module
+
+    async def scenario():
+        async with offline_bot(bot) as (application, _, _):
+            jobs = {job.name: job for job in application.job_queue.jobs()}
+            await bot.repo.db.execute("UPDATE stats_totals SET value = value + 2 WHERE name = 'users'")
+            before = {name: _maintenance_count(name) for name in ("ledger_compact", "stats_audit")}
+            await jobs["stats_audit"].callback(None)
+            after = {name: _maintenance_count(name) for name in ("ledger_compact", "stats_audit")}
+            return jobs, before, after
+
+    jobs, before, after = asyncio.run(scenario())
+    assert jobs["stats_audit"].trigger.interval.total_seconds() == bot.STATS_AUDIT_INTERVAL
+    assert jobs["ledger_compact"].trigger.interval.total_seconds() == bot.LEDGER_COMPACT_INTERVAL
+    assert jobs["stats_audit"].callback is not jobs["ledger_compact"].callback
+    # শুধু নিজের লেবেলে সময় যায়; লেজার কম্প্যাকশন চলেনি
+    assert after["stats_audit"] == before["stats_audit"] + 1 and after["ledger_compact"] == before["ledger_compact"]
+    assert "Stats aggregates do not match a full recount: {'users': (2, 0)}" in caplog.text
+
+
+def test_referral_audit_is_its_own_job(bot_module, caplog):
+    bot = bot_module
+    labels = ("stats_audit", "referral_audit")
+
+    async def scenario():
+        async with offline_bot(bot) as (application, _, _):
+            jobs = {job.name: job for job in application.job_queue.jobs()}
+            await bot.repo.create_user(1, "user1", "ref_1", datetime.date.today(), 100)
+            await bot.repo.create_user(2, "user2", "ref_2", datetime.date.today(), 100, "ref_1", 20)
+            await bot.repo.db.execute("UPDATE users SET referral_count = 5 WHERE user_id = 1")
+            before = {name: _maintenance_count(name) for name in labels}
+            await jobs["referral_audit"].callback(None)
+            after = {name: _maintenance_count(name) for name in labels}
+            return jobs, before, after
+
+    jobs, before, after = asyncio.run(scenario())
+    assert jobs["referral_audit"].trigger.interval.total_seconds() == bot.REFERRAL_AUDIT_INTERVAL
+    assert after["referral_audit"] == before["referral_audit"] + 1 and after["stats_audit"] == before["stats_audit"]
+    assert "referral_count does not match referred_by for users: [1]" in caplog.text
+    assert "Stats aggregates" not in caplog.text
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from db import DBExecutor
+from write_behind import WriteBehind
+
+INCREMENT_SQL = "UPDATE counters SET n = n + ? WHERE key = ?"
+
+
+class FlakyExecutor:
+    """প্রথম `failures` টি write() এ "database is locked" দেয়, তারপর আসল DBExecutor"""
+
+    def __init__(self, db: DBExecutor, failures: int):
+        self.db = db
+        self.failures = failures
+
+    async def write(self, fn, *args):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return await self.db.write(fn, *args)
+
+
+@pytest.fixture
+def counters(tmp_path):
+    db = DBExecutor(str(tmp_path / "counters.db"))
+
+    def _create(conn):
+        conn.execute("CREATE TABLE counters (key INTEGER PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0)")
+        conn.executemany("INSERT INTO counters (key) VALUES (?)", [(1,), (2,)])
+
+    asyncio.run(db.write(_create))
+    yield db
+    db.close()
+
+
+def _values(db):
+    return dict(asyncio.run(db.fetchall("SELECT key, n FROM counters")))
+
+
+def test_batches_into_one_commit(counters):
+    async def scenario():
+        batcher = WriteBehind(counters, interval=60)
+        for _ in range(100):
+            batcher.increment(INCREMENT_SQL, 1)
+        result = batcher.submit(lambda conn: conn.execute(INCREMENT_SQL, (5, 2)).rowcount)
+        await batcher.flush()
+        assert await result == 1
+        assert batcher.stats() == {"flushes": 1, "operations": 101, "pending": 0}
+
+    asyncio.run(scenario())
+    assert _values(counters) == {1: 100, 2: 5}
+
+
+def test_failed_flush_requeues_counters_and_fails_ops(counters):
+    committed = []
+
+    async def scenario():
+        batcher = WriteBehind(FlakyExecutor(counters, failures=1), interval=60)
+        for key in (1, 1, 2):
+            batcher.increment(INCREMENT_SQL, key, on_commit=lambda: committed.append(1))
+        op = batcher.submit(lambda conn: conn.execute(INCREMENT_SQL, (10, 2)).rowcount)
+        await batcher.flush()
+        with pytest.raises(sqlite3.OperationalError):
+            await op
+        assert committed == [] and batcher.stats()["pending"] == 2  # দুটি কী, আবার কিউতে
+
+        batcher.increment(INCREMENT_SQL, 2)  # ব্যর্থ ব্যাচের সাথে যোগ হয়
+        await batcher.flush()
+        assert batcher.stats()["pending"] == 0
+        assert len(committed) == 3
+
+    asyncio.run(scenario())
+    assert _values(counters) == {1: 2, 2: 2}
+
+
+def test_failed_flush_is_retried_without_another_write(counters):
+    async def scenario():
+        batcher = WriteBehind(FlakyExecutor(counters, failures=2), interval=0.01)
+        batcher.increment(INCREMENT_SQL, 1, delta=7)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if batcher.flushes:
+                break
+        assert batcher.stats() == {"flushes": 1, "operations": 1, "pending": 0}
+
+    asyncio.run(scenario())
+    assert _values(counters) == {1: 7, 2: 0}
+
+
+def test_nothing_is_queued_after_close(counters):
+    async def scenario():
+        batcher = WriteBehind(counters)
+        batcher.increment(INCREMENT_SQL, 1)
+        await batcher.close()
+        with pytest.raises(RuntimeError):
+            batcher.submit(lambda conn: None)
+        with pytest.raises(RuntimeError):
+            batcher.increment(INCREMENT_SQL, 2)
+        assert batcher.stats()["pending"] == 0
+        assert batcher._ops == [] and batcher._increments == {}
+
+    asyncio.run(scenario())
+    assert _values(counters) == {1: 1, 2: 0}
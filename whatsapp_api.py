@@ -0,0 +1,244 @@
+"""WhatsApp API সার্ভারের শেয়ার্ড async ক্লায়েন্ট।
+
+    python whatsapp_api.py --bench [phones]   # দেরি করা স্টাব সার্ভারে একটি Active Sessions ট্যাপের স্ট্যাটাস আনা
+"""
+import re
+import sys
+import time
+import asyncio
+import logging
+
+import httpx
+
+from metrics import WA_API_ERRORS, WA_API_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# কানেকশন পুল ও টাইমআউট সেটিংস
+WA_MAX_CONNECTIONS = 20
+WA_MAX_KEEPALIVE = 10
+WA_MAX_CONCURRENCY = 16  # একসাথে সর্বোচ্চ কতগুলো API কল চলবে
+WA_CONNECT_TIMEOUT = 5.0
+WA_DEFAULT_TIMEOUT = 10.0
+WA_LOGIN_TIMEOUT = 60.0  # POST /sessions প্রথম QR পর্যন্ত অপেক্ষা করে
+WA_STATUS_FANOUT = 8  # ব্যাচ এন্ডপয়েন্ট না থাকলে একসাথে কতগুলো স্ট্যাটাস রিকুয়েস্ট
+WA_STATUS_CACHE_TTL = 5.0  # সেকেন্ড; ইউজার ও অ্যাডমিন সবার জন্য শেয়ার্ড ক্যাশ
+
+_PHONE_SEGMENT = re.compile(r"^/sessions/(?!status$)[^/]+")
+
+
+def endpoint_label(path: str) -> str:
+    """মেট্রিকের লেবেলের জন্য পাথ থেকে ফোন নম্বর বাদ দেয়: /sessions/+880.../status -> /sessions/:phone/status"""
+    return _PHONE_SEGMENT.sub("/sessions/:phone", path)
+
+
+class WhatsAppClient:
+    """WhatsApp API সার্ভারের জন্য শেয়ার্ড async HTTP ক্লায়েন্ট (keep-alive পুলসহ)"""
+
+    def __init__(self, base_url: str, max_concurrency: int = WA_MAX_CONCURRENCY):
+        self.base_url = base_url
+        self._max_concurrency = max_concurrency
+        self._client = None
+        self._semaphore = None
+        self._status_cache = {}  # phone -> (expires_at, status)
+        self._batch_supported = True
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(WA_DEFAULT_TIMEOUT, connect=WA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=WA_MAX_CONNECTIONS,
+                max_keepalive_connections=WA_MAX_KEEPALIVE,
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        logger.info(f"WhatsApp API client started for {self.base_url}")
+
+    async def close(self) -> None:
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+        logger.info("WhatsApp API client closed")
+
+    async def request(self, method: str, path: str, timeout: float = None, **kwargs) -> httpx.Response:
+        if self._client is None:
+            raise RuntimeError("WhatsAppClient.start() was not called")
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=WA_CONNECT_TIMEOUT)
+        endpoint = endpoint_label(path)
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._client.request(method, path, **kwargs)
+            except httpx.HTTPError as e:
+                WA_API_ERRORS.labels(method, endpoint, type(e).__name__).inc()
+                raise
+            finally:
+                WA_API_LATENCY.labels(method, endpoint).observe(time.perf_counter() - start)
+        if response.status_code >= 500:
+            WA_API_ERRORS.labels(method, endpoint, str(response.status_code)).inc()
+        return response
+
+    async def create_session(self, phone_number: str) -> httpx.Response:
+        self.forget_status(phone_number)
+        return await self.request("POST", "/sessions", json={"phone": phone_number}, timeout=WA_LOGIN_TIMEOUT)
+
+    async def delete_session(self, phone_number: str) -> httpx.Response:
+        self.forget_status(phone_number)
+        return await self.request("DELETE", f"/sessions/{phone_number}")
+
+    async def fetch_qr(self, phone_number: str, etag: str = None):
+        """বর্তমান QR এর PNG বাইট: (png, etag)। etag না বদলালে (304) png হয় None; QR না থাকলে (None, None)"""
+        headers = {"If-None-Match": etag} if etag else {}
+        try:
+            response = await self.request("GET", f"/sessions/{phone_number}/qr", headers=headers)
+        except Exception as e:
+            logger.error(f"Error fetching QR code: {e}")
+            return None, None
+        if response.status_code == 304:
+            return None, etag
+        if response.status_code != 200:
+            return None, None
+        return response.content, response.headers.get("ETag")
+
+    def forget_status(self, phone_number: str) -> None:
+        self._status_cache.pop(phone_number, None)
+
+    async def fetch_status(self, phone_number: str, wake: bool = True) -> str:
+        """'authenticated', 'pending_qr', 'hibernated', 'restoring', 'reconnecting', 'failed', 'not_found' অথবা 'error' রিটার্ন করে।
+
+        wake=True হলে সার্ভার হাইবারনেট করা সেশন আগে জাগিয়ে তোলে (কয়েক সেকেন্ড লাগতে পারে)।
+        """
+        try:
+            params = {} if wake else {"wake": "0"}
+            response = await self.request("GET", f"/sessions/{phone_number}/status", params=params)
+            if response.status_code == 200:
+                return response.json().get("status")
+            elif response.status_code == 404:
+                return "not_found"
+            logger.error(f"API status check error: {response.status_code} - {response.text}")
+            return "error"
+        except Exception as e:
+            logger.error(f"Error checking login status: {e}")
+            return "error"
+
+    async def _fetch_batch(self, phones, wake: bool):
+        """POST /sessions/status; পুরনো সার্ভারে এন্ডপয়েন্ট না থাকলে None রিটার্ন করে"""
+        try:
+            response = await self.request("POST", "/sessions/status", json={"phones": phones, "wake": wake})
+        except Exception as e:
+            logger.error(f"Error checking batch status: {e}")
+            return None
+        if response.status_code == 404:
+            logger.info("Batch status endpoint not available, falling back to per-phone checks")
+            self._batch_supported = False
+            return None
+        if response.status_code != 200:
+            logger.error(f"API batch status error: {response.status_code} - {response.text}")
+            return None
+        statuses = response.json().get("statuses", {})
+        return {phone: statuses.get(phone, "not_found") for phone in phones}
+
+    async def _fetch_each(self, phones, wake: bool):
+        fanout = asyncio.Semaphore(WA_STATUS_FANOUT)
+
+        async def one(phone):
+            async with fanout:
+                return await self.fetch_status(phone, wake)
+
+        return dict(zip(phones, await asyncio.gather(*(one(phone) for phone in phones))))
+
+    async def get_statuses(self, phones, use_cache: bool = True, wake: bool = False) -> dict:
+        """একাধিক নম্বরের স্ট্যাটাস একসাথে আনে: ক্যাশ, তারপর ব্যাচ এন্ডপয়েন্ট, না থাকলে সমান্তরাল GET।
+
+        পর্যায়ক্রমিক চেক wake=False রাখে, যাতে হাইবারনেট করা সেশনগুলো অকারণে জেগে মেমরি না নেয়।
+        """
+        now = time.monotonic()
+        result = {}
+        missing = []
+        for phone in dict.fromkeys(phones):
+            cached = self._status_cache.get(phone) if use_cache else None
+            if cached and cached[0] > now:
+                result[phone] = cached[1]
+            else:
+                missing.append(phone)
+        if not missing:
+            return result
+
+        fetched = None
+        if self._batch_supported and len(missing) > 1:
+            fetched = await self._fetch_batch(missing, wake)
+        if fetched is None:
+            fetched = await self._fetch_each(missing, wake)
+
+        expires_at = time.monotonic() + WA_STATUS_CACHE_TTL
+        for phone, status in fetched.items():
+            if status != "error":
+                self._status_cache[phone] = (expires_at, status)
+        result.update(fetched)
+        return result
+
+
+BENCH_LATENCY = 0.05  # সেকেন্ড; স্টাব সার্ভারের প্রতি রেসপন্সের দেরি
+BENCH_TAPS = 20
+
+
+async def _bench(phones: int) -> None:
+    from loadtest import StubWhatsApp, percentile, serve
+
+    stub = StubWhatsApp(latency=BENCH_LATENCY)
+    runner, url = await serve(stub.app)
+    client = WhatsAppClient(url)
+    await client.start()
+    numbers = [f"+8801{i:09d}" for i in range(phones)]
+
+    async def sequential():
+        # আগের list_active_sessions: প্রতিটি নম্বরের জন্য একটির পর একটি রাউন্ড-ট্রিপ
+        return {phone: await client.fetch_status(phone) for phone in numbers}
+
+    async def concurrent():
+        client._batch_supported = False  # ব্যাচ এন্ডপয়েন্ট নেই এমন পুরনো সার্ভার
+        try:
+            return await client.get_statuses(numbers, use_cache=False)
+        finally:
+            client._batch_supported = True
+
+    async def batch():
+        return await client.get_statuses(numbers, use_cache=False)
+
+    async def cached():
+        return await client.get_statuses(numbers)
+
+    print(f"one Active Sessions tap with {phones} numbers, stub API {BENCH_LATENCY * 1000:.0f} ms per response, "
+          f"{BENCH_TAPS} taps")
+    print(f"{'mode':<28}{'p50 ms':>9}{'p99 ms':>9}{'requests':>10}")
+    try:
+        await batch()  # ক্যাশ ভরে ও কানেকশন খোলে
+        for name, fetch in (("sequential GET", sequential), (f"concurrent GET (fanout {WA_STATUS_FANOUT})", concurrent),
+                            ("batch POST", batch), ("shared cache", cached)):
+            latencies, requests = [], 0
+            for _ in range(BENCH_TAPS):
+                before = stub.requests
+                start = time.perf_counter()
+                statuses = await fetch()
+                latencies.append(time.perf_counter() - start)
+                requests += stub.requests - before
+                assert set(statuses.values()) == {"authenticated"}, statuses
+            print(f"{name:<28}{percentile(latencies, 0.50) * 1000:>9.1f}{percentile(latencies, 0.99) * 1000:>9.1f}"
+                  f"{requests / BENCH_TAPS:>10.1f}")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    logging.basicConfig(level=logging.WARNING)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(_bench(int(args[0]) if args else 20))
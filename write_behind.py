@@ -0,0 +1,209 @@
+"""ছোট কাউন্টার রাইটের গ্রুপ কমিট।
+
+    python write_behind.py --bench [ops]   # প্রতি অপারেশনে কমিট বনাম write-behind: ops/s, কমিট ও ডিস্ক sync
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+
+from db import DBExecutor, transaction
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_INTERVAL = 0.05  # সেকেন্ড; প্রথম অপারেশনের এতক্ষণ পর ব্যাচ কমিট হয়
+WRITE_BEHIND_MAX_OPS = 500  # এর বেশি অপারেশন জমলে সাথে সাথে কমিট হয়
+WRITE_BEHIND_MAX_RETRY_DELAY = 5.0  # ব্যর্থ ফ্লাশের কাউন্টার আবার চেষ্টার বিরতি দ্বিগুণ হতে হতে এই পর্যন্ত
+
+
+def _apply_batch(conn, increments, ops):
+    """সব কাউন্টার ও অপারেশন একটি ট্রানজ্যাকশনে; প্রতিটি অপারেশন নিজের SAVEPOINT এ চলে"""
+    results = []
+    with transaction(conn, "IMMEDIATE"):
+        for sql, deltas in increments.items():
+            conn.executemany(sql, [(delta, key) for key, delta in deltas.items()])
+        for fn, args in ops:
+            conn.execute("SAVEPOINT write_behind_op")
+            try:
+                results.append((True, fn(conn, *args)))
+            except Exception as e:
+                conn.execute("ROLLBACK TO write_behind_op")
+                results.append((False, e))
+            conn.execute("RELEASE write_behind_op")
+    return results
+
+
+class WriteBehind:
+    """ছোট ছোট রাইট মেমরিতে জমিয়ে WRITE_BEHIND_INTERVAL পরপর একটি ট্রানজ্যাকশনে কমিট করে।
+
+    increment(): একই কী এর কাউন্টার যোগ হয়ে একটি executemany সারি হয়; on_commit কমিটের পর ডাকা হয়।
+    submit(): fn(conn, *args) ব্যাচের ট্রানজ্যাকশনে চলে এবং কমিটের পর তার রিটার্ন ভ্যালু পাওয়া যায়।
+    ফ্লাশ ব্যর্থ হলে submit() এর future এক্সেপশন পায়, আর কাউন্টারগুলো আবার কিউতে ফিরে পরের ফ্লাশে যায়।
+    প্রসেস হঠাৎ মারা গেলে শেষ ইন্টারভালের অপারেশন হারাতে পারে; স্বাভাবিক শাটডাউনে close() সব ফ্লাশ করে।
+    """
+
+    def __init__(self, executor: DBExecutor, interval: float = WRITE_BEHIND_INTERVAL,
+                 max_ops: int = WRITE_BEHIND_MAX_OPS):
+        self.db = executor
+        self.interval = interval
+        self.max_ops = max_ops
+        self._increments = {}  # sql -> {key: delta}
+        self._on_commit = []
+        self._ops = []  # (fn, args, future)
+        self._pending = 0
+        self._timer = None
+        self._flushing = set()
+        self._closed = False
+        self._failures = 0  # পরপর কতবার ফ্লাশ ব্যর্থ হয়েছে
+        self.flushes = 0
+        self.operations = 0
+
+    def increment(self, sql: str, key, delta: int = 1, on_commit=None) -> None:
+        """sql এর প্যারামিটার (delta, key)"""
+        self._check_open()
+        deltas = self._increments.setdefault(sql, {})
+        deltas[key] = deltas.get(key, 0) + delta
+        if on_commit is not None:
+            self._on_commit.append(on_commit)
+        self._added()
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        self._check_open()
+        future = asyncio.get_running_loop().create_future()
+        self._ops.append((fn, args, future))
+        self._added()
+        return future
+
+    def _check_open(self) -> None:
+        # কিছু জমা করার আগেই; বন্ধের পর জমা হলে সেটি কখনো ফ্লাশ হতো না, future ও ঝুলে থাকত
+        if self._closed:
+            raise RuntimeError("WriteBehind is closed")
+
+    def _added(self, count: int = 1) -> None:
+        self._pending += count
+        if self._pending >= self.max_ops and not self._failures:  # ব্যর্থতার পর max_ops এও বিরতি মানা হয়
+            self._schedule_flush()
+        elif self._timer is None:
+            delay = min(self.interval * 2 ** self._failures, WRITE_BEHIND_MAX_RETRY_DELAY)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        task = asyncio.ensure_future(self.flush())
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        increments, on_commit, ops, count = self._increments, self._on_commit, self._ops, self._pending
+        self._increments, self._on_commit, self._ops, self._pending = {}, [], [], 0
+        try:
+            results = await self.db.write(_apply_batch, increments, [(fn, args) for fn, args, _ in ops])
+        except Exception as e:
+            self._failures += 1
+            logger.exception(f"Write-behind flush of {count} operations failed ({self._failures} in a row)")
+            for _, _, future in ops:
+                if not future.done():
+                    future.set_exception(e)
+            self._requeue(increments, on_commit)
+            return
+        self._failures = 0
+        self.flushes += 1
+        self.operations += count
+        for callback in on_commit:
+            callback()
+        for (_, _, future), (ok, value) in zip(ops, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _requeue(self, increments: dict, on_commit: list) -> None:
+        """ব্যর্থ ব্যাচের কাউন্টার এর মধ্যে জমা হওয়া নতুনগুলোর সাথে যোগ করে; পরের ফ্লাশে (বিরতি বাড়িয়ে) আবার চেষ্টা"""
+        for sql, deltas in increments.items():
+            merged = self._increments.setdefault(sql, {})
+            for key, delta in deltas.items():
+                merged[key] = merged.get(key, 0) + delta
+        self._on_commit[:0] = on_commit
+        count = sum(len(deltas) for deltas in increments.values())
+        if count and not self._closed:
+            self._added(count)
+        else:
+            self._pending += count
+
+    async def close(self) -> None:
+        """বাকি সব অপারেশন কমিট করে; এরপর নতুন অপারেশন নেওয়া হয় না"""
+        self._closed = True
+        await asyncio.gather(*self._flushing, return_exceptions=True)
+        await self.flush()
+        if self._pending:
+            lost = {sql: dict(deltas) for sql, deltas in self._increments.items()}
+            logger.error(f"Write-behind closed with {self._pending} counter updates not committed: {lost}")
+        logger.info(f"Write-behind closed: {self.operations} operations in {self.flushes} commits")
+
+    def stats(self) -> dict:
+        return {"flushes": self.flushes, "operations": self.operations, "pending": self._pending}
+
+
+BENCH_KEYS = 1000
+BENCH_INCREMENT_SQL = "UPDATE counters SET n = n + ? WHERE key = ?"
+
+
+def _bench_submit_op(conn, key):
+    # claim_daily_bonus এর মতো submit() অপারেশন
+    return conn.execute(BENCH_INCREMENT_SQL, (1, key)).rowcount
+
+
+async def _bench(ops: int) -> None:
+    # synchronous=FULL এ WAL এর প্রতিটি কমিট ঠিক একটি fsync, তাই ডিস্ক sync = কমিট। বটের NORMAL মোডে
+    # fsync শুধু চেকপয়েন্টে হয়, কিন্তু প্রতি কমিটে WAL ফ্রেম লেখা ও রাইট লকের খরচ একই থাকে।
+    print(f"{ops} counter updates over {BENCH_KEYS} keys, half increment() and half submit(), synchronous=FULL")
+    print(f"{'mode':<14}{'seconds':>9}{'ops/s':>10}{'commits':>9}{'commits/s':>11}{'syncs':>7}")
+    with tempfile.TemporaryDirectory(prefix="write-behind-bench-") as workdir:
+        for mode in ("per-op", "write-behind"):
+            db = DBExecutor(os.path.join(workdir, f"{mode}.db"))
+            await db.write(lambda conn: conn.execute("PRAGMA synchronous=FULL"))
+            await db.execute("CREATE TABLE counters (key INTEGER PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0)")
+            await db.write(lambda conn: conn.executemany(
+                "INSERT INTO counters (key) VALUES (?)", [(key,) for key in range(BENCH_KEYS)]
+            ))
+            keys = [i % BENCH_KEYS for i in range(ops)]
+            start = time.perf_counter()
+            if mode == "per-op":
+                # আগের আচরণ: প্রতিটি আপডেট নিজের autocommit ট্রানজ্যাকশনে
+                await asyncio.gather(*(db.execute(BENCH_INCREMENT_SQL, (1, key)) for key in keys))
+                commits = ops
+            else:
+                batcher = WriteBehind(db)
+                futures = []
+                for i, key in enumerate(keys):
+                    if i % 2:
+                        futures.append(batcher.submit(_bench_submit_op, key))
+                    else:
+                        batcher.increment(BENCH_INCREMENT_SQL, key)
+                    if i % 50 == 0:
+                        await asyncio.sleep(0)  # হ্যান্ডলারগুলো একটু একটু করে আসে
+                await asyncio.gather(*futures)
+                await batcher.close()
+                commits = batcher.flushes
+            elapsed = time.perf_counter() - start
+            total = (await db.fetchone("SELECT SUM(n) FROM counters"))[0]
+            assert total == ops, (mode, total)
+            db.close()
+            print(f"{mode:<14}{elapsed:>9.3f}{ops / elapsed:>10.0f}{commits:>9}{commits / elapsed:>11.0f}{commits:>7}")
+
+
+if __name__ == "__main__":
+    if "--bench" not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    logging.basicConfig(level=logging.WARNING)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(_bench(int(args[0]) if args else 20000))